@@ -51,6 +51,9 @@ if EXP_NAME == "stocksp_cor15":
     SELL_TRANS_FEE = 0.004425
     REPORT_DIR = os.path.join(DATA_DIR, "report")
 
+    # catalog of the generated scenarios and reports
+    CATALOG_DB = os.path.join(DATA_DIR, "catalog.sqlite")
+
     # scenario
     # SCENARIO_SET_DIR = TMP_DIR
     SCENARIO_SET_DIR = os.path.join(DATA_DIR, "scenario")
@@ -100,6 +103,9 @@ if EXP_NAME == "dissertation":
     NRSPSPCVaR_DIR = os.path.join(DATA_DIR,
                                   'report_nrspsp_cvar')
 
+    # catalog of the generated scenarios and reports
+    CATALOG_DB = os.path.join(DATA_DIR, "catalog.sqlite")
+
     # scenario
     # SCENARIO_SET_DIR = TMP_DIR
     if node_name in ('X220', "tanh2-480s", 'eva00'):
@@ -278,7 +278,7 @@ def symbol_statistics(exp_name):
     import statsmodels.tsa.stattools as tsa_tools
     import scipy.stats as spstats
     import portfolio_programming.statistics.risk_adjusted as risk_adj
-    import arch.bootstrap.multiple_comparison as arch_comp
+    from portfolio_programming.statistics.spa import batch_spa_pvalues
 
     if exp_name == 'stocksp_cor15':
         start_date = dt.date(2005, 1, 1)
@@ -316,6 +316,12 @@ def symbol_statistics(exp_name):
             writer = csv.DictWriter(csv_file, fieldnames=fields)
             writer.writeheader()
 
+            # the SPA tests of all symbols in one pass
+            roi_matrix = data_xarr.loc[start_date:end_date, symbols,
+                                       "simple_roi"].values.T.copy()
+            roi_matrix[:, 0] = 0
+            spa_values = batch_spa_pvalues(roi_matrix, n_trial=10)[:, 1]
+
             for sdx, symbol in enumerate(symbols):
                 rois = data_xarr.loc[start_date:end_date, symbol, "simple_roi"]
                 trans_dates = rois.get_index("trans_date")
@@ -335,15 +341,7 @@ def symbol_statistics(exp_name):
                 adf_nc = tsa_tools.adfuller(rois, regression="nc")[1]
                 adf = max(adf_c, adf_ct, adf_ctt, adf_nc)
 
-                spa_value = 0
-                for _ in range(10):
-                    spa = arch_comp.SPA(rois.data, np.zeros(rois.size),
-                                        reps=1000)
-                    spa.seed(np.random.randint(0, 2 ** 31 - 1))
-                    spa.compute()
-                    # preserve the worse p_value
-                    if spa.pvalues[1] > spa_value:
-                        spa_value = spa.pvalues[1]
+                spa_value = spa_values[sdx]
 
                 writer.writerow(
                     {
@@ -380,10 +378,10 @@ def symbol_statistics(exp_name):
         tw_xarr = xr.open_dataarray(pp.TAIEX_2005_MKT_CAP_NC)
         tw_stats_file = os.path.join(pp.TMP_DIR,
                                      "TAIEX_2005_market_cap_stat.csv")
-        tw_group_symbols = zip(
+        tw_group_symbols = list(zip(
             ['TWG{}'.format(idx // 5 + 1) for idx in range(30)],
             tw_symbols
-        )
+        ))
 
         with open(pp.DJIA_2005_SYMBOL_JSON) as us_fin:
             djia_symbols = json.load(us_fin)
@@ -391,10 +389,10 @@ def symbol_statistics(exp_name):
         djia_xarr = xr.open_dataarray(pp.DJIA_2005_NC)
         djia_stats_file = os.path.join(pp.TMP_DIR, "DJIA_2005_symbols_stat.csv")
 
-        djia_group_symbols = zip(
+        djia_group_symbols = list(zip(
             ['USG{}'.format(idx // 5 + 1) for idx in range(30)],
             djia_symbols
-        )
+        ))
 
         for mkt, group_symbols, data_xarr, stat_file in zip(['djia', 'tw'],
                                            [djia_group_symbols,
@@ -412,6 +410,13 @@ def symbol_statistics(exp_name):
                 writer = csv.DictWriter(csv_file, fieldnames=fields)
                 writer.writeheader()
 
+                # the SPA tests of all symbols in one pass
+                roi_matrix = data_xarr.loc[
+                    start_date:end_date, [v[1] for v in group_symbols],
+                    "simple_roi"].values.T.copy()
+                roi_matrix[:, 0] = 0
+                spa_values = batch_spa_pvalues(roi_matrix, n_trial=10)[:, 1]
+
                 for sdx, (group, symbol) in enumerate(group_symbols):
                     t0 = time()
                     print(group, symbol)
@@ -436,15 +441,7 @@ def symbol_statistics(exp_name):
                     adf = max(adf_c, adf_ct, adf_ctt, adf_nc)
 
                     # worse case of SPA
-                    spa_value = 0
-                    for _ in range(10):
-                        spa = arch_comp.SPA(rois.data, np.zeros(rois.size),
-                                            reps=1000)
-                        spa.seed(np.random.randint(0, 2 ** 31 - 1))
-                        spa.compute()
-                        # preserve the worse p_value
-                        if spa.pvalues[1] > spa_value:
-                            spa_value = spa.pvalues[1]
+                    spa_value = spa_values[sdx]
 
                     writer.writerow(
                         {
@@ -483,7 +480,7 @@ def market_index_statistics():
     import statsmodels.tsa.stattools as tsa_tools
     import scipy.stats as spstats
     import portfolio_programming.statistics.risk_adjusted as risk_adj
-    import arch.bootstrap.multiple_comparison as arch_comp
+    from portfolio_programming.statistics.spa import batch_spa_pvalues
 
     start_date = dt.date(2005, 1, 1)
     end_date = dt.date(2018, 12, 31)
@@ -536,15 +533,8 @@ def market_index_statistics():
             adf = max(adf_c, adf_ct, adf_ctt, adf_nc)
 
             # worse case of SPA
-            spa_value = 0
-            for _ in range(10):
-                spa = arch_comp.SPA(rois.data, np.zeros(rois.size),
-                                    reps=1000)
-                spa.seed(np.random.randint(0, 2 ** 31 - 1))
-                spa.compute()
-                # preserve the worse p_value
-                if spa.pvalues[1] > spa_value:
-                    spa_value = spa.pvalues[1]
+            spa_value = float(batch_spa_pvalues(rois.values,
+                                                n_trial=10)[0, 1])
 
             writer.writerow({
                 "symbol": mkt_symbol,
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+benchmarks of the sampling methods.
+
+The targets and the random streams are seeded by (seed, case), so the runs
+on different machines or different versions time the same work. The
+results are saved as JSON, and a previous result file can be given to
+report the regressions.
+
+usage:
+    python benchmark.py -o bench.json
+    python benchmark.py -o new.json --baseline bench.json --threshold 1.2
+"""
+
+import json
+import logging
+import platform
+import sys
+from time import perf_counter
+
+import numpy as np
+import scipy
+
+from portfolio_programming.sampling.bootstrap import stationary_bootstrap
+from portfolio_programming.sampling.cubic_transform_sampling import (
+    cubic_transform_sampling)
+from portfolio_programming.sampling.mcmc import mcmc_sampling, pdf_gamma
+from portfolio_programming.sampling.moment_matching import (
+    heuristic_moment_matching as HeMM)
+
+HEMM_N_RVS = (5, 10, 30, 50)
+HEMM_N_SCENARIOS = (200, 1000, 5000)
+CT_N_SAMPLES = (1000, 10000, 100000)
+BOOTSTRAP_N_PERIODS = (250, 1000, 5000)
+MCMC_N_SAMPLES = (1000, 10000)
+
+
+def case_seed(seed, case):
+    """
+    Returns:
+    -------------
+    integer, seed of numpy.random of a benchmark case
+    """
+    return int(np.random.SeedSequence(
+        [seed] + [ord(c) for c in case]).generate_state(1)[0])
+
+
+def hemm_targets(n_rv, seed):
+    """
+    the moments and the correlation matrix of a one-factor model, which
+    are similar to those of the daily stock returns.
+
+    Returns:
+    -------------
+    tgt_moments: numpy.array, shape: (n_rv, 4)
+    tgt_corrs: numpy.array, shape: (n_rv, n_rv)
+    """
+    rs = np.random.RandomState(seed)
+    tgt_moments = np.column_stack((
+        rs.uniform(-1e-3, 1e-3, n_rv),
+        rs.uniform(0.01, 0.03, n_rv),
+        rs.uniform(-0.5, 0.5, n_rv),
+        rs.uniform(1., 3., n_rv),
+    ))
+    loadings = rs.uniform(0.3, 0.7, n_rv)
+    tgt_corrs = np.outer(loadings, loadings)
+    np.fill_diagonal(tgt_corrs, 1.)
+    return tgt_moments, tgt_corrs
+
+
+def time_function(func, n_repeat, seed, n_warmup=1):
+    """
+    Parameters:
+    -------------
+    func: callable without argument
+    n_repeat: positive integer
+    seed: integer, numpy.random is reseeded before each run
+    n_warmup: non-negative integer, number of the untimed runs, which
+        exclude the one-time costs such as the building of the tables.
+
+    Returns:
+    -------------
+    dict, the min, median, and max seconds of the runs, and the number of
+    the failed runs which raise ValueError.
+    """
+    for _ in range(n_warmup):
+        np.random.seed(seed)
+        try:
+            func()
+        except ValueError:
+            pass
+
+    secs, n_fail = [], 0
+    for _ in range(n_repeat):
+        np.random.seed(seed)
+        t0 = perf_counter()
+        try:
+            func()
+        except ValueError as e:
+            n_fail += 1
+            logging.warning("failed run: {}".format(e))
+        secs.append(perf_counter() - t0)
+    return {
+        "min_secs": float(np.min(secs)),
+        "median_secs": float(np.median(secs)),
+        "max_secs": float(np.max(secs)),
+        "n_repeat": n_repeat,
+        "n_fail": n_fail,
+    }
+
+
+def benchmark_cases(seed=0):
+    """
+    Returns:
+    -------------
+    list of (case name, parameters, callable)
+    """
+    cases = []
+    for n_rv in HEMM_N_RVS:
+        tgt_moments, tgt_corrs = hemm_targets(n_rv, seed)
+        for n_scenario in HEMM_N_SCENARIOS:
+            cases.append((
+                "hemm_rv{}_s{}".format(n_rv, n_scenario),
+                {"n_rv": n_rv, "n_scenario": n_scenario},
+                lambda m=tgt_moments, c=tgt_corrs, n=n_scenario: HeMM(
+                    m, c, n, False, 1e-3, 1e-3)))
+
+    ct_moments = np.array([0., 0.02, 0.3, 2.])
+    for n_sample in CT_N_SAMPLES:
+        cases.append((
+            "ct_s{}".format(n_sample),
+            {"n_sample": n_sample},
+            lambda n=n_sample: cubic_transform_sampling(ct_moments, n)))
+
+    for n_period in BOOTSTRAP_N_PERIODS:
+        series = np.random.RandomState(seed).randn(n_period)
+        cases.append((
+            "stationary_bootstrap_p{}".format(n_period),
+            {"n_period": n_period},
+            lambda s=series: stationary_bootstrap(s, 0.1)))
+
+    for n_sample in MCMC_N_SAMPLES:
+        cases.append((
+            "mcmc_gamma_s{}".format(n_sample),
+            {"n_sample": n_sample},
+            lambda n=n_sample: mcmc_sampling(pdf_gamma, n)))
+    return cases
+
+
+def run_benchmarks(seed=0, n_repeat=3, pattern=None):
+    """
+    Parameters:
+    -------------
+    seed: integer
+    n_repeat: positive integer
+    pattern: str, optional, only the cases whose names contain the pattern
+
+    Returns:
+    -------------
+    dict, the environment and the results of the cases
+    """
+    results = {}
+    for name, params, func in benchmark_cases(seed):
+        if pattern and pattern not in name:
+            continue
+        result = time_function(func, n_repeat, case_seed(seed, name))
+        result.update(params)
+        results[name] = result
+        logging.info("{}: {:.4f} secs".format(name, result['median_secs']))
+
+    return {
+        "environment": {
+            "node": platform.node(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "processor": platform.processor(),
+        },
+        "seed": seed,
+        "results": results,
+    }
+
+
+def compare_benchmarks(baseline, current, threshold=1.2):
+    """
+    Parameters:
+    -------------
+    baseline, current: dict, results of run_benchmarks
+    threshold: float, a case is regressed if its median time is larger than
+        threshold times of that of the baseline.
+
+    Returns:
+    -------------
+    dict, key: case name, value: ratio of the median times of the
+    regressed cases
+    """
+    regressions = {}
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = (result['median_secs'] /
+                 baseline['results'][name]['median_secs'])
+        if ratio > threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(
+        stream=sys.stdout,
+        format='%(asctime)s %(levelname)s: %(message)s',
+        datefmt='%Y%m%d-%H:%M:%S',
+        level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="path of the JSON result file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-r", "--n_repeat", type=int, default=3)
+    parser.add_argument("-k", "--pattern", type=str, default=None,
+                        help="only the cases containing the pattern")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="path of the JSON result file to compare")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.seed, args.n_repeat, args.pattern)
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(report, fout, indent=2, sort_keys=True)
+        print("results saved to {}".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)
+        regressions = compare_benchmarks(baseline, report, args.threshold)
+        for name, ratio in sorted(regressions.items()):
+            print("regression {}: {:.2f}x".format(name, ratio))
+        if regressions:
+            sys.exit(1)
@@ -52,7 +52,7 @@ def stationary_bootstrap(series, q_value=0.5):
     """
     n_period = len(series)
 
-    s_indices = np.zeros(n_period, dtype=np.int)
+    s_indices = np.zeros(n_period, dtype=np.intp)
     s_indices[0] = np.random.randint(0, n_period)
 
     for t in range(1, n_period):
@@ -69,5 +69,56 @@ def stationary_bootstrap(series, q_value=0.5):
     return samples
 
 
+def stationary_bootstrap_indices(n_period, n_rep, q_value=0.5,
+                                 random_state=None):
+    """
+    the indices of n_rep stationary bootstrap samples, which are generated
+    in a vectorized way.
+
+    Parameters:
+    ---------------
+    n_period : positive integer, length of the data series
+    n_rep : positive integer, number of the bootstrap samples
+    q_value : float
+        the probability of starting a new block, the mean block size
+        is 1/Q.
+    random_state : numpy.random.RandomState, optional
+
+    Returns:
+    ---------------
+    numpy.array, shape: (n_rep, n_period), dtype: numpy.intp
+    """
+    rs = random_state if random_state is not None else np.random
+    restarts = rs.rand(n_rep, n_period) < q_value
+    restarts[:, 0] = True
+    starts = rs.randint(0, n_period, (n_rep, n_period))
+
+    # the position of the last block start
+    periods = np.arange(n_period)
+    last = np.maximum.accumulate(np.where(restarts, periods, 0), axis=1)
+    indices = np.take_along_axis(starts, last, axis=1) + periods - last
+    return (indices % n_period).astype(np.intp)
+
+
+def bootstrap_counts(indices, n_period):
+    """
+    Parameters:
+    ---------------
+    indices : numpy.array, shape: (n_rep, n_sample), bootstrap indices
+    n_period : positive integer, length of the data series
+
+    Returns:
+    ---------------
+    numpy.array, shape: (n_rep, n_period), the number of times each
+    period is drawn in each sample, so that the sample means of a matrix
+    X of shape (n_series, n_period) is X @ counts.T / n_sample.
+    """
+    n_rep = indices.shape[0]
+    offsets = (np.arange(n_rep) * n_period)[:, np.newaxis]
+    return np.bincount((indices + offsets).ravel(),
+                       minlength=n_rep * n_period).reshape(
+        n_rep, n_period).astype(np.float64)
+
+
 if __name__ == '__main__':
     pass
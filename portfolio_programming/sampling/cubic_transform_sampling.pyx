@@ -10,122 +10,68 @@ with given first four moments.
 """
 
 import numpy as np
-import scipy.optimize as spopt
+from portfolio_programming.sampling.moment_matching import (
+    raw_moments, cubic_transform, batch_cubic_solver, fleishman_feasible,
+    fleishman_initial_params)
 from numpy.math cimport INFINITY
+from libc.math cimport sqrt
 cimport numpy as cnp
 
 
-cpdef cubic_function(cnp.ndarray[cnp.float64_t, ndim=1] cubic_params,
-                     cnp.ndarray[cnp.float64_t, ndim=1] sample_moments,
-                     cnp.ndarray[cnp.float64_t, ndim=1] tgt_moments):
-    """
-    Parameters:
-    ----------------
-    cubic_params: (a,b,c,d), four floats
-    sample_moments: numpy.array, shape:(12,), 1~12 moments of samples
-    tgt_moments: numpy.array, shape:(4,), 1~4th moments of target
-    """
-    cdef:
-        double a, b, c, d
-        double a2, a3, a4
-        double b2, b3, b4
-        double c2, c3, c4
-        double d2, d3, d4
-        double ab, ac, ad, acd, bd, bc, bcd, cd
-        cnp.ndarray[cnp.float64_t, ndim=1] ex, ey
-        double v1, v2, v3, v4
-
-    a, b, c, d = cubic_params
-    ex = sample_moments
-    ey = tgt_moments
-
-    a2 = a * a
-    a3 = a2 * a
-    a4 = a2 * a2
-
-    b2 = b * b
-    b3 = b2 * b
-    b4 = b2 * b2
-
-    c2 = c * c
-    c3 = c2 * c
-    c4 = c2 * c2
-
-    d2 = d * d
-    d3 = d2 * d
-    d4 = d2 * d2
-
-    ab = a * b
-    ac = a * c
-    ad = a * d
-    acd = ac * d
-    bd = b * d
-    bc = b * c
-    bcd = bc * d
-    cd = c * d
-
-    v1 = (a + b * ex[0] + c * ex[1] + d * ex[2] - ey[0])
-
-    v2 = (d2 * ex[5] +
-          2 * cd * ex[4] +
-          (2 * bd + c2) * ex[3] +
-          2 * (ad + bc) * ex[2] +
-          (2 * ac + b2) * ex[1] +
-          2 * ab * ex[0] +
-          a2 - ey[1])
-
-    v3 = ((d3) * ex[8] +
-          (3 * c * d2) * ex[7] +
-          3 * (b * d2 + c2 * d) * ex[6] +
-          (3 * a * d2 + 6 * bcd + c3) * ex[5] +
-          3 * (2 * acd + b2 * d + b * c2) * ex[4] +
-          (a * (6 * bd + 3 * c2) + 3 * b2 * c) * ex[3] +
-          (3 * a2 * d + 6 * a * bc + b3) * ex[2] +
-          3 * (a2 * c + a * b2) * ex[1] +
-          3 * a2 * b * ex[0] +
-          a3 - ey[2])
-
-    v4 = (d4 * ex[11] +
-          (4 * cd * d2) * ex[10] +
-          (4 * bd * d2 + 6 * c2 * d2) * ex[9] +
-          4 * (ad * d2 + 3 * bc * d2 + c3 * d) * ex[8] +
-          (12 * ac * d2 + 6 * b2 * d2 + 12 * bd * c2 + c4) * ex[7] +
-          4 * (3 * ad * (bd + c2) + bc * (3 * bd + c2)) * ex[6] +
-          (6 * a2 * d2 + ac * (24 * bd + 4 * c2) +
-           4 * b3 * d + 6 * b2 * c2) * ex[5] +
-          (12 * a2 * cd + 12 * ab * (bd + c2) + 4 * b2 * bc) * ex[4] +
-          (a2 * (12 * bd + 6 * c2) + 12 * ac * b2 + b4) * ex[3] +
-          4 * a * (a * ad + 3 * a * bc + b3) * ex[2] +
-          a2 * (4 * ac + 6 * b2) * ex[1] +
-          (4 * a2 * ab) * ex[0] +
-          a4 - ey[3])
-
-    return v1, v2, v3, v4
-
-
-
 cpdef cubic_transform_sampling(
-        cnp.ndarray[cnp.float64_t, ndim=1] tgt_moments,
+        tgt_moments,
         int n_sample=10000,
-        double max_cubic_err=1e-3
+        double max_cubic_err=1e-3,
+        random_states=None,
     ):
     """
     given the target mean, standard deviation, skewness, excess kurtosis
     the function will return the samples match the four statistics.
 
+    The random variables of a moment matrix are transformed together, the
+    raw moments and the cubic parameters of all random variables are
+    computed by the batch functions in one call per iteration.
+
     Parameters
     ---------------------------
-    tgt_moments, list or numpy.array of size 4
+    tgt_moments, list or numpy.array of size 4, or numpy.array of shape
+        (n_rv, 4)
     n_sample, positive integer
+    max_cubic_err: float, max error of the cubic parameters
+    random_states: list of numpy.random.RandomState, optional, the random
+        stream of each random variable, default is numpy.random.
 
     Returns
     -----------------
-    the samples which match the target moments.
-    """
-
+    the samples which match the target moments, shape: (n_sample,) or
+    (n_rv, n_sample).
 
+    Raises
+    -----------------
+    ValueError if the (skew, ex-kurt) is outside the Fleishman region.
+    """
+    tgt_moments = np.asarray(tgt_moments, dtype=np.float64)
+    if tgt_moments.ndim == 1:
+        if random_states is not None:
+            random_states = [random_states]
+        return _batch_cubic_transform_sampling(
+            tgt_moments[np.newaxis, :], n_sample, max_cubic_err,
+            random_states)[0]
+    return _batch_cubic_transform_sampling(tgt_moments, n_sample,
+                                           max_cubic_err, random_states)
+
+
+cdef _batch_cubic_transform_sampling(
+        cnp.ndarray[cnp.float64_t, ndim=2] tgt_moments,
+        int n_sample,
+        double max_cubic_err,
+        random_states):
+    """
+    the samples of the moment matrix, shape: (n_rv, n_sample)
+    """
     # to generate samples Y with zero mean, and unit variance
     cdef:
+        Py_ssize_t n_rv = tgt_moments.shape[0]
         double ns = float(n_sample)
         double ns_m1 = ns - 1.
         double ns_m1_2 = ns_m1 * ns_m1
@@ -139,57 +85,78 @@ cpdef cubic_transform_sampling(
         # cubic transform iteration
         int max_cubic_iter = 2
 
-        double cubic_err = INFINITY
-        double best_cub_err = INFINITY
-
-        cnp.ndarray[cnp.float64_t, ndim=1] y_moments = np.zeros(4)
-        cnp.ndarray[cnp.float64_t, ndim=1] results = np.zeros(n_sample)
-        cnp.ndarray[cnp.float64_t, ndim=1] tmp_out = np.empty(n_sample)
-        cnp.ndarray[cnp.float64_t, ndim=1] ex = np.empty(12)
-
-    y_moments[1] = ns_m1 / ns
-    y_moments[2] = (tgt_moments[2] * ns_m1 * ns_m2 / ns2)
-    y_moments[3] = ((tgt_moments[3] + 3 * ns_m1_2 / ns_m2 /
-                     ns_m3) * ns_m2 * ns_m3 * ns_m1_2 / (ns2 - 1) / ns2)
+        cnp.ndarray[cnp.float64_t, ndim=1] cubic_errs
+        cnp.ndarray[cnp.float64_t, ndim=1] best_cub_errs = np.full(
+            n_rv, INFINITY)
+        cnp.ndarray[cnp.float64_t, ndim=2] y_moments = np.zeros((n_rv, 4))
+        cnp.ndarray[cnp.float64_t, ndim=2] results = np.zeros(
+            (n_rv, n_sample))
+        cnp.ndarray[cnp.float64_t, ndim=2] tmp_out
+        cnp.ndarray[cnp.float64_t, ndim=2] init_params
+        cnp.ndarray[cnp.float64_t, ndim=1] y_skews, y_ex_kurts
+
+    if random_states is not None and len(random_states) != n_rv:
+        raise ValueError("{} random states of {} random variables.".format(
+            len(random_states), n_rv))
+
+    y_moments[:, 1] = ns_m1 / ns
+    y_moments[:, 2] = (tgt_moments[:, 2] * ns_m1 * ns_m2 / ns2)
+    y_moments[:, 3] = ((tgt_moments[:, 3] + 3 * ns_m1_2 / ns_m2 /
+                        ns_m3) * ns_m2 * ns_m3 * ns_m1_2 / (ns2 - 1) / ns2)
+
+    # the samples are transformed from the standard normal r.v., the
+    # targets outside the Fleishman region are impossible.
+    y_skews = y_moments[:, 2] / (y_moments[:, 1] * np.sqrt(y_moments[:, 1]))
+    y_ex_kurts = y_moments[:, 3] / y_moments[:, 1] ** 2 - 3.
+    feasible = fleishman_feasible(y_skews, y_ex_kurts)
+    if not np.all(feasible):
+        rdx = int(np.argmin(feasible))
+        raise ValueError("(skew, ex-kurt) of r.v. {}: ({}, {}) is outside "
+                         "the Fleishman region.".format(
+            rdx, tgt_moments[rdx, 2], tgt_moments[rdx, 3]))
+    init_params = (fleishman_initial_params(y_skews, y_ex_kurts) *
+                   np.sqrt(y_moments[:, 1])[:, np.newaxis])
 
     for _ in range(max_start_iter):
-        # each random variable consists of n_scenario random sample
-        tmp_out = np.random.randn(n_sample)
-
-        # loop until cubic transform converge
+        # each random variable consists of n_sample random sample
+        if random_states is None:
+            tmp_out = np.random.randn(n_rv, n_sample)
+        else:
+            tmp_out = np.array([rs.randn(n_sample) for rs in random_states])
+
+        # loop until cubic transform converge, the converged random
+        # variables are not transformed again.
+        cubic_errs = np.full(n_rv, INFINITY)
+        active = np.arange(n_rv)
         for cub_iter in range(max_cubic_iter):
 
             # 1~12th moments of the random samples
-            ex = np.asarray([(tmp_out ** (idx + 1)).mean()
-                             for idx in range(12)])
+            ex = raw_moments(tmp_out[active], 12)
 
             # find corresponding cubic parameters
-            x_init = np.array([0., 1., 0., 0.])
-            out = spopt.leastsq(cubic_function, x_init, args=(ex, y_moments),
-                                full_output=True, ftol=1E-12,
-                                xtol=1E-12)
-            cubic_params = out[0]
-            cubic_err = np.sum(out[2]['fvec'] ** 2)
+            params, errs = batch_cubic_solver(ex, y_moments[active],
+                                              init_params[active])
+            cubic_errs[active] = errs
 
             # update random samples
-            tmp_out = (cubic_params[0] +
-                       cubic_params[1] * tmp_out +
-                       cubic_params[2] * (tmp_out ** 2) +
-                       cubic_params[3] * (tmp_out ** 3))
+            tmp_out[active] = cubic_transform(tmp_out[active], params)
 
-            if cubic_err < max_cubic_err:
+            not_converged = errs >= max_cubic_err
+            if not not_converged.any():
                 # break cubic loop
                 break
             else:
                 print("cub_iter:{}, cub_error: {}, not converge".format(
-                    cub_iter, cubic_err))
+                    cub_iter, errs[not_converged]))
+            active = active[not_converged]
 
         # accept current samples
-        if cubic_err < best_cub_err:
-            best_cub_err = cubic_err
-            results = tmp_out
+        better = cubic_errs < best_cub_errs
+        best_cub_errs[better] = cubic_errs[better]
+        results[better] = tmp_out[better]
 
     # rescale data to original moments
-    results = results * tgt_moments[1] + tgt_moments[0]
+    results = (results * tgt_moments[:, 1][:, np.newaxis] +
+               tgt_moments[:, 0][:, np.newaxis])
 
     return results
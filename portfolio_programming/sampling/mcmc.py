@@ -3,7 +3,6 @@
 Author: Hung-Hsin Chen <chen1116@gmail.com>
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import scipy.special as spsp
 
@@ -65,6 +64,8 @@ def pdf_Boltzmann_distribution(x, a=5):
 
 
 def plot_samples():
+    import matplotlib.pyplot as plt
+
     fig, axes = plt.subplots(4)
 
     # standard normal distribution
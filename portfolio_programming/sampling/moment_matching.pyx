@@ -19,11 +19,12 @@ note: correlation, skewness, and kurtosis do not affected by scaling and
 
 import numpy as np
 import numpy.linalg as la
-import scipy.optimize as spopt
+import scipy.linalg as spla
 import scipy.stats as spstats
 from time import time
 
 from numpy.math cimport INFINITY
+from libc.math cimport fabs, fmax, sqrt
 cimport numpy as cnp
 
 cpdef heuristic_moment_matching(
@@ -47,7 +48,8 @@ cpdef heuristic_moment_matching(
     max_err_moment: float, max moment of error between tgt_moments and
         sample moments
     max_err_corr: float, max moment of error between tgt_corrs and
-        sample correlation matrix
+        sample correlation matrix, if tgt_corrs is not positive definite,
+        it is replaced by the nearest correlation matrix.
 
     Returns:
     -------------
@@ -76,15 +78,15 @@ cpdef heuristic_moment_matching(
         # shape: (n_rv, 4)
         cnp.ndarray[cnp.float64_t, ndim=2] y_moments = np.zeros((n_rv, 4))
 
-        double cubic_err, best_cub_err
         double moment_err, corrs_err
-        int cub_iter, idx
+        int cub_iter, start_iter
 
-        cnp.ndarray[cnp.float64_t, ndim=1] ex = np.empty(4)
-        cnp.ndarray[cnp.float64_t, ndim=1] ey = np.empty(12)
-        cnp.ndarray[cnp.float64_t, ndim=1] tmp_out = np.zeros(n_scenario)
-        cnp.ndarray[cnp.float64_t, ndim=1] x_init
-        cnp.ndarray[cnp.float64_t, ndim=2] c_lower, out_corrs, co_inv, l_vec
+        cnp.ndarray[cnp.float64_t, ndim=3] start_samples
+        cnp.ndarray[cnp.float64_t, ndim=2] tmp_mtx, ex_mtx, cubic_params
+        cnp.ndarray[cnp.float64_t, ndim=2] init_params
+        cnp.ndarray[cnp.float64_t, ndim=1] y_skews, y_ex_kurts
+        cnp.ndarray[cnp.float64_t, ndim=1] cubic_errs, best_cubic_errs
+        cnp.ndarray[cnp.float64_t, ndim=2] c_lower, out_corrs, co_lower, l_vec
 
         double ns = float(n_scenario)
         double ns_m1 = ns - 1.
@@ -104,52 +106,73 @@ cpdef heuristic_moment_matching(
         y_moments[:, 3] = ((tgt_moments[:, 3] + 3 * ns_m1_2 / ns_m2 /
                             ns_m3) * ns_m2 * ns_m3 * ns_m1_2 / (ns2 - 1) / ns2)
 
+    # standardized skewness and excess kurtosis of the targets, the
+    # kurtosis of any distribution is not less than skewness^2 + 1, and the
+    # initial cubic parameters are interpolated from the Fleishman table.
+    y_skews = y_moments[:, 2] / y_moments[:, 1] ** 1.5
+    y_ex_kurts = y_moments[:, 3] / y_moments[:, 1] ** 2 - 3.
+    infeasible = np.flatnonzero(y_ex_kurts < y_skews * y_skews - 2.)
+    if len(infeasible):
+        raise ValueError("infeasible (skew, ex-kurt) of r.v. {}: {}".format(
+            infeasible.tolist(),
+            list(zip(y_skews[infeasible], y_ex_kurts[infeasible]))))
+    init_params = (fleishman_initial_params(y_skews, y_ex_kurts) *
+                   np.sqrt(y_moments[:, 1])[:, np.newaxis])
+
     # find good start moment matrix (with err_moment converge)
+    # each random variable consists of n_scenario random sample
+    # the Gaussian r.v. perform better than uniform r.v.
+    # the samples are drawn in the order of (rv, start_iter).
+    start_samples = np.empty((max_start_iter, n_rv, n_scenario))
     for rv in range(n_rv):
-        cubic_err, best_cub_err = INFINITY, INFINITY
-
-        # loop until errMom converge
-        for _ in range(max_start_iter):
-            # each random variable consists of n_scenario random sample
-            # the Gaussian r.v. perform better than uniform r.v.
-            tmp_out = np.random.randn(n_scenario)
-
-            # 1~4th moments of the random variable, shape (4, )
-            ey = y_moments[rv, :]
-
-            # loop until cubic transform converge
-            for cub_iter in range(max_cubic_iter):
-
-                # 1~12th moments of the random samples
-                ex = np.asarray([(tmp_out ** (idx + 1)).mean()
-                                 for idx in range(12)])
-
-                # find corresponding cubic parameters
-                x_init = np.array([0., 1., 0., 0.])
-                out = spopt.leastsq(cubic_function, x_init, args=(ex, ey),
-                                    full_output=True, ftol=1E-12,
-                                    xtol=1E-12)
-                cubic_params = out[0]
-                cubic_err = np.sum(out[2]['fvec'] ** 2)
-
-                # update random samples
-                tmp_out = (cubic_params[0] +
-                           cubic_params[1] * tmp_out +
-                           cubic_params[2] * (tmp_out ** 2) +
-                           cubic_params[3] * (tmp_out ** 3))
-
-                if cubic_err < max_cubic_err:
-                    # break starter loop
-                    break
-                else:
-                    if verbose:
-                        print("rv:{}, cubiter:{}, cubErr: {}, "
-                              "not converge".format(rv, cub_iter, cubic_err))
-
-            # accept current samples
-            if cubic_err < best_cub_err:
-                best_cub_err = cubic_err
-                out_mtx[rv, :] = tmp_out
+        for start_iter in range(max_start_iter):
+            start_samples[start_iter, rv, :] = np.random.randn(n_scenario)
+
+    best_cubic_errs = np.full(n_rv, INFINITY)
+    for start_iter in range(max_start_iter):
+        tmp_mtx = start_samples[start_iter]
+        cubic_errs = np.full(n_rv, INFINITY)
+        pending = np.arange(n_rv)
+
+        # loop until cubic transform converge
+        for cub_iter in range(max_cubic_iter):
+            # 1~12th moments of the random samples, shape: (n_pending, 12)
+            ex_mtx = raw_moments(tmp_mtx[pending], 12)
+
+            # find corresponding cubic parameters
+            cubic_params, cubic_errs[pending] = batch_cubic_solver(
+                ex_mtx, y_moments[pending], init_params[pending])
+
+            # update random samples
+            tmp_mtx[pending] = cubic_transform(tmp_mtx[pending],
+                                               cubic_params)
+
+            if verbose:
+                for rv in pending[cubic_errs[pending] >= max_cubic_err]:
+                    print("rv:{}, cubiter:{}, cubErr: {}, "
+                          "not converge".format(rv, cub_iter,
+                                                cubic_errs[rv]))
+
+            # the converged r.v. break cubic loop
+            pending = pending[cubic_errs[pending] >= max_cubic_err]
+            if len(pending) == 0:
+                break
+
+        # accept current samples
+        accepted = cubic_errs < best_cubic_errs
+        best_cubic_errs[accepted] = cubic_errs[accepted]
+        out_mtx[accepted] = tmp_mtx[accepted]
+
+    # Cholesky decomposition of target corr mtx, the sample correlation
+    # matrix of a short window may be not positive definite.
+    try:
+        c_lower = la.cholesky(tgt_corrs)
+    except la.LinAlgError:
+        tgt_corrs = nearest_correlation_matrix(tgt_corrs)
+        c_lower = la.cholesky(tgt_corrs)
+        if verbose:
+            print("tgt_corrs is not positive definite, replaced by the "
+                  "nearest correlation matrix.")
 
     # computing starting properties and error
     # correct moment, but wrong correlation
@@ -159,18 +182,17 @@ cpdef heuristic_moment_matching(
         print('start mtx (orig) moment_err:{}, corr_err:{}'.format(
             moments_err, corrs_err))
 
-    # Cholesky decomposition of target corr mtx
-    c_lower = la.cholesky(tgt_corrs)
-
     # main iteration, break when converge
     for main_iter in range(max_main_iter):
         if moments_err < max_moment_err and corrs_err < max_corr_err:
             break
 
-        # transfer mtx
+        # transfer mtx l_vec = c_lower * co_lower^-1, i.e. the solution of
+        # co_lower^T * l_vec^T = c_lower^T, which is lower triangular.
         out_corrs = np.corrcoef(out_mtx)
-        co_inv = la.inv(la.cholesky(out_corrs))
-        l_vec = np.dot(c_lower, co_inv)
+        co_lower = la.cholesky(out_corrs)
+        l_vec = spla.solve_triangular(co_lower, c_lower.T, trans='T',
+                                      lower=True, check_finite=False).T
         out_mtx = np.dot(l_vec, out_mtx)
 
         # wrong moment, correct correlation
@@ -183,35 +205,31 @@ cpdef heuristic_moment_matching(
         # after Cholesky decompsition ,the corr_err converges,
         # but the moment error may enlarge, hence it requires
         # cubic transform
-        for rv in range(n_rv):
-            cubic_err = INFINITY
-            tmp_out = out_mtx[rv, :]
-            ey = y_moments[rv, :]
-
-            # loop until cubic transform erro converge
-            for cub_iter in range(max_cubic_iter):
-                ex = np.asarray([(tmp_out ** (idx + 1)).mean()
-                                 for idx in range(12)])
-                x_init = np.array([0., 1., 0., 0.])
-                out = spopt.leastsq(cubic_function, x_init, args=(ex, ey),
-                                    full_output=True, ftol=1E-12, xtol=1E-12)
-                cubic_params = out[0]
-                cubic_err = np.sum(out[2]['fvec'] ** 2)
-
-                tmp_out = (cubic_params[0] +
-                           cubic_params[1] * tmp_out +
-                           cubic_params[2] * (tmp_out ** 2) +
-                           cubic_params[3] * (tmp_out ** 3))
-
-                if cubic_err < max_cubic_err:
-                    out_mtx[rv, :] = tmp_out
-                    break
-                else:
-                    if verbose:
-                        print("main_iter:{}, rv: {}, "
-                              "(orig) cub_iter:{}, "
-                              "cubErr: {}, not converge".format(
-                            main_iter, rv, cub_iter, cubic_err))
+        tmp_mtx = out_mtx.copy()
+        cubic_errs = np.full(n_rv, INFINITY)
+        pending = np.arange(n_rv)
+
+        # loop until cubic transform erro converge
+        for cub_iter in range(max_cubic_iter):
+            ex_mtx = raw_moments(tmp_mtx[pending], 12)
+
+            cubic_params, cubic_errs[pending] = batch_cubic_solver(
+                ex_mtx, y_moments[pending], init_params[pending])
+            tmp_mtx[pending] = cubic_transform(tmp_mtx[pending],
+                                               cubic_params)
+
+            converged = pending[cubic_errs[pending] < max_cubic_err]
+            out_mtx[converged] = tmp_mtx[converged]
+            if verbose:
+                for rv in pending[cubic_errs[pending] >= max_cubic_err]:
+                    print("main_iter:{}, rv: {}, "
+                          "(orig) cub_iter:{}, "
+                          "cubErr: {}, not converge".format(
+                        main_iter, rv, cub_iter, cubic_errs[rv]))
+
+            pending = pending[cubic_errs[pending] >= max_cubic_err]
+            if len(pending) == 0:
+                break
 
         moments_err, corrs_err = error_statistics(out_mtx, y_moments,
                                                   tgt_corrs)
@@ -269,6 +287,59 @@ cpdef heuristic_moment_matching(
             time() - t0))
     return out_mtx
 
+cpdef cnp.ndarray[cnp.float64_t, ndim=2] raw_moments(
+        cnp.ndarray[cnp.float64_t, ndim=2] samples,
+        int n_moment=12):
+    """
+    1~n_moment-th raw moments of all random variables in one pass over the
+    samples, the powers are accumulated by cumulative product instead of
+    n_moment separate power operations and temporary arrays.
+
+    Parameters:
+    ----------------
+    samples: numpy.array, shape: (n_rv, n_sample)
+    n_moment: positive integer
+
+    Returns:
+    ----------------
+    numpy.array, shape: (n_rv, n_moment)
+    """
+    cdef:
+        Py_ssize_t n_rv = samples.shape[0]
+        Py_ssize_t n_sample = samples.shape[1]
+        Py_ssize_t rdx, sdx, mdx
+        double val, power
+        cnp.ndarray[cnp.float64_t, ndim=2] moments = np.zeros(
+            (n_rv, n_moment))
+
+    for rdx in range(n_rv):
+        for sdx in range(n_sample):
+            val = samples[rdx, sdx]
+            power = 1.
+            for mdx in range(n_moment):
+                power *= val
+                moments[rdx, mdx] += power
+
+    return moments / n_sample
+
+
+cpdef cubic_transform(samples, cubic_params):
+    """
+    a + b * x + c * x^2 + d * x^3 by Horner's method
+
+    Parameters:
+    ----------------
+    samples: numpy.array, shape: (n_sample,) or (n_rv, n_sample)
+    cubic_params: numpy.array, shape: (4,) or (n_rv, 4)
+    """
+    cubic_params = np.asarray(cubic_params)
+    if cubic_params.ndim == 2:
+        a, b, c, d = [cubic_params[:, idx, np.newaxis] for idx in range(4)]
+    else:
+        a, b, c, d = cubic_params
+    return ((d * samples + c) * samples + b) * samples + a
+
+
 cpdef cubic_function(cnp.ndarray[cnp.float64_t, ndim=1] cubic_params,
                      cnp.ndarray[cnp.float64_t, ndim=1] sample_moments,
                      cnp.ndarray[cnp.float64_t, ndim=1] tgt_moments):
@@ -356,6 +427,407 @@ cpdef cubic_function(cnp.ndarray[cnp.float64_t, ndim=1] cubic_params,
 
     return v1, v2, v3, v4
 
+cdef void _fleishman_system(double *cubic_params, double *x_moments,
+                            double *tgt_moments, double *residuals,
+                            double *jacobian) noexcept nogil:
+    """
+    residuals and analytic Jacobian (row-major 4x4) of the Fleishman system
+    of a random variable, x_moments are the 0~12th moments of the samples.
+    """
+    cdef:
+        Py_ssize_t kdx, idx, jdx, n_coef = 1
+        double acc
+        # coefficients of y^k in ascending powers of x
+        double coefs[13]
+        double next_coefs[13]
+
+    coefs[0] = 1.
+    for kdx in range(4):
+        # coefs of y^kdx, d E(y^(kdx+1)) / d p_i = (kdx+1) E(y^kdx x^i)
+        for idx in range(4):
+            acc = 0.
+            for jdx in range(n_coef):
+                acc += coefs[jdx] * x_moments[jdx + idx]
+            jacobian[kdx * 4 + idx] = (kdx + 1) * acc
+
+        # coefs of y^(kdx+1)
+        for jdx in range(n_coef + 3):
+            next_coefs[jdx] = 0.
+        for jdx in range(n_coef):
+            for idx in range(4):
+                next_coefs[jdx + idx] += coefs[jdx] * cubic_params[idx]
+        n_coef += 3
+        acc = 0.
+        for jdx in range(n_coef):
+            coefs[jdx] = next_coefs[jdx]
+            acc += coefs[jdx] * x_moments[jdx]
+        residuals[kdx] = acc - tgt_moments[kdx]
+
+
+cdef bint _solve4(double *lhs, double *rhs, double *sol) noexcept nogil:
+    """
+    solving the 4x4 linear system (row-major lhs) by Gaussian elimination
+    with partial pivoting, lhs and rhs are overwritten.
+
+    Returns:
+    ----------------
+    False if the system is singular.
+    """
+    cdef:
+        Py_ssize_t row, col, pivot, idx
+        double tmp, factor
+
+    for col in range(4):
+        pivot = col
+        for row in range(col + 1, 4):
+            if fabs(lhs[row * 4 + col]) > fabs(lhs[pivot * 4 + col]):
+                pivot = row
+        if lhs[pivot * 4 + col] == 0.:
+            return False
+        if pivot != col:
+            for idx in range(4):
+                tmp = lhs[col * 4 + idx]
+                lhs[col * 4 + idx] = lhs[pivot * 4 + idx]
+                lhs[pivot * 4 + idx] = tmp
+            tmp = rhs[col]
+            rhs[col] = rhs[pivot]
+            rhs[pivot] = tmp
+        for row in range(col + 1, 4):
+            factor = lhs[row * 4 + col] / lhs[col * 4 + col]
+            for idx in range(col, 4):
+                lhs[row * 4 + idx] -= factor * lhs[col * 4 + idx]
+            rhs[row] -= factor * rhs[col]
+
+    for row in range(3, -1, -1):
+        tmp = rhs[row]
+        for idx in range(row + 1, 4):
+            tmp -= lhs[row * 4 + idx] * sol[idx]
+        sol[row] = tmp / lhs[row * 4 + row]
+    return True
+
+
+cpdef batch_cubic_function(
+        cnp.ndarray[cnp.float64_t, ndim=2] cubic_params,
+        cnp.ndarray[cnp.float64_t, ndim=2] sample_moments,
+        cnp.ndarray[cnp.float64_t, ndim=2] tgt_moments):
+    """
+    residuals and analytic Jacobian of the Fleishman system of all random
+    variables. Let y = a + b * x + c * x^2 + d * x^3, then the k-th moment
+    E(y^k) = sum_j coef(y^k)_j * E(x^j), and the derivative of E(y^k) with
+    respect to the i-th cubic parameter is k * E(y^(k-1) * x^i).
+
+    Parameters:
+    ----------------
+    cubic_params: numpy.array, shape: (n_rv, 4), (a, b, c, d)
+    sample_moments: numpy.array, shape: (n_rv, 12), 1~12 moments of samples
+    tgt_moments: numpy.array, shape: (n_rv, 4), 1~4th moments of target
+
+    Returns:
+    ----------------
+    residuals: numpy.array, shape: (n_rv, 4)
+    jacobian: numpy.array, shape: (n_rv, 4, 4)
+    """
+    cdef:
+        Py_ssize_t n_rv = cubic_params.shape[0]
+        Py_ssize_t rdx, idx
+        double params[4]
+        double x_moments[13]
+        double tgt[4]
+        double res[4]
+        double jac[16]
+        cnp.ndarray[cnp.float64_t, ndim=2] residuals = np.empty((n_rv, 4))
+        cnp.ndarray[cnp.float64_t, ndim=3] jacobian = np.empty((n_rv, 4, 4))
+
+    x_moments[0] = 1.
+    for rdx in range(n_rv):
+        for idx in range(12):
+            x_moments[idx + 1] = sample_moments[rdx, idx]
+        for idx in range(4):
+            params[idx] = cubic_params[rdx, idx]
+            tgt[idx] = tgt_moments[rdx, idx]
+
+        _fleishman_system(params, x_moments, tgt, res, jac)
+        for idx in range(4):
+            residuals[rdx, idx] = res[idx]
+        for idx in range(16):
+            jacobian[rdx, idx // 4, idx % 4] = jac[idx]
+
+    return residuals, jacobian
+
+
+cpdef batch_cubic_solver(
+        cnp.ndarray[cnp.float64_t, ndim=2] sample_moments,
+        cnp.ndarray[cnp.float64_t, ndim=2] tgt_moments,
+        init_params=None,
+        int max_iter=100,
+        double tol=1e-24,
+        double ftol=1e-12,
+        double xtol=1e-12):
+    """
+    solving the cubic parameters of all random variables in one call by the
+    Levenberg-Marquardt method with the analytic Jacobian, the iterations
+    are typed loops without any Python-level function evaluation.
+
+    Parameters:
+    ----------------
+    sample_moments: numpy.array, shape: (n_rv, 12), 1~12 moments of samples
+    tgt_moments: numpy.array, shape: (n_rv, 4), 1~4th moments of target
+    init_params: numpy.array, shape: (n_rv, 4), optional,
+        the default initial parameters are (0, 1, 0, 0).
+    max_iter: positive integer, maximum iterations
+    tol: float, the solving of a r.v. stops when its error is below tol.
+    ftol: float, relative reduction of the error to stop, as leastsq
+    xtol: float, relative change of the parameters to stop, as leastsq
+
+    Returns:
+    ----------------
+    cubic_params: numpy.array, shape: (n_rv, 4)
+    cubic_errs: numpy.array, shape: (n_rv,), sum of squared residuals
+    """
+    cdef:
+        Py_ssize_t n_rv = sample_moments.shape[0]
+        Py_ssize_t rdx, idx, jdx, kdx, n_iter
+        double err, trial_err, damping, acc, step_norm, param_norm
+        bint stop
+        double params[4]
+        double trial_params[4]
+        double x_moments[13]
+        double tgt[4]
+        double res[4]
+        double jac[16]
+        double trial_res[4]
+        double trial_jac[16]
+        double lhs[16]
+        double grad[4]
+        double step[4]
+        cnp.ndarray[cnp.float64_t, ndim=2] cubic_params
+        cnp.ndarray[cnp.float64_t, ndim=1] cubic_errs = np.empty(n_rv)
+
+    if init_params is None:
+        cubic_params = np.tile(np.array([0., 1., 0., 0.]), (n_rv, 1))
+    else:
+        cubic_params = np.array(init_params, dtype=np.float64)
+
+    x_moments[0] = 1.
+    for rdx in range(n_rv):
+        for idx in range(12):
+            x_moments[idx + 1] = sample_moments[rdx, idx]
+        for idx in range(4):
+            params[idx] = cubic_params[rdx, idx]
+            tgt[idx] = tgt_moments[rdx, idx]
+
+        _fleishman_system(params, x_moments, tgt, res, jac)
+        err = 0.
+        for idx in range(4):
+            err += res[idx] * res[idx]
+        damping = 1e-3
+
+        for n_iter in range(max_iter):
+            # converged, or the damping explodes (local minimum)
+            if err <= tol or damping >= 1e16:
+                break
+
+            # (J^T J + damping * diag(J^T J)) step = J^T r
+            for idx in range(4):
+                acc = 0.
+                for kdx in range(4):
+                    acc += jac[kdx * 4 + idx] * res[kdx]
+                grad[idx] = acc
+                for jdx in range(4):
+                    acc = 0.
+                    for kdx in range(4):
+                        acc += jac[kdx * 4 + idx] * jac[kdx * 4 + jdx]
+                    lhs[idx * 4 + jdx] = acc
+            for idx in range(4):
+                lhs[idx * 5] += damping * fmax(lhs[idx * 5], 1e-12)
+
+            if not _solve4(lhs, grad, step):
+                damping *= 10.
+                continue
+
+            step_norm, param_norm = 0., 0.
+            for idx in range(4):
+                trial_params[idx] = params[idx] - step[idx]
+                step_norm += step[idx] * step[idx]
+                param_norm += trial_params[idx] * trial_params[idx]
+            _fleishman_system(trial_params, x_moments, tgt, trial_res,
+                              trial_jac)
+            trial_err = 0.
+            for idx in range(4):
+                trial_err += trial_res[idx] * trial_res[idx]
+
+            if trial_err < err:
+                # accept the step and reduce the damping
+                stop = (err - trial_err <= ftol * err or
+                        sqrt(step_norm) <= xtol * sqrt(param_norm))
+                err = trial_err
+                for idx in range(4):
+                    params[idx] = trial_params[idx]
+                    res[idx] = trial_res[idx]
+                for idx in range(16):
+                    jac[idx] = trial_jac[idx]
+                damping *= 0.1
+                if stop:
+                    break
+            else:
+                # enlarge the damping toward the gradient descent direction
+                damping *= 10.
+
+        for idx in range(4):
+            cubic_params[rdx, idx] = params[idx]
+        cubic_errs[rdx] = err
+
+    return cubic_params, cubic_errs
+
+
+# grid of the Fleishman lookup table, (skewness, excess kurtosis)
+FLEISHMAN_SKEWS = np.round(np.arange(-4., 4. + 1e-9, 0.1), 10)
+FLEISHMAN_EX_KURTS = np.round(np.arange(-1.2, 40. + 1e-9, 0.2), 10)
+
+# 1~12th moments of the standard normal distribution
+NORMAL_MOMENTS = np.array([0., 1., 0., 3., 0., 15., 0., 105., 0., 945.,
+                           0., 10395.])
+
+_fleishman_table = None
+
+
+def fleishman_table():
+    """
+    the lookup table of the cubic parameters which transform the standard
+    normal r.v. to the (skewness, excess kurtosis) of the grid. The table is
+    solved by batch_cubic_solver on the first call (about 0.2 secs) and
+    cached in the module.
+
+    Fleishman, Allen I. "A method for simulating non-normal distributions."
+    Psychometrika 43.4 (1978): 521-532.
+
+    Returns:
+    ----------------
+    table_params: numpy.array, shape: (n_skew, n_ex_kurt, 4), the nodes
+        below the boundary take the parameters of the boundary node.
+    boundary: numpy.array, shape: (n_skew,), the minimum feasible excess
+        kurtosis of each skewness.
+    """
+    global _fleishman_table
+    if _fleishman_table is not None:
+        return _fleishman_table
+
+    skews, ex_kurts = np.meshgrid(FLEISHMAN_SKEWS, FLEISHMAN_EX_KURTS,
+                                  indexing='ij')
+    n_skew, n_ex_kurt = skews.shape
+    tgt_moments = np.column_stack((np.zeros(skews.size),
+                                   np.ones(skews.size),
+                                   skews.ravel(), ex_kurts.ravel() + 3.))
+    table_params, errs = batch_cubic_solver(
+        np.tile(NORMAL_MOMENTS, (skews.size, 1)), tgt_moments)
+    feasible = ((errs < 1e-20) & (table_params[:, 1] > 0)).reshape(
+        n_skew, n_ex_kurt)
+    table_params = table_params.reshape(n_skew, n_ex_kurt, 4)
+
+    # the feasible nodes of a skewness are above the lower boundary
+    first = feasible.argmax(axis=1)
+    for sdx in range(n_skew):
+        table_params[sdx, ~feasible[sdx]] = table_params[sdx, first[sdx]]
+
+    # refining the boundary between the grid nodes by bisection
+    low = FLEISHMAN_EX_KURTS[np.maximum(first - 1, 0)]
+    high = FLEISHMAN_EX_KURTS[first]
+    for _ in range(10):
+        mid = (low + high) / 2.
+        tgt_moments = np.column_stack((np.zeros(n_skew), np.ones(n_skew),
+                                       FLEISHMAN_SKEWS, mid + 3.))
+        params, errs = batch_cubic_solver(
+            np.tile(NORMAL_MOMENTS, (n_skew, 1)), tgt_moments,
+            table_params[np.arange(n_skew), first])
+        converged = (errs < 1e-20) & (params[:, 1] > 0)
+        high = np.where(converged, mid, high)
+        low = np.where(converged, low, mid)
+
+    _fleishman_table = table_params, high
+    return _fleishman_table
+
+
+def fleishman_feasible(skews, ex_kurts):
+    """
+    whether the (skewness, excess kurtosis) pairs are in the Fleishman
+    region of the lookup table, i.e., a cubic transform of the standard
+    normal r.v. reaches the moments.
+
+    Parameters:
+    ----------------
+    skews, ex_kurts: float or numpy.array, shape: (n_rv,)
+
+    Returns:
+    ----------------
+    numpy.array of boolean, shape: (n_rv,)
+    """
+    skews = np.asarray(skews, dtype=np.float64)
+    ex_kurts = np.asarray(ex_kurts, dtype=np.float64)
+    _, boundary = fleishman_table()
+    return ((np.abs(skews) <= FLEISHMAN_SKEWS[-1]) &
+            (ex_kurts <= FLEISHMAN_EX_KURTS[-1]) &
+            (ex_kurts >= np.interp(skews, FLEISHMAN_SKEWS, boundary)))
+
+
+def fleishman_project(skews, ex_kurts, double margin=0.05):
+    """
+    the nearest feasible (skewness, excess kurtosis) pairs of the Fleishman
+    region with the same skewness (clipped to the table).
+
+    Parameters:
+    ----------------
+    skews, ex_kurts: float or numpy.array, shape: (n_rv,)
+    margin: float, relative distance of the projected pairs to the
+        boundary, it absorbs the unbiased adjustment of the moments.
+
+    Returns:
+    ----------------
+    skews, ex_kurts: numpy.array, shape: (n_rv,)
+    """
+    skews = np.clip(np.asarray(skews, dtype=np.float64),
+                    FLEISHMAN_SKEWS[0], FLEISHMAN_SKEWS[-1])
+    _, boundary = fleishman_table()
+    boundary = np.interp(skews, FLEISHMAN_SKEWS, boundary)
+    ex_kurts = np.clip(np.asarray(ex_kurts, dtype=np.float64),
+                       boundary + margin * (1. + np.abs(boundary)),
+                       FLEISHMAN_EX_KURTS[-1])
+    return skews, ex_kurts
+
+
+def fleishman_initial_params(skews, ex_kurts):
+    """
+    the initial cubic parameters of the targets by the bilinear
+    interpolation of the lookup table, the targets outside the table are
+    clipped to the table.
+
+    Parameters:
+    ----------------
+    skews, ex_kurts: numpy.array, shape: (n_rv,)
+
+    Returns:
+    ----------------
+    numpy.array, shape: (n_rv, 4)
+    """
+    table_params, _ = fleishman_table()
+    n_skew, n_ex_kurt = table_params.shape[0], table_params.shape[1]
+
+    skew_pos = ((np.clip(skews, FLEISHMAN_SKEWS[0], FLEISHMAN_SKEWS[-1]) -
+                 FLEISHMAN_SKEWS[0]) / (FLEISHMAN_SKEWS[1] -
+                                        FLEISHMAN_SKEWS[0]))
+    kurt_pos = ((np.clip(ex_kurts, FLEISHMAN_EX_KURTS[0],
+                         FLEISHMAN_EX_KURTS[-1]) - FLEISHMAN_EX_KURTS[0]) /
+                (FLEISHMAN_EX_KURTS[1] - FLEISHMAN_EX_KURTS[0]))
+    sdx = np.minimum(np.floor(skew_pos).astype(np.intp), n_skew - 2)
+    kdx = np.minimum(np.floor(kurt_pos).astype(np.intp), n_ex_kurt - 2)
+    s_weight = (skew_pos - sdx)[:, np.newaxis]
+    k_weight = (kurt_pos - kdx)[:, np.newaxis]
+
+    return ((1 - s_weight) * (1 - k_weight) * table_params[sdx, kdx] +
+            (1 - s_weight) * k_weight * table_params[sdx, kdx + 1] +
+            s_weight * (1 - k_weight) * table_params[sdx + 1, kdx] +
+            s_weight * k_weight * table_params[sdx + 1, kdx + 1])
+
+
 cdef error_statistics(cnp.ndarray[cnp.float64_t, ndim=2] out_mtx,
                       cnp.ndarray[cnp.float64_t, ndim=2] tgt_moments,
                       cnp.ndarray[cnp.float64_t, ndim=2] tgt_corrs):
@@ -368,19 +840,77 @@ cdef error_statistics(cnp.ndarray[cnp.float64_t, ndim=2] out_mtx,
     """
     cdef:
         cnp.intp_t n_rv = out_mtx.shape[0]
-        cnp.ndarray[cnp.float64_t, ndim=2] out_moments = np.zeros((n_rv, 4))
+        cnp.ndarray[cnp.float64_t, ndim=2] out_moments
         cnp.ndarray[cnp.float64_t, ndim=2] out_corrs = np.corrcoef(out_mtx)
         double moments_err = INFINITY, corrs_err = INFINITY
-        int idx
 
-    for idx in range(4):
-        out_moments[:, idx] = (out_mtx ** (idx + 1)).mean(axis=1)
+    out_moments = raw_moments(out_mtx, 4)
 
     moments_err = rmse(out_moments, tgt_moments)
     corrs_err = rmse(out_corrs, tgt_corrs)
 
     return moments_err, corrs_err
 
+def nearest_correlation_matrix(corrs, double min_eigenvalue=1e-2,
+                               int max_iter=100, double tol=1e-10):
+    """
+    the nearest (Frobenius norm) positive definite correlation matrix by the
+    alternating projections with Dykstra's correction.
+
+    Higham, Nicholas J. "Computing the nearest correlation matrix - a
+    problem from finance." IMA Journal of Numerical Analysis 22.3 (2002):
+    329-343.
+
+    Parameters:
+    ----------------
+    corrs: numpy.array, shape: (n_rv, n_rv), symmetric matrix with unit
+        diagonal, the non-finite elements are treated as zeros.
+    min_eigenvalue: float, the lower bound of the eigenvalues relative to
+        their mean, which is 1 of a correlation matrix. A small bound
+        leaves the matrix nearly singular, and the moment matching
+        may not reach the correlation tolerance with few scenarios.
+    max_iter: positive integer
+    tol: float, tolerance of the change of the iteration
+
+    Returns:
+    ----------------
+    numpy.array, shape: (n_rv, n_rv)
+    """
+    corrs = np.nan_to_num(np.asarray(corrs, dtype=np.float64), nan=0.,
+                          posinf=1., neginf=-1.)
+    corrs = (corrs + corrs.T) / 2.
+    np.fill_diagonal(corrs, 1.)
+
+    y_mtx = corrs
+    correction = np.zeros_like(corrs)
+    for _ in range(max_iter):
+        # projection onto the positive semidefinite matrices
+        r_mtx = y_mtx - correction
+        eig_values, eig_vectors = la.eigh(r_mtx)
+        x_mtx = np.dot(eig_vectors * np.maximum(eig_values, min_eigenvalue),
+                       eig_vectors.T)
+        correction = x_mtx - r_mtx
+
+        # projection onto the matrices with unit diagonal
+        prev_y_mtx = y_mtx
+        y_mtx = x_mtx.copy()
+        np.fill_diagonal(y_mtx, 1.)
+        if la.norm(y_mtx - prev_y_mtx) < tol * la.norm(y_mtx):
+            break
+
+    # the unit diagonal projection may move the eigenvalues slightly below
+    # the bound, the final clipping and rescaling ensures definiteness.
+    eig_values, eig_vectors = la.eigh(y_mtx)
+    if eig_values[0] < min_eigenvalue:
+        y_mtx = np.dot(eig_vectors * np.maximum(eig_values, min_eigenvalue),
+                       eig_vectors.T)
+        scale = 1. / np.sqrt(np.diag(y_mtx))
+        y_mtx = y_mtx * np.outer(scale, scale)
+    y_mtx = (y_mtx + y_mtx.T) / 2.
+    np.fill_diagonal(y_mtx, 1.)
+    return y_mtx
+
+
 cdef rmse(cnp.ndarray[cnp.float64_t, ndim=2] src_arr,
           cnp.ndarray[cnp.float64_t, ndim=2] tgt_arr):
     """
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+from portfolio_programming.sampling.benchmark import (
+    run_benchmarks, compare_benchmarks)
+
+
+def test_benchmark():
+    report = run_benchmarks(seed=0, n_repeat=2, pattern="rv5_s")
+    assert set(report['results'].keys()) == {
+        "hemm_rv5_s200", "hemm_rv5_s1000", "hemm_rv5_s5000"}
+    for result in report['results'].values():
+        assert result['n_fail'] == 0
+        assert 0 < result['min_secs'] <= result['median_secs']
+
+    # the same report is not regressed
+    assert compare_benchmarks(report, report) == {}
+
+    slower = {"results": {name: dict(result,
+                                     median_secs=result['median_secs'] * 2)
+                          for name, result in report['results'].items()}}
+    assert set(compare_benchmarks(report, slower, 1.5).keys()) == set(
+        report['results'].keys())
@@ -17,6 +17,32 @@ def statistics(samples):
         spstats.kurtosis(samples, bias=False))
 
 
+def test_batch_cubic_transform_sampling(n_sample=1000):
+    tgt_moments = np.array([[0., 0.02, 0.3, 2.],
+                            [0.001, 0.01, -0.5, 1.],
+                            [10., 3., 0., 0.]])
+    samples = cubic_transform_sampling(tgt_moments, n_sample)
+    assert samples.shape == (3, n_sample)
+    np.testing.assert_allclose(samples.mean(axis=1), tgt_moments[:, 0],
+                               atol=1e-8)
+    np.testing.assert_allclose(samples.std(axis=1, ddof=1),
+                               tgt_moments[:, 1])
+    np.testing.assert_allclose(spstats.skew(samples, axis=1, bias=False),
+                               tgt_moments[:, 2], atol=1e-3)
+    np.testing.assert_allclose(
+        spstats.kurtosis(samples, axis=1, bias=False), tgt_moments[:, 3],
+        atol=1e-3)
+
+    # the random variables of the batch are the same as the single ones
+    batch = cubic_transform_sampling(
+        tgt_moments, n_sample, 1e-3,
+        [np.random.RandomState(idx) for idx in range(3)])
+    for idx in range(3):
+        single = cubic_transform_sampling(
+            tgt_moments[idx], n_sample, 1e-3, np.random.RandomState(idx))
+        np.testing.assert_array_equal(batch[idx], single)
+
+
 def plot_samples():
     import scipy.special as spsp
     import matplotlib.pyplot as plt
@@ -6,10 +6,14 @@ Authors: Hung-Hsin Chen <chen1116@gmail.com>
 
 from time import time
 import numpy as np
+import scipy.optimize as spopt
 import scipy.stats as spstats
 import pandas as pd
 from portfolio_programming.sampling.moment_matching import (
-    heuristic_moment_matching as HeMM)
+    heuristic_moment_matching as HeMM, raw_moments, cubic_function,
+    batch_cubic_function, batch_cubic_solver, fleishman_feasible,
+    fleishman_initial_params, fleishman_project, nearest_correlation_matrix,
+    NORMAL_MOMENTS)
 
 
 def test_biased_HeMM(n_rv=50, n_sample=100, n_scenario=500, precision=2):
@@ -172,5 +176,85 @@ def test_kurtosis(n_sample=100):
     np.testing.assert_allclose(ub_kurt, ub_kurt3)
 
 
+def test_raw_moments(n_rv=10, n_sample=200):
+    """ the fused kernel equals the moments of separate powers """
+    data = np.random.randn(n_rv, n_sample)
+    moments = raw_moments(data, 12)
+    for idx in range(12):
+        np.testing.assert_allclose(moments[:, idx],
+                                   (data ** (idx + 1)).mean(axis=1))
+
+
+def test_batch_cubic_solver(n_rv=20, n_sample=1000):
+    """ the batched solver matches the residuals of leastsq """
+    ex = raw_moments(np.random.randn(n_rv, n_sample), 12)
+    tgt_moments = np.zeros((n_rv, 4))
+    tgt_moments[:, 1] = 1.
+    tgt_moments[:, 2] = np.random.uniform(-0.5, 0.5, n_rv)
+    tgt_moments[:, 3] = np.random.uniform(3, 5, n_rv)
+
+    cubic_params, cubic_errs = batch_cubic_solver(ex, tgt_moments)
+    residuals, jacobian = batch_cubic_function(cubic_params, ex,
+                                               tgt_moments)
+    np.testing.assert_allclose(cubic_errs, (residuals ** 2).sum(axis=1))
+    assert cubic_errs.max() < 1e-20
+
+    for rv in range(n_rv):
+        np.testing.assert_allclose(
+            residuals[rv], cubic_function(cubic_params[rv], ex[rv],
+                                          tgt_moments[rv]), atol=1e-10)
+        # analytic and forward difference Jacobian
+        fd_jac = spopt.approx_fprime(
+            cubic_params[rv], lambda x: np.asarray(
+                cubic_function(x, ex[rv], tgt_moments[rv])), 1e-7)
+        np.testing.assert_allclose(jacobian[rv], fd_jac, rtol=1e-4, atol=1e-4)
+
+        out = spopt.leastsq(cubic_function, np.array([0., 1., 0., 0.]),
+                            args=(ex[rv], tgt_moments[rv]),
+                            full_output=True, ftol=1E-12, xtol=1E-12)
+        assert cubic_errs[rv] <= max(np.sum(out[2]['fvec'] ** 2), 1e-20)
+
+
+def test_fleishman_table(n_rv=50):
+    # the minimum excess kurtosis of the symmetric cubic transform
+    assert fleishman_feasible(0., -1.15)
+    assert not fleishman_feasible(0., -1.16)
+    assert not fleishman_feasible([1., 2.], [0., 4.]).any()
+    skews, ex_kurts = fleishman_project([1., 2.], [0., 4.])
+    assert fleishman_feasible(skews, ex_kurts).all()
+
+    # the interpolated parameters are close to the solutions
+    skews = np.random.uniform(-2, 2, n_rv)
+    ex_kurts = 1.5 * skews * skews + np.random.uniform(0, 5, n_rv)
+    tgt_moments = np.column_stack((np.zeros(n_rv), np.ones(n_rv), skews,
+                                   ex_kurts + 3))
+    init_params = fleishman_initial_params(skews, ex_kurts)
+    cubic_params, cubic_errs = batch_cubic_solver(
+        np.tile(NORMAL_MOMENTS, (n_rv, 1)), tgt_moments, init_params)
+    assert cubic_errs.max() < 1e-20
+    np.testing.assert_allclose(init_params, cubic_params, atol=1e-2)
+
+
+def test_nearest_correlation_matrix(n_scenario=200):
+    # the example of Higham (2002)
+    corrs = np.array([[2., -1., 0., 0.],
+                      [-1., 2., -1., 0.],
+                      [0., -1., 2., -1.],
+                      [0., 0., -1., 2.]])
+    np.fill_diagonal(corrs, 1.)
+    nearest = nearest_correlation_matrix(corrs, 0.)
+    np.testing.assert_allclose(nearest[0, :], [1., -0.8084, 0.1916, 0.1068],
+                               atol=1e-4)
+
+    # the non positive definite target correlation matrix is repaired
+    corrs = np.array([[1., 0.9, 0.7],
+                      [0.9, 1., -0.9],
+                      [0.7, -0.9, 1.]])
+    tgt_moments = np.tile([0., 0.02, 0.1, 0.5], (3, 1))
+    np.random.seed(0)
+    scenarios = HeMM(tgt_moments, corrs, n_scenario, False, 1e-3, 1e-2)
+    np.testing.assert_allclose(np.corrcoef(scenarios),
+                               nearest_correlation_matrix(corrs), atol=1e-2)
+
 if __name__ == '__main__':
     pass
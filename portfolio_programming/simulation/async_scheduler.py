@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+asyncio scheduler of the tasks on the local worker processes, which is
+the executor of the local sweeps and the scenario generation.
+
+Each task runs in its own child process, and at most n_worker tasks run
+concurrently, they are started in the order of params. The scheduler
+awaits the exits of the processes instead of polling them, and the events
+of the tasks are sent to the callback as they occur. A failed task is
+retried, and then recorded with the traceback of the child, without
+aborting the other tasks of the batch. The running processes are
+terminated if the batch is cancelled.
+
+event, a dict with the keys:
+    event: str, {"started", "finished", "retry", "failed"}
+    name: str, name of the task
+    elapsed: float, seconds of the run of the task
+    reason: str or None, reason of the retry or the failure
+    n_task, n_finished, n_failed, n_running, n_retry: integers
+    batch_elapsed: float, seconds since the start of the batch
+"""
+
+import asyncio
+import datetime as dt
+import logging
+import multiprocessing as mp
+import os
+import platform
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+
+# max characters of the traceback sent back to the scheduler, the tail of
+# the traceback contains the exception
+MAX_TRACEBACK_LEN = 4096
+
+
+def _run_task(func, args, conn):
+    """
+    the target of the child process, the traceback of the exception is
+    sent to the scheduler through the write end of a pipe.
+    """
+    try:
+        func(*args)
+    except Exception:
+        traceback.print_exc()
+        sys.stderr.flush()
+        conn.send(traceback.format_exc()[-MAX_TRACEBACK_LEN:])
+        conn.close()
+        # abnormal exit code for the scheduler
+        os._exit(1)
+    conn.close()
+
+
+def sweep_progress(n_task, n_finished, n_failed, n_running, n_retry,
+                   elapsed):
+    """
+    Returns:
+    -------------
+    str, the progress and the throughput of the tasks
+    """
+    n_done = n_finished + n_failed
+    throughput = n_finished / elapsed * 3600. if elapsed > 0 else 0.
+    if n_finished > 0:
+        eta = str(dt.timedelta(seconds=int(
+            elapsed / n_done * (n_task - n_done))))
+    else:
+        eta = "unknown"
+    return ("progress [{}/{}] {:.2%}, running: {}, failed: {}, retry: {}, "
+            "elapsed: {}, throughput: {:.2f} tasks/hour, eta: {}".format(
+        n_done, n_task, n_done / n_task if n_task else 1., n_running,
+        n_failed, n_retry, str(dt.timedelta(seconds=int(elapsed))),
+        throughput, eta))
+
+
+def log_task_event(event, with_progress=True):
+    """ the default callback, logging the events and the progress """
+    if event['event'] == "started":
+        logging.info("{} started".format(event['name']))
+        return
+    msg = "{} {}, {:.1f} secs".format(event['name'], event['event'],
+                                      event['elapsed'])
+    if event['reason']:
+        msg += ", {}".format(event['reason'])
+    if with_progress:
+        msg += "\n" + sweep_progress(
+            event['n_task'], event['n_finished'], event['n_failed'],
+            event['n_running'], event['n_retry'], event['batch_elapsed'])
+    if event['event'] == "finished":
+        logging.info(msg)
+    else:
+        logging.warning(msg)
+
+
+async def schedule_tasks(func, params, n_worker=None, timeout=None,
+                         retry_cnt=1, callback=log_task_event):
+    """
+    Parameters:
+    -------------
+    func: callable, the function of the tasks, func(*args) of each task
+    params: dict, key: task name, value: tuple of the arguments of func
+    n_worker: positive integer, optional, max number of concurrent
+        processes, default is the number of CPUs.
+    timeout: float, optional, max seconds of a run of a task
+    retry_cnt: non-negative integer, max number of retries of a task
+    callback: callable, callback(event) of each event of the tasks
+
+    Returns:
+    -------------
+    dict, finished: list of the finished task names,
+        failed: dict of the failed task names and their last reasons,
+        n_retry: total number of retries, elapsed: seconds
+    """
+    if n_worker is None:
+        n_worker = mp.cpu_count()
+    if n_worker <= 0:
+        raise ValueError("n_worker {} should be positive.".format(n_worker))
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(n_worker)
+    state = {"finished": [], "failed": {}, "n_retry": 0, "n_running": 0}
+    n_task = len(params)
+    t0 = time()
+
+    def emit(event, name, elapsed=0., reason=None):
+        if callback is None:
+            return
+        callback({
+            "event": event,
+            "name": name,
+            "elapsed": elapsed,
+            "reason": reason,
+            "n_task": n_task,
+            "n_finished": len(state['finished']),
+            "n_failed": len(state['failed']),
+            "n_running": state['n_running'],
+            "n_retry": state['n_retry'],
+            "batch_elapsed": time() - t0,
+        })
+
+    # the threads wait for the exits of the processes
+    executor = ThreadPoolExecutor(max_workers=n_worker)
+    # the live processes, they are terminated if the batch is cancelled
+    procs = set()
+
+    async def run_once(name):
+        recv_conn, send_conn = mp.Pipe(duplex=False)
+        proc = mp.Process(target=_run_task,
+                          args=(func, params[name], send_conn), name=name)
+        proc.start()
+        procs.add(proc)
+        send_conn.close()
+        try:
+            await loop.run_in_executor(executor, proc.join, timeout)
+            if proc.is_alive():
+                proc.terminate()
+                await loop.run_in_executor(executor, proc.join)
+                return "timeout after {:.1f} secs".format(timeout)
+            if proc.exitcode != 0:
+                reason = "exit code {}".format(proc.exitcode)
+                try:
+                    if recv_conn.poll():
+                        reason += "\n" + recv_conn.recv()
+                except EOFError:
+                    # the process exits without an exception
+                    pass
+                return reason
+            return None
+        finally:
+            recv_conn.close()
+            # the process of a cancelled run is left to the batch
+            if not proc.is_alive():
+                procs.discard(proc)
+
+    async def run_task(name):
+        async with semaphore:
+            for n_run in range(retry_cnt + 1):
+                state['n_running'] += 1
+                start_time = time()
+                emit("started", name)
+                reason = await run_once(name)
+                state['n_running'] -= 1
+                elapsed = time() - start_time
+                if reason is None:
+                    state['finished'].append(name)
+                    emit("finished", name, elapsed)
+                    return
+                if n_run < retry_cnt:
+                    state['n_retry'] += 1
+                    emit("retry", name, elapsed, reason)
+                else:
+                    state['failed'][name] = reason
+                    emit("failed", name, elapsed, reason)
+
+    logging.info("{} scheduling {} tasks, n_worker: {}, timeout: {}, "
+                 "retry_cnt: {}".format(platform.node(), n_task, n_worker,
+                                        timeout, retry_cnt))
+    try:
+        await asyncio.gather(*(run_task(name) for name in params.keys()))
+    finally:
+        for proc in list(procs):
+            if proc.is_alive():
+                logging.warning("terminating {}".format(proc.name))
+                proc.terminate()
+            proc.join()
+        executor.shutdown(wait=False)
+
+    return {
+        "finished": state['finished'],
+        "failed": state['failed'],
+        "n_retry": state['n_retry'],
+        "elapsed": time() - t0,
+    }
+
+
+def run_async_tasks(func, params, n_worker=None, timeout=None, retry_cnt=1,
+                    callback=log_task_event):
+    """
+    the blocking interface of schedule_tasks, see schedule_tasks for the
+    parameters and the returns.
+    """
+    return asyncio.run(schedule_tasks(func, params, n_worker, timeout,
+                                      retry_cnt, callback))
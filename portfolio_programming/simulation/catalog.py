@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+persistent SQLite catalog of the generated scenario sets and the finished
+simulation reports.
+
+The writers register a file after it is completely written, and the
+dispatchers query the unfinished parameters from the catalog instead of
+scanning the directories. Each update is a single transaction, so the
+concurrent writers on different processes do not see partial records.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+from time import time
+
+import portfolio_programming as pp
+
+SCENARIO = "scenario"
+REPORT = "report"
+
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+def file_checksum(path, block_size=1 << 20):
+    """
+    Returns:
+    -------------
+    str, sha1 hex digest of the file
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as fin:
+        for block in iter(lambda: fin.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class Catalog(object):
+    """
+    catalog of the files, the key of a record is (kind, name), where name is
+    the file name, e.g. the scenario file name or the report file name.
+    """
+
+    def __init__(self, db_path=None, timeout=60.):
+        """
+        Parameters:
+        -------------
+        db_path: str, optional, default is pp.CATALOG_DB
+        timeout: float, seconds to wait for the lock of other writers
+        """
+        self.db_path = db_path if db_path else pp.CATALOG_DB
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entry ("
+                "kind TEXT NOT NULL, "
+                "name TEXT NOT NULL, "
+                "directory TEXT, "
+                "parameters TEXT, "
+                "status TEXT NOT NULL, "
+                "checksum TEXT, "
+                "size INTEGER, "
+                "node TEXT, "
+                "updated REAL, "
+                "PRIMARY KEY (kind, name))"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS entry_status "
+                "ON entry (kind, status)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS synced_dir ("
+                "kind TEXT NOT NULL, "
+                "directory TEXT NOT NULL, "
+                "synced REAL, "
+                "PRIMARY KEY (kind, directory))"
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def register(self, kind, path, parameters=None, status=FINISHED,
+                 checksum=True):
+        """
+        insert or update the record of a file.
+
+        Parameters:
+        -------------
+        kind: str, {SCENARIO, REPORT}
+        path: str, path of the file
+        parameters: json-serializable object, optional, the datetime objects
+            are stored as strings.
+        status: str, {RUNNING, FINISHED, FAILED}
+        checksum: bool, computing the checksum of the finished file
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        digest, size = None, None
+        if status == FINISHED and os.path.exists(path):
+            size = os.path.getsize(path)
+            if checksum:
+                digest = file_checksum(path)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entry VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, name, directory,
+                 json.dumps(parameters, default=str), status, digest, size,
+                 "{}_{}".format(platform.node(), os.getpid()), time())
+            )
+
+    def get(self, kind, name):
+        """
+        Returns:
+        -------------
+        dict or None if the name is not in the catalog.
+        """
+        cursor = self.conn.execute(
+            "SELECT kind, name, directory, parameters, status, checksum, "
+            "size, node, updated FROM entry WHERE kind = ? AND name = ?",
+            (kind, name))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        keys = ("kind", "name", "directory", "parameters", "status",
+                "checksum", "size", "node", "updated")
+        record = dict(zip(keys, row))
+        record['parameters'] = json.loads(record['parameters'])
+        return record
+
+    def names(self, kind, status=FINISHED, directory=None):
+        """
+        Returns:
+        -------------
+        set of str, names of the records
+        """
+        sql = "SELECT name FROM entry WHERE kind = ? AND status = ?"
+        args = [kind, status]
+        if directory is not None:
+            sql += " AND directory = ?"
+            args.append(os.path.abspath(directory))
+        return set(row[0] for row in self.conn.execute(sql, args))
+
+    def parameters(self, kind, status=FINISHED):
+        """
+        Returns:
+        -------------
+        dict, key: name, value: parameters of the records
+        """
+        return {name: json.loads(params) for name, params in
+                self.conn.execute(
+                    "SELECT name, parameters FROM entry WHERE kind = ? AND "
+                    "status = ?", (kind, status))}
+
+    def set_parameters(self, kind, name, parameters):
+        """ updating the parameters of a record """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE entry SET parameters = ? WHERE kind = ? AND "
+                "name = ?", (json.dumps(parameters, default=str), kind, name))
+
+    def unfinished(self, kind, all_params, directory=None, resync=False):
+        """
+        Parameters:
+        -------------
+        kind: str
+        all_params: dict, key: name, value: parameters
+        directory: str, optional, if it is given, the catalog is
+            synchronized with the files in the directory at the first query
+            of the directory. The later queries trust the catalog without
+            touching the files.
+        resync: bool, synchronizing the directory even if it has been
+            synchronized, the records of the files copied into or removed
+            from the directory outside the catalog are updated.
+
+        Returns:
+        -------------
+        dict, the items of all_params which are not finished.
+        """
+        if directory is not None:
+            if resync or not self.synced(kind, directory):
+                self.sync_directory(kind, directory)
+            finished = self.names(kind, directory=directory)
+        else:
+            finished = self.names(kind)
+        return {name: params for name, params in all_params.items()
+                if name not in finished}
+
+    def delete(self, kind, name):
+        """
+        deleting the record of an invalidated file, the parameters of the
+        file are unfinished again.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM entry WHERE kind = ? AND name = ?",
+                              (kind, name))
+
+    def synced(self, kind, directory):
+        """
+        Returns:
+        -------------
+        bool, the directory has been synchronized
+        """
+        return self.conn.execute(
+            "SELECT 1 FROM synced_dir WHERE kind = ? AND directory = ?",
+            (kind, os.path.abspath(directory))).fetchone() is not None
+
+    def sync_directory(self, kind, directory, suffix=None):
+        """
+        synchronizing the finished records of the directory with its files,
+        the files not in the catalog are registered without checksum, and
+        the records of the removed files are deleted.
+
+        Parameters:
+        -------------
+        kind: str
+        directory: str
+        suffix: str, optional, default is ".nc" for scenarios and ".pkl"
+            for reports.
+        """
+        if suffix is None:
+            suffix = ".nc" if kind == SCENARIO else ".pkl"
+        directory = os.path.abspath(directory)
+        files = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(suffix):
+                    files[entry.name] = entry.stat().st_size
+        registered = self.names(kind, directory=directory)
+        node = "{}_{}".format(platform.node(), os.getpid())
+        now = time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO entry VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(kind, name, directory, json.dumps(None), FINISHED, None,
+                  size, node, now)
+                 for name, size in files.items() if name not in registered]
+            )
+            self.conn.executemany(
+                "DELETE FROM entry WHERE kind = ? AND name = ?",
+                [(kind, name) for name in registered if name not in files]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO synced_dir VALUES (?, ?, ?)",
+                (kind, directory, now))
+
+    def verify(self, kind, name):
+        """
+        Returns:
+        -------------
+        bool, the file exists and matches the recorded checksum, the
+        checksum is recorded at the first verification if it is missing.
+        """
+        record = self.get(kind, name)
+        if record is None or record['status'] != FINISHED:
+            return False
+        path = os.path.join(record['directory'], name)
+        if not os.path.exists(path):
+            return False
+        digest = file_checksum(path)
+        if record['checksum'] is None:
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE entry SET checksum = ? WHERE kind = ? AND "
+                    "name = ?", (digest, kind, name))
+            return True
+        return digest == record['checksum']
+
+
+def atomic_write_path(path):
+    """
+    the temporary path of a file, which is renamed to the path by
+    os.replace after it is completely written.
+    """
+    return "{}.{}_{}.tmp".format(path, platform.node(), os.getpid())
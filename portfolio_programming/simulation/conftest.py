@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+shared fixtures of the simulation tests.
+"""
+
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import portfolio_programming as pp
+
+
+@pytest.fixture
+def synthetic_backtest():
+    """
+    the factory running a weight portfolio backtest on a synthetic panel of
+    the TWG1 symbols, the panel of the same n_period is the same.
+    """
+
+    def backtest(pf_class, params, n_period=120):
+        """
+        Parameters:
+        -------------
+        pf_class: subclass of WeightPortfolio
+        params: tuple, the parameters before group_name of the class
+        n_period: positive integer, number of trading days
+
+        Returns:
+        -------------
+        the finished portfolio object
+        """
+        group_name = 'TWG1'
+        symbols = pp.GROUP_SYMBOLS[group_name]
+        n_symbol = len(symbols)
+        dates = pd.bdate_range('2005-01-03', periods=n_period)
+        rois = xr.DataArray(
+            np.random.RandomState(0).randn(n_period, n_symbol) * 0.02,
+            dims=('trans_date', 'symbol'), coords=(dates, symbols))
+        initial_weights = xr.DataArray(np.ones(n_symbol) / n_symbol,
+                                       dims=('symbol',), coords=(symbols,))
+        with tempfile.TemporaryDirectory() as report_dir:
+            obj = pf_class(*params, group_name, symbols, rois,
+                           initial_weights, 100, start_date=dates[0],
+                           end_date=dates[-1], print_interval=1000,
+                           report_dir=report_dir)
+            obj.run()
+        return obj
+
+    return backtest
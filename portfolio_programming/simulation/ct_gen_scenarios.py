@@ -3,24 +3,30 @@
 Author: Hung-Hsin Chen <chen1116@gmail.com>
 """
 
-import datetime as dt
-import glob
 import logging
+import multiprocessing as mp
 import os
 import platform
 import sys
-from time import (time, sleep)
+from time import time
 import json
 
-import ipyparallel as ipp
 import numpy as np
-import scipy.stats as spstats
 import xarray as xr
 
 import portfolio_programming as pp
+from portfolio_programming.simulation.market_panel import open_market_panel
 from portfolio_programming.sampling.cubic_transform_sampling import (
     cubic_transform_sampling as ct_sampling
 )
+from portfolio_programming.sampling.moment_matching import (
+    fleishman_feasible, fleishman_project)
+from portfolio_programming.simulation.async_scheduler import (
+    run_async_tasks)
+from portfolio_programming.simulation.catalog import (Catalog, SCENARIO)
+from portfolio_programming.simulation.hemm_gen_scenarios import (
+    write_scenario_xarr)
+from portfolio_programming.statistics.rolling_moments import RollingMoments
 
 
 def ct_generating_scenarios_xarr(scenario_set_idx,
@@ -30,7 +36,11 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
                                  rolling_window_size,
                                  n_scenario=1000,
                                  retry_cnt=5,
-                                 print_interval=100):
+                                 print_interval=100,
+                                 n_worker=1,
+                                 chunk_size=64,
+                                 compress=True,
+                                 float32=False):
     """
     generating scenarios xarray using cubic transform
 
@@ -43,10 +53,49 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
     n_scenario: integer, number of scenarios to generating
     retry_cnt: positive integer, maximum retry of scenarios
     print_interval: positive integer
+    n_worker: positive integer, number of local processes, the dates of the
+        scenario file are split into contiguous chunks across the processes.
+    chunk_size: positive integer, number of dates of a chunk
+    compress: bool, writing the compressed file chunked by date
+    float32: bool, writing the scenarios in single precision
 
     Returns:
     ------------------
-    scenario_xarr : xarray.DataArray, dim:(trans_date, scenario)
+    str, message of the generation
+    """
+    return ct_generating_group_scenarios_xarr(
+        scenario_set_idx, scenario_start_date, scenario_end_date,
+        [symbol, ], rolling_window_size, n_scenario, retry_cnt,
+        print_interval, n_worker, chunk_size, compress, float32)
+
+
+def ct_generating_group_scenarios_xarr(scenario_set_idx,
+                                       scenario_start_date,
+                                       scenario_end_date,
+                                       symbols,
+                                       rolling_window_size,
+                                       n_scenario=1000,
+                                       retry_cnt=5,
+                                       print_interval=100,
+                                       n_worker=1,
+                                       chunk_size=64,
+                                       compress=True,
+                                       float32=False):
+    """
+    generating the scenario files of several symbols in one pass, the
+    asset data are loaded once, and the scenarios of all symbols of a date
+    are sampled by the cubic transform in one call. The random stream of
+    each symbol is seeded by (scenario_set_idx, date, symbol), so the
+    scenarios of a symbol do not depend on the other symbols of the pass.
+
+    Parameters:
+    ------------------
+    symbols: list of str
+    the other parameters are the same as ct_generating_scenarios_xarr.
+
+    Returns:
+    ------------------
+    str, message of the generation
     """
     t0 = time()
 
@@ -54,14 +103,26 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
     if not os.path.exists(pp.SCENARIO_SET_DIR):
         os.makedirs(pp.SCENARIO_SET_DIR)
 
-    scenario_file = pp.SYMBOL_SCENARIO_NAME_FORMAT.format(
-        sdx=scenario_set_idx,
-        scenario_start_date=scenario_start_date.strftime("%Y%m%d"),
-        scenario_end_date=scenario_end_date.strftime("%Y%m%d"),
-        symbol=symbol,
-        rolling_window_size=rolling_window_size,
-        n_scenario=n_scenario
-    )
+    # the symbols of the existed files are skipped
+    scenario_paths = {}
+    for symbol in symbols:
+        scenario_file = pp.SYMBOL_SCENARIO_NAME_FORMAT.format(
+            sdx=scenario_set_idx,
+            scenario_start_date=scenario_start_date.strftime("%Y%m%d"),
+            scenario_end_date=scenario_end_date.strftime("%Y%m%d"),
+            symbol=symbol,
+            rolling_window_size=rolling_window_size,
+            n_scenario=n_scenario
+        )
+        scenario_path = os.path.join(pp.SCENARIO_SET_DIR, scenario_file)
+        if os.path.exists(scenario_path):
+            logging.info("{} exists.".format(scenario_file))
+        else:
+            scenario_paths[symbol] = scenario_path
+
+    if not scenario_paths:
+        return "all scenario files exist."
+    symbols = list(scenario_paths.keys())
 
     parameters = "{}_{} scenarios-set-idx{}_{}_{}_{}_h{}_s{}".format(
         platform.node(),
@@ -69,21 +130,16 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
         scenario_set_idx,
         scenario_start_date.strftime("%Y%m%d"),
         scenario_end_date.strftime("%Y%m%d"),
-        symbol,
+        symbols[0] if len(symbols) == 1 else "{}symbols".format(
+            len(symbols)),
         rolling_window_size,
         n_scenario,
     )
 
-    scenario_path = os.path.join(pp.SCENARIO_SET_DIR, scenario_file)
-    if os.path.exists(scenario_path):
-        return "{} exists.".format(scenario_file)
-
     # read roi data
     # shape: (n_period, n_stock, 6 attributes)
-    risky_asset_xarr = xr.open_dataarray(
-        pp.TAIEX_2005_MKT_CAP_NC)
+    risky_asset_xarr = open_market_panel("TW")
 
-    print(risky_asset_xarr.dims)
     # all trans_date, pandas.core.indexes.datetimes.DatetimeIndex
     trans_dates = risky_asset_xarr.get_index('trans_date')
 
@@ -93,49 +149,206 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
     sc_trans_dates = trans_dates[sc_start_idx: sc_end_idx + 1]
     n_sc_period = len(sc_trans_dates)
 
-    # estimating moments and correlation matrix
-    est_moments = xr.DataArray(np.zeros(4),
-                               dims=('moment',),
-                               coords=(['mean', 'std', 'skew', 'ex-kurt'],))
+    # the roi data of the rolling windows, the first window contains the
+    # periods before the first scenario date.
+    # shape: (n_sc_period + rolling_window_size - 1, n_symbol)
+    est_start_idx = sc_start_idx - rolling_window_size + 1
+    assert est_start_idx >= 0
+    roi_data = risky_asset_xarr.loc[
+        trans_dates[est_start_idx:sc_end_idx + 1], symbols,
+        'simple_roi'].values
+
+    # contiguous chunks of dates, each chunk contains its window data and
+    # starts a new rolling estimator. The chunks are independent of the
+    # number of workers, so are the scenarios.
+    chunks = [np.arange(idx, min(idx + chunk_size, n_sc_period))
+              for idx in range(0, n_sc_period, chunk_size)]
+    chunk_args = [
+        (roi_data[chunk[0]:chunk[-1] + rolling_window_size],
+         sc_trans_dates[chunk[0]:chunk[-1] + 1], symbols,
+         rolling_window_size, n_scenario, scenario_set_idx, parameters,
+         retry_cnt, print_interval)
+        for chunk in chunks
+    ]
+    if n_worker <= 1:
+        results = [ct_generating_group_scenarios_of_dates(*args)
+                   for args in chunk_args]
+    else:
+        # the workers are terminated if a chunk fails
+        with mp.Pool(processes=n_worker) as pool:
+            results = [pool.apply_async(
+                ct_generating_group_scenarios_of_dates, args)
+                for args in chunk_args]
+            results = [result.get() for result in results]
+
+    # shape: (n_sc_period, n_symbol, n_scenario)
+    sc_values = np.concatenate(results)
+    for sdx, symbol in enumerate(symbols):
+        # output scenario xarray, shape: (n_sc_period, n_scenario)
+        scenario_xarr = xr.DataArray(
+            sc_values[:, sdx],
+            dims=('trans_date', 'scenario'),
+            coords=(sc_trans_dates, range(n_scenario)),
+        )
+
+        # write scenario
+        write_scenario_xarr(
+            scenario_xarr, scenario_paths[symbol], compress, float32,
+            parameters=(scenario_set_idx, scenario_start_date,
+                        scenario_end_date, symbol, rolling_window_size,
+                        n_scenario))
 
-    # output scenario xarray, shape: (n_sc_period, n_scenario)
-    scenario_xarr = xr.DataArray(
-        np.zeros((n_sc_period, n_scenario)),
-        dims=('trans_date', 'scenario'),
-        coords=(sc_trans_dates, range(n_scenario)),
-    )
+    msg = ("generating {} scenarios OK, {:.3f} secs".format(
+        parameters, time() - t0))
+    logging.info(msg)
+    return msg
 
-    for tdx, sc_date in enumerate(sc_trans_dates):
-        t1 = time()
 
-        # rolling historical window indices, containing today
-        est_start_idx = sc_start_idx + tdx - rolling_window_size + 1
-        est_end_idx = sc_start_idx + tdx + 1
-        hist_interval = trans_dates[est_start_idx:est_end_idx]
+def symbol_date_seed(scenario_set_idx, sc_date, symbol):
+    """
+    the seed of the independent random stream of a symbol on a scenario
+    date
+
+    Parameters:
+    ------------------
+    scenario_set_idx: positive integer
+    sc_date: datetime.date
+    symbol: str
+
+    Returns:
+    ------------------
+    integer, seed of numpy.random.RandomState
+    """
+    return int(np.random.SeedSequence(
+        [scenario_set_idx, int(sc_date.strftime("%Y%m%d"))] +
+        list(symbol.encode("utf-8"))
+    ).generate_state(1)[0])
+
+
+def ct_generating_scenarios_of_dates(roi_data,
+                                     sc_trans_dates,
+                                     symbol,
+                                     rolling_window_size,
+                                     n_scenario,
+                                     scenario_set_idx,
+                                     parameters="",
+                                     retry_cnt=5,
+                                     print_interval=100):
+    """
+    generating the scenarios of contiguous dates of a symbol using cubic
+    transform, the random stream of each date is seeded by
+    (scenario_set_idx, date, symbol).
 
-        assert len(hist_interval) == rolling_window_size
-        assert hist_interval[-1] == sc_date
+    Parameters:
+    ------------------
+    roi_data: numpy.array, shape: (n_sc_period + rolling_window_size - 1,),
+        the roi of the rolling windows of the dates
+    sc_trans_dates: pandas.DatetimeIndex, the scenario dates
+    symbol: str
+    rolling_window_size: positive integer, number of historical periods
+    n_scenario: integer, number of scenarios to generating
+    scenario_set_idx: positive integer
+    parameters: str, description of the scenario file for logging
+    retry_cnt: positive integer, maximum retry of scenarios
+    print_interval: positive integer
 
-        # hist_data, shape: (win_length, n_stock)
-        hist_data = risky_asset_xarr.loc[hist_interval, symbol, 'simple_roi']
+    Returns:
+    ------------------
+    numpy.array, shape: (n_sc_period, n_scenario)
+    """
+    return ct_generating_group_scenarios_of_dates(
+        np.asarray(roi_data)[:, np.newaxis], sc_trans_dates, [symbol, ],
+        rolling_window_size, n_scenario, scenario_set_idx, parameters,
+        retry_cnt, print_interval)[:, 0]
+
+
+def ct_generating_group_scenarios_of_dates(roi_data,
+                                           sc_trans_dates,
+                                           symbols,
+                                           rolling_window_size,
+                                           n_scenario,
+                                           scenario_set_idx,
+                                           parameters="",
+                                           retry_cnt=5,
+                                           print_interval=100):
+    """
+    generating the scenarios of contiguous dates of several symbols using
+    cubic transform, the marginal scenarios of all symbols of a date are
+    sampled in one call.
 
-        # unbiased moments and corrs estimators
-        est_moments.loc['mean'] = hist_data.mean(axis=0)
-        est_moments.loc['std'] = hist_data.std(axis=0, ddof=1)
-        est_moments.loc['skew'] = spstats.skew(hist_data, axis=0, bias=False)
-        est_moments.loc['ex-kurt'] = spstats.kurtosis(hist_data, axis=0,
-                                                      bias=False)
+    Parameters:
+    ------------------
+    roi_data: numpy.array, shape: (n_sc_period + rolling_window_size - 1,
+        n_symbol), the roi of the rolling windows of the dates
+    symbols: list of str
+    the other parameters are the same as ct_generating_scenarios_of_dates.
+
+    Returns:
+    ------------------
+    numpy.array, shape: (n_sc_period, n_symbol, n_scenario)
+    """
+    n_sc_period = len(sc_trans_dates)
+    n_symbol = len(symbols)
+    assert roi_data.shape == (n_sc_period + rolling_window_size - 1,
+                              n_symbol)
+
+    # estimating moments
+    est_moments = xr.DataArray(np.zeros((n_symbol, 4)),
+                               dims=('symbol', 'moment'),
+                               coords=(symbols,
+                                       ['mean', 'std', 'skew', 'ex-kurt']))
+
+    # output scenarios, shape: (n_sc_period, n_symbol, n_scenario)
+    sc_values = np.zeros((n_sc_period, n_symbol, n_scenario))
+
+    # rolling estimator of the moments, the estimator contains the periods
+    # before the first scenario date.
+    estimator = RollingMoments(n_symbol, rolling_window_size)
+    for rdx in range(rolling_window_size - 1):
+        estimator.push(roi_data[rdx])
+
+    for tdx, sc_date in enumerate(sc_trans_dates):
+        t1 = time()
+
+        # rolling historical window containing today, the unbiased moments
+        # estimators
+        estimator.push(roi_data[tdx + rolling_window_size - 1])
+        est_moments[:] = estimator.moments()
+
+        # the targets outside the Fleishman region are impossible for the
+        # cubic transform, projecting them instead of retrying.
+        skews = est_moments.loc[:, 'skew'].values
+        ex_kurts = est_moments.loc[:, 'ex-kurt'].values
+        feasible = fleishman_feasible(skews, ex_kurts)
+        if not feasible.all():
+            proj_skews, proj_ex_kurts = fleishman_project(skews, ex_kurts)
+            for sdx in np.flatnonzero(~feasible):
+                logging.warning("{} {} {} (skew, ex-kurt): ({:.4f}, {:.4f}) "
+                                "is outside the Fleishman region, projected "
+                                "to ({:.4f}, {:.4f})".format(
+                    sc_date, parameters, symbols[sdx], skews[sdx],
+                    ex_kurts[sdx], proj_skews[sdx], proj_ex_kurts[sdx]))
+            est_moments.loc[:, 'skew'] = proj_skews
+            est_moments.loc[:, 'ex-kurt'] = proj_ex_kurts
+
+        # independent random stream of each symbol on the date
+        random_states = [
+            np.random.RandomState(
+                symbol_date_seed(scenario_set_idx, sc_date, symbol))
+            for symbol in symbols]
 
         # generating unbiased scenario
+        scenarios = None
         for error_count in range(retry_cnt):
             try:
                 for error_exponent in range(-3, 0):
                     try:
                         # default moment and corr errors (1e-3, 1e-3)
-                        # df shape: (n_scenario,)
+                        # shape: (n_symbol, n_scenario)
                         max_cubic_err = 10 ** error_exponent
                         scenarios = ct_sampling(
-                            est_moments.values, n_scenario, max_cubic_err)
+                            est_moments.values, n_scenario, max_cubic_err,
+                            random_states)
                     except ValueError as _:
                         logging.warning(
                             "{} {} relaxing max_cubic_err:{}".format(
@@ -148,12 +361,17 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
                 # catch any other exception
                 if error_count == retry_cnt - 1:
                     raise Exception(e)
-            else:
+            if scenarios is not None:
                 # generating scenarios success
                 break
 
-        # store scenarios, scenario_df shape: (n_scenario)
-        scenario_xarr.loc[sc_date, :] = scenarios
+        if scenarios is None:
+            raise ValueError("{} {} not converge after {} retries at the "
+                             "max cubic err {}".format(
+                sc_date, parameters, retry_cnt, max_cubic_err))
+
+        # store scenarios, shape: (n_symbol, n_scenario)
+        sc_values[tdx] = scenarios
 
         # clear est data
         if tdx % print_interval == 0:
@@ -164,13 +382,7 @@ def ct_generating_scenarios_xarr(scenario_set_idx,
                 parameters,
                 time() - t1))
 
-    # write scenario
-    scenario_xarr.to_netcdf(scenario_path)
-
-    msg = ("generating {} scenarios OK, {:.3f} secs".format(
-        parameters, time() - t0))
-    logging.info(msg)
-    return msg
+    return sc_values
 
 
 def _ct_all_scenario_names():
@@ -209,85 +421,83 @@ def _ct_all_scenario_names():
     }
 
 
-def ct_checking_existed_scenario_names(scenario_set_dir=None):
+def ct_checking_existed_scenario_names(scenario_set_dir=None, resync=False):
     """
     return unfinished experiment parameters.
+
+    resync: bool, synchronizing the catalog with the scenario directory
+        even if it has been synchronized.
     """
     if scenario_set_dir is None:
         scenario_set_dir = pp.SCENARIO_SET_DIR
     all_names = _ct_all_scenario_names()
 
-    os.chdir(scenario_set_dir)
-    existed_names = glob.glob("*.nc")
-    for name in existed_names:
-        all_names.pop(name, None)
-
     # unfinished params
-    return all_names
+    with Catalog() as catalog:
+        return catalog.unfinished(SCENARIO, all_names, scenario_set_dir,
+                                  resync)
+
 
+def group_symbol_params(params):
+    """
+    grouping the unfinished parameters of the same scenario set, dates,
+    rolling window size, and number of scenarios, so that a task generates
+    the scenario files of all its symbols in one pass.
 
-def ct_dispatch_scenario_names(scenario_set_dir=pp.SCENARIO_SET_DIR):
-    unfinished_names = ct_checking_existed_scenario_names(scenario_set_dir)
+    Parameters:
+    ------------------
+    params: iterable of (sdx, s_date, e_date, symbol, h, s)
+
+    Returns:
+    ------------------
+    list of (sdx, s_date, e_date, symbols, h, s)
+    """
+    groups = {}
+    for sdx, s_date, e_date, symbol, h, s in params:
+        groups.setdefault((sdx, s_date, e_date, h, s), []).append(symbol)
+    return [(sdx, s_date, e_date, sorted(symbols), h, s)
+            for (sdx, s_date, e_date, h, s), symbols in sorted(
+            groups.items())]
+
+
+def ct_dispatch_scenario_names(scenario_set_dir=pp.SCENARIO_SET_DIR,
+                               n_worker=None, timeout=None, retry_cnt=1,
+                               resync=False):
+    """
+    generating the unfinished scenario files by the local worker processes,
+    each task generates the files of the symbols of a group.
+
+    Parameters:
+    -------------
+    scenario_set_dir: str
+    n_worker: positive integer, optional, max number of concurrent tasks,
+        default is the number of CPUs.
+    timeout: float, optional, max seconds of a task
+    retry_cnt: non-negative integer, max number of retries of a task
+    resync: bool, synchronizing the catalog with the scenario directory
+        even if it has been synchronized.
+
+    Returns:
+    -------------
+    dict, the summary of the scheduler, see async_scheduler.schedule_tasks
+    """
+    unfinished_names = ct_checking_existed_scenario_names(scenario_set_dir,
+                                                          resync)
     print("number of unfinished scenario: {}".format(len(unfinished_names)))
-    params = unfinished_names.values()
-
-    # task interface
-    rc = ipp.Client(profile='ssh')
-    dv = rc[:]
-    dv.use_dill()
-    dv.scatter('engine_id', rc.ids, flatten=True)
-    print("Engine IDs: ", dv['engine_id'])
-    n_engine = len(rc.ids)
-
-    with dv.sync_imports():
-        import sys
-        import platform
-        import os
-        import portfolio_programming.simulation.ct_gen_scenarios
-
-    def name_pid():
-        return "node:{}, pid:{}".format(
-            platform.node(), os.getpid())
-
-    infos = dv.apply_sync(name_pid)
-    for info in infos:
-        print(info)
-
-    lbv = rc.load_balanced_view()
-    print("start map unfinished parameters to load balance view.")
-    try:
-        #  ipyparallel.client.asyncresult.AsyncMapResult
-        ar = lbv.map_async(
-            lambda
-                x: portfolio_programming.simulation.ct_gen_scenarios.ct_generating_scenarios_xarr(
-                *x),
-            params)
-
-        while not ar.ready():
-            print("{} n_engine:{} gen_scenarios task: {}/{} {:10.1f} "
-                  "secs".format(
-                str(dt.datetime.now()), n_engine, ar.progress, len(ar),
-                ar.elapsed))
-            sys.stdout.flush()
-            sleep(10)
-
-            # type(ar.stdout) == list, and the length is equal to the number of
-            # task.
-            stdouts = ar.stdout
-            if not any(stdouts):
-                continue
-
-            for task_idx, outs in enumerate(stdouts):
-                print("{}: {}".format(task_idx, outs.split('\n')[-1]))
-            sys.stdout.flush()
-
-    except Exception as e:
-        print(e)
-        ar.abort()
-        sys.exit(1)
-
-    print(ar.get())
-    print("speed up:{:.2%}".format(ar.serial_time / ar.wall_time))
+    params = {
+        "sdx{}_{}_{}_{}symbols_h{}_s{}".format(
+            sdx, s_date.strftime("%Y%m%d"), e_date.strftime("%Y%m%d"),
+            len(symbols), h, s): (sdx, s_date, e_date, symbols, h, s)
+        for sdx, s_date, e_date, symbols, h, s in group_symbol_params(
+            unfinished_names.values())
+    }
+    print("number of tasks: {}".format(len(params)))
+
+    summary = run_async_tasks(ct_generating_group_scenarios_xarr, params,
+                              n_worker, timeout, retry_cnt)
+    for name, reason in summary['failed'].items():
+        print("failed: {} {}".format(name, reason))
+    return summary
 
 
 if __name__ == '__main__':
@@ -307,7 +517,8 @@ if __name__ == '__main__':
                         help="parallel mode or not")
 
     parser.add_argument("--symbol", type=str,
-                        help="the target symbol")
+                        help="the target symbol, default is all symbols "
+                             "of the experiment.")
 
     parser.add_argument("-w", "--rolling_window_size", type=int,
                         choices=range(3, 250),
@@ -323,16 +534,51 @@ if __name__ == '__main__':
                         default=1,
                         help="pre-generated scenario set index.")
 
+    parser.add_argument("--n_worker", type=int, default=1,
+                        help="number of local processes generating the "
+                             "dates of a scenario file.")
+
+    parser.add_argument("--no_compress", default=False, action='store_true',
+                        help="writing the uncompressed scenario file.")
+
+    parser.add_argument("--float32", default=False, action='store_true',
+                        help="writing the scenarios in single precision.")
+
+    parser.add_argument("--n_task", type=int, default=None,
+                        help="number of concurrent tasks of the parallel "
+                             "mode, default is the number of CPUs.")
+
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="max seconds of a task of the parallel mode.")
+
+    parser.add_argument("--retry", type=int, default=1,
+                        help="max number of retries of a task of the "
+                             "parallel mode.")
+
+    parser.add_argument("--resync", default=False, action='store_true',
+                        help="synchronizing the catalog with the scenario "
+                             "directory before querying the unfinished "
+                             "scenarios.")
+
     args = parser.parse_args()
     if args.parallel:
         print("generating scenario in parallel mode")
-        ct_dispatch_scenario_names()
+        ct_dispatch_scenario_names(n_worker=args.n_task,
+                                   timeout=args.timeout,
+                                   retry_cnt=args.retry,
+                                   resync=args.resync)
     else:
         print("generating scenario in single mode")
-        ct_generating_scenarios_xarr(args.scenario_set_idx,
-                                     pp.SCENARIO_START_DATE,
-                                     pp.SCENARIO_END_DATE,
-                                     args.symbol,
-                                     args.rolling_window_size,
-                                     args.n_scenario
-                                     )
+        if args.symbol:
+            symbols = [args.symbol, ]
+        else:
+            symbols = json.load(open(pp.TAIEX_2005_MKT_CAP_50_SYMBOL_JSON))
+        ct_generating_group_scenarios_xarr(args.scenario_set_idx,
+                                           pp.SCENARIO_START_DATE,
+                                           pp.SCENARIO_END_DATE,
+                                           symbols,
+                                           args.rolling_window_size,
+                                           args.n_scenario,
+                                           n_worker=args.n_worker,
+                                           compress=not args.no_compress,
+                                           float32=args.float32)
@@ -1,20 +1,18 @@
 # -*- coding: utf-8 -*-
 """
 Authors: Hung-Hsin Chen <chen1116@gmail.com>
-
-https://github.com/ipython/ipyparallel/blob/master/examples/customresults.py
-https://github.com/ipython/ipyparallel/blob/master/ipyparallel/client/asyncresult.py
 """
 
+import collections
 import datetime as dt
-import glob
+import json
 import logging
+import multiprocessing as mp
 import os
 import platform
 import sys
-from time import time, sleep
+from time import time
 
-import ipyparallel as ipp
 import numpy as np
 import scipy.stats as spstats
 import xarray as xr
@@ -23,6 +21,25 @@ import portfolio_programming as pp
 from portfolio_programming.sampling.moment_matching import (
     heuristic_moment_matching as HeMM,
 )
+from portfolio_programming.simulation.async_scheduler import (
+    run_async_tasks)
+from portfolio_programming.simulation.market_panel import open_market_panel
+from portfolio_programming.simulation.catalog import (
+    Catalog, SCENARIO, atomic_write_path)
+from portfolio_programming.statistics.rolling_moments import RollingMoments
+
+# the generation telemetry of a date:
+# elapsed: seconds of generating the scenarios of the date
+# wasted: seconds of the failed attempts
+# n_attempt: number of the calls of HeMM
+# max_err: the (relaxed) max moment and corr errors of the scenarios
+# moment_err, corr_err: root mean square errors of the scenarios
+TELEMETRY_FIELDS = ("elapsed", "wasted", "n_attempt", "max_err",
+                    "moment_err", "corr_err")
+DEFAULT_MAX_ERR = 1e-3
+# max number of window sizes of a multi-window task, the memory of a chunk
+# of dates is proportional to it.
+DEFAULT_MAX_N_WINDOW = 5
 
 
 def hemm_generating_scenarios_xarr(
@@ -35,6 +52,10 @@ def hemm_generating_scenarios_xarr(
         scenario_end_date,
         retry_cnt=5,
         print_interval=10,
+        n_worker=1,
+        chunk_size=64,
+        compress=True,
+        float32=False,
 ):
     """
     generating scenarios xarray using Heuristic moment matching
@@ -50,11 +71,58 @@ def hemm_generating_scenarios_xarr(
     n_stock: positive integer, number of stocks in the candidate symbols
     retry_cnt: positive integer, maximum retry of scenarios
     print_interval: positive integer
+    n_worker: positive integer, number of local processes, the dates of the
+        scenario file are split into contiguous chunks across the processes.
+        The random stream of each date is seeded by (scenario_set_idx,
+        date), so the scenarios are independent of the number of workers.
+    chunk_size: positive integer, number of dates of a chunk
+    compress: bool, writing the compressed file chunked by date
+    float32: bool, writing the scenarios in single precision
 
     Returns:
     ------------------
     scenario_xarr : xarray.DataArray, dim:(trans_date, symbol, scenario)
     """
+    return hemm_generating_multi_window_scenarios_xarr(
+        group_name, n_symbol, [rolling_window_size, ], n_scenario,
+        scenario_set_idx, scenario_start_date, scenario_end_date, retry_cnt,
+        print_interval, n_worker, chunk_size, compress, float32)
+
+
+def hemm_generating_multi_window_scenarios_xarr(
+        group_name,
+        n_symbol,
+        rolling_window_sizes,
+        n_scenario,
+        scenario_set_idx,
+        scenario_start_date,
+        scenario_end_date,
+        retry_cnt=5,
+        print_interval=10,
+        n_worker=1,
+        chunk_size=64,
+        compress=True,
+        float32=False,
+):
+    """
+    generating the scenario files of several rolling window sizes in one
+    pass, the asset data are loaded once, and the rolling estimators of all
+    window sizes are updated together date by date. The scenarios of each
+    window size are the same as those of hemm_generating_scenarios_xarr.
+    The files of all window sizes are created before the generation, and
+    the scenarios are written chunk by chunk of dates as the chunks are
+    finished, so at most 2 * n_worker chunks of all window sizes are in
+    memory.
+
+    Parameters:
+    ------------------
+    rolling_window_sizes: list of positive integer
+    the other parameters are the same as hemm_generating_scenarios_xarr.
+
+    Returns:
+    ------------------
+    str, message of the generation
+    """
 
     t0 = time()
     if group_name not in pp.GROUP_SYMBOLS.keys():
@@ -66,26 +134,35 @@ def hemm_generating_scenarios_xarr(
     if not os.path.exists(pp.SCENARIO_SET_DIR):
         os.makedirs(pp.SCENARIO_SET_DIR)
 
-    scenario_file = pp.SCENARIO_NAME_FORMAT.format(
-        group_name=group_name,
-        n_symbol=n_symbol,
-        rolling_window_size=rolling_window_size,
-        n_scenario=n_scenario,
-        sdx=scenario_set_idx,
-        scenario_start_date=scenario_start_date.strftime("%Y%m%d"),
-        scenario_end_date=scenario_end_date.strftime("%Y%m%d"),
-    )
+    # the window sizes of the existed files are skipped
+    scenario_paths = {}
+    for rolling_window_size in sorted(set(rolling_window_sizes)):
+        scenario_file = pp.SCENARIO_NAME_FORMAT.format(
+            group_name=group_name,
+            n_symbol=n_symbol,
+            rolling_window_size=rolling_window_size,
+            n_scenario=n_scenario,
+            sdx=scenario_set_idx,
+            scenario_start_date=scenario_start_date.strftime("%Y%m%d"),
+            scenario_end_date=scenario_end_date.strftime("%Y%m%d"),
+        )
+        scenario_path = os.path.join(pp.SCENARIO_SET_DIR, scenario_file)
+        if os.path.exists(scenario_path):
+            logging.info("{} exists.".format(scenario_file))
+        else:
+            scenario_paths[rolling_window_size] = scenario_path
 
-    scenario_path = os.path.join(pp.SCENARIO_SET_DIR, scenario_file)
-    if os.path.exists(scenario_path):
-        return "{} exists.".format(scenario_file)
+    if not scenario_paths:
+        return "all scenario files exist."
+    window_sizes = list(scenario_paths.keys())
+    max_window_size = max(window_sizes)
 
     parameters = "{}_{} {}_Mc{}_h{}_s{}_sdx{}_{}_{}".format(
         platform.node(),
         os.getpid(),
         group_name,
         n_symbol,
-        rolling_window_size,
+        "-".join(str(h) for h in window_sizes),
         n_scenario,
         scenario_set_idx,
         scenario_start_date.strftime("%Y%m%d"),
@@ -94,14 +171,7 @@ def hemm_generating_scenarios_xarr(
 
     # read roi data and symbols
     # shape: (n_period, n_stock, attributes)
-    market = group_name[:2]
-    if market == 'TW':
-        asset_xarr = xr.open_dataarray(pp.TAIEX_2005_MKT_CAP_NC)
-
-    elif market == 'US':
-        asset_xarr = xr.open_dataarray(pp.DJIA_2005_NC)
-    else:
-        raise ValueError('unknown market: {}'.format(market))
+    asset_xarr = open_market_panel(group_name[:2])
 
     # all trans_date, pandas.core.indexes.datetimes.DatetimeIndex
     trans_dates = asset_xarr.get_index("trans_date")
@@ -112,6 +182,514 @@ def hemm_generating_scenarios_xarr(
     sc_trans_dates = trans_dates[sc_start_idx: sc_end_idx + 1]
     n_sc_period = len(sc_trans_dates)
 
+    # the roi data of the rolling windows, the first window of the largest
+    # size contains the periods before the first scenario date.
+    est_start_idx = sc_start_idx - max_window_size + 1
+    assert est_start_idx >= 0
+    roi_data = asset_xarr.loc[trans_dates[est_start_idx:sc_end_idx + 1],
+                              symbols, "simple_roi"].values
+
+    # contiguous chunks of dates, each chunk contains its window data and
+    # starts new rolling estimators. The chunks are independent of the
+    # number of workers, so are the scenarios.
+    chunks = [np.arange(idx, min(idx + chunk_size, n_sc_period))
+              for idx in range(0, n_sc_period, chunk_size)]
+    chunk_args = [
+        (roi_data[chunk[0]:chunk[-1] + max_window_size],
+         sc_trans_dates[chunk[0]:chunk[-1] + 1], symbols,
+         window_sizes, n_scenario, scenario_set_idx, parameters,
+         retry_cnt, print_interval, True)
+        for chunk in chunks
+    ]
+
+    # the partial files of the window sizes, the scenarios of a chunk
+    # depend on the chunk size, so the files are always created again.
+    dsts = [open_partial_scenario_file(
+        scenario_paths[rolling_window_size] + ".partial",
+        ("trans_date", "symbol", "scenario"),
+        [sc_trans_dates.values, np.asarray(symbols), np.arange(n_scenario)],
+        np.float32 if float32 else np.float64,
+        json.dumps({"chunk_size": chunk_size}), compress, resume=False)
+        for rolling_window_size in window_sizes]
+    telemetries = []
+
+    def write_chunk(chunk, result):
+        values, telemetry = result
+        for wdx, dst in enumerate(dsts):
+            dst.variables["scenario_roi"][chunk[0]:chunk[-1] + 1] = (
+                values[wdx])
+            dst.n_copied = chunk[-1] + 1
+            dst.sync()
+        telemetries.append(telemetry)
+
+    try:
+        if n_worker <= 1:
+            for chunk, args in zip(chunks, chunk_args):
+                write_chunk(
+                    chunk,
+                    hemm_generating_multi_window_scenarios_of_dates(*args))
+        else:
+            # the chunks are written in order, and at most 2 * n_worker
+            # chunks are submitted ahead of the written one. The workers
+            # are terminated if a chunk fails.
+            with mp.Pool(processes=n_worker) as pool:
+                pending = collections.deque()
+                for chunk, args in zip(chunks, chunk_args):
+                    pending.append((chunk, pool.apply_async(
+                        hemm_generating_multi_window_scenarios_of_dates,
+                        args)))
+                    if len(pending) >= 2 * n_worker:
+                        chunk, result = pending.popleft()
+                        write_chunk(chunk, result.get())
+                while pending:
+                    chunk, result = pending.popleft()
+                    write_chunk(chunk, result.get())
+    except BaseException:
+        for dst in dsts:
+            dst.close()
+        raise
+
+    for wdx, rolling_window_size in enumerate(window_sizes):
+        commit_partial_scenario_file(
+            dsts[wdx], scenario_paths[rolling_window_size],
+            parameters=(group_name, n_symbol, rolling_window_size,
+                        n_scenario, scenario_set_idx, scenario_start_date,
+                        scenario_end_date))
+        telemetry_xarr = xr.DataArray(
+            np.concatenate([telemetry[wdx] for telemetry in telemetries]),
+            dims=("trans_date", "field"),
+            coords=(sc_trans_dates, list(TELEMETRY_FIELDS)),
+        )
+        summary = write_scenario_telemetry(
+            telemetry_xarr, scenario_paths[rolling_window_size])
+        logging.info("h{} telemetry: {}".format(rolling_window_size, summary))
+
+    msg = "generating scenarios {} OK, {:.3f} secs".format(
+        parameters, time() - t0)
+    logging.info(msg)
+    return msg
+
+
+def write_scenario_xarr(scenario_xarr, scenario_path, compress=True,
+                        float32=False, complevel=4, parameters=None):
+    """
+    writing the scenario xarray to the netCDF file. The compressed file is
+    chunked by date, so the readers indexing a date only decompress the
+    chunk of the date. The file is renamed to scenario_path after it is
+    completely written, and then registered in the catalog.
+
+    Parameters:
+    ------------------
+    scenario_xarr : xarray.DataArray, dim:(trans_date, symbol, scenario) or
+        (trans_date, scenario)
+    scenario_path: str
+    compress: bool, zlib compression with the byte shuffle filter, which
+        requires the netCDF4 engine.
+    float32: bool, storing the scenarios in single precision
+    complevel: integer, 1~9, zlib compression level
+    parameters: json-serializable object, parameters of the scenario set
+        in the catalog
+    """
+    encoding, engine = {}, None
+    if compress:
+        engine = "netcdf4"
+        encoding.update(
+            zlib=True,
+            complevel=complevel,
+            shuffle=True,
+            chunksizes=(1,) + scenario_xarr.shape[1:],
+        )
+    if float32:
+        encoding['dtype'] = 'float32'
+    tmp_path = atomic_write_path(scenario_path)
+    scenario_xarr.to_dataset(name="scenario_roi").to_netcdf(
+        tmp_path, engine=engine, encoding={"scenario_roi": encoding})
+    os.replace(tmp_path, scenario_path)
+
+    with Catalog() as catalog:
+        catalog.register(SCENARIO, scenario_path, parameters)
+
+
+def open_partial_scenario_file(partial_path, dims, coords, dtype, origin,
+                               compress=True, complevel=4, resume=True):
+    """
+    opening the partial scenario file which is written chunk by chunk of
+    dates. The number of written dates is kept in the n_copied attribute,
+    and the file is renamed by commit_partial_scenario_file after all
+    dates are written.
+
+    Parameters:
+    ------------------
+    partial_path: str, the path of the partial file
+    dims: tuple of str, the dimensions of the scenarios, the first one is
+        trans_date
+    coords: list of numpy.array, the coordinates of the dimensions
+    dtype: numpy.dtype, type of the scenarios
+    origin: str, description of the content, a partial file of another
+        origin is not resumed
+    compress: bool, zlib compression with the byte shuffle filter
+    complevel: integer, 1~9, zlib compression level
+    resume: bool, resuming the existed partial file of the same origin and
+        shape, otherwise the partial file is created again.
+
+    Returns:
+    ------------------
+    netCDF4.Dataset
+    """
+    import netCDF4
+
+    shape = tuple(len(values) for values in coords)
+    dst = None
+    if os.path.exists(partial_path):
+        if resume:
+            try:
+                dst = netCDF4.Dataset(partial_path, "a")
+                if (dst.getncattr("origin") != origin or
+                        dst.variables["scenario_roi"].shape != shape):
+                    dst.close()
+                    dst = None
+            except (OSError, KeyError, AttributeError):
+                dst = None
+        if dst is None:
+            os.remove(partial_path)
+        else:
+            logging.info("resume {} from {}/{} dates".format(
+                partial_path, dst.n_copied, shape[0]))
+            return dst
+
+    dst = netCDF4.Dataset(partial_path, "w")
+    for dim, size in zip(dims, shape):
+        dst.createDimension(dim, size)
+    date_var = dst.createVariable("trans_date", "i8", ("trans_date",))
+    date_var.units = "days since 1970-01-01"
+    date_var.calendar = "proleptic_gregorian"
+    date_var[:] = np.asarray(coords[0]).astype("datetime64[D]").astype(
+        np.int64)
+    for dim, values in zip(dims[1:], coords[1:]):
+        values = np.asarray(values)
+        if values.dtype.kind in "OU":
+            var = dst.createVariable(dim, str, (dim,))
+            var[:] = values.astype(object)
+        else:
+            var = dst.createVariable(dim, values.dtype, (dim,))
+            var[:] = values
+    dst.createVariable(
+        "scenario_roi", dtype, dims, zlib=compress, complevel=complevel,
+        shuffle=compress, chunksizes=(1,) + shape[1:])
+    dst.origin = origin
+    dst.n_copied = 0
+    dst.sync()
+    return dst
+
+
+def commit_partial_scenario_file(dst, dst_path, parameters=None):
+    """
+    closing the completely written partial file of
+    open_partial_scenario_file, renaming it to dst_path, and registering it
+    in the catalog.
+    """
+    partial_path = dst.filepath()
+    dst.delncattr("n_copied")
+    dst.close()
+    os.replace(partial_path, dst_path)
+    with Catalog() as catalog:
+        catalog.register(SCENARIO, dst_path, parameters)
+
+
+def stream_concat_scenarios(src_paths, dst_path, trans_dates=None,
+                            chunk_size=32, compress=True, complevel=4,
+                            parameters=None):
+    """
+    concatenating the scenario files of contiguous periods along the
+    trans_date dimension, the dates are copied chunk by chunk from the
+    sources to the destination, so only a chunk of the scenarios is in
+    memory. The destination is written to dst_path + ".partial" with the
+    number of copied dates in its attributes, so a stopped concatenation
+    resumes from the last copied chunk. The file is renamed to dst_path
+    after all dates are copied, and then registered in the catalog.
+
+    Parameters:
+    ------------------
+    src_paths: list of str, the scenario files ordered by date
+    dst_path: str
+    trans_dates: pandas.DatetimeIndex, optional, all trading dates, if it
+        is given, the first date of a source must be the next trading date
+        of the last date of the previous source.
+    chunk_size: positive integer, number of dates of a copy
+    compress: bool, zlib compression with the byte shuffle filter
+    complevel: integer, 1~9, zlib compression level
+    parameters: json-serializable object, parameters of the scenario set
+        in the catalog
+
+    Returns:
+    ------------------
+    integer, number of dates of the destination
+    """
+    srcs = [xr.open_dataarray(path) for path in src_paths]
+    try:
+        # validating the coordinates and the date continuity
+        first = srcs[0]
+        for path, src in zip(src_paths, srcs):
+            if src.dims != first.dims or src.dims[0] != "trans_date":
+                raise ValueError("dims {} of {} mismatch {}.".format(
+                    src.dims, path, first.dims))
+            for dim in first.dims[1:]:
+                if not src.get_index(dim).equals(first.get_index(dim)):
+                    raise ValueError("coordinate {} of {} mismatches.".format(
+                        dim, path))
+            if not src.get_index("trans_date").is_monotonic_increasing:
+                raise ValueError("dates of {} are not increasing.".format(
+                    path))
+        for path, prev, src in zip(src_paths[1:], srcs[:-1], srcs[1:]):
+            last_date = prev.get_index("trans_date")[-1]
+            next_date = src.get_index("trans_date")[0]
+            if next_date <= last_date:
+                raise ValueError("{} starts at {}, not after {}.".format(
+                    path, next_date, last_date))
+            if trans_dates is not None and (
+                    next_date not in trans_dates or
+                    last_date not in trans_dates or
+                    trans_dates.get_loc(next_date) !=
+                    trans_dates.get_loc(last_date) + 1):
+                raise ValueError("dates between {} and {} are missing "
+                                 "before {}.".format(last_date, next_date,
+                                                     path))
+
+        dates = np.concatenate(
+            [src.get_index("trans_date").values for src in srcs])
+        n_date = len(dates)
+        sources = json.dumps([os.path.basename(path) for path in src_paths])
+
+        # resuming the partial file of the same sources
+        dst = open_partial_scenario_file(
+            dst_path + ".partial", first.dims,
+            [dates] + [first.get_index(dim).values
+                       for dim in first.dims[1:]],
+            first.dtype, sources, compress, complevel)
+
+        # copying the chunks of dates
+        scenario_var = dst.variables["scenario_roi"]
+        offset = 0
+        for src in srcs:
+            n_src_date = src.shape[0]
+            for idx in range(0, n_src_date, chunk_size):
+                end = min(idx + chunk_size, n_src_date)
+                if offset + end <= dst.n_copied:
+                    continue
+                scenario_var[offset + idx: offset + end] = src[idx:end].values
+                dst.n_copied = offset + end
+                dst.sync()
+            offset += n_src_date
+        commit_partial_scenario_file(dst, dst_path, parameters)
+    finally:
+        for src in srcs:
+            src.close()
+    return n_date
+
+
+def scenario_telemetry_path(scenario_path):
+    """
+    the companion telemetry file of the scenario file, which has the same
+    name in the telemetry sub-directory of the scenario directory.
+    """
+    scenario_dir, scenario_file = os.path.split(scenario_path)
+    return os.path.join(scenario_dir, "telemetry", scenario_file)
+
+
+def scenario_telemetry_summary(telemetry_xarr):
+    """
+    summary statistics of the generation telemetry
+
+    Parameters:
+    ------------------
+    telemetry_xarr: xarray.DataArray, dim: (trans_date, field)
+
+    Returns:
+    ------------------
+    dict, the relaxed dates are the dates whose max_err is larger than
+    DEFAULT_MAX_ERR, and the retried dates are the dates requiring more
+    than one attempt.
+    """
+    elapsed = telemetry_xarr.loc[:, "elapsed"]
+    max_errs = telemetry_xarr.loc[:, "max_err"].values
+    n_attempts = telemetry_xarr.loc[:, "n_attempt"].values
+    total_secs = float(elapsed.sum())
+    wasted_secs = float(telemetry_xarr.loc[:, "wasted"].sum())
+    return {
+        "n_date": int(telemetry_xarr.shape[0]),
+        "total_secs": total_secs,
+        "wasted_secs": wasted_secs,
+        "wasted_ratio": wasted_secs / total_secs if total_secs > 0 else 0.,
+        "mean_attempt": float(n_attempts.mean()),
+        "n_retried_date": int((n_attempts > 1).sum()),
+        "n_relaxed_date": int((max_errs > DEFAULT_MAX_ERR).sum()),
+        "max_moment_err": float(telemetry_xarr.loc[:, "moment_err"].max()),
+        "max_corr_err": float(telemetry_xarr.loc[:, "corr_err"].max()),
+        "slowest_date": str(elapsed.idxmax(dim="trans_date").values)[:10],
+    }
+
+
+def write_scenario_telemetry(telemetry_xarr, scenario_path):
+    """
+    writing the telemetry of the scenario file to its companion file, the
+    summary statistics are stored in the attributes.
+
+    Parameters:
+    ------------------
+    telemetry_xarr: xarray.DataArray, dim: (trans_date, field)
+    scenario_path: str, path of the scenario file
+
+    Returns:
+    ------------------
+    dict, summary statistics of the telemetry
+    """
+    telemetry_path = scenario_telemetry_path(scenario_path)
+    telemetry_dir = os.path.dirname(telemetry_path)
+    if not os.path.exists(telemetry_dir):
+        os.makedirs(telemetry_dir)
+    summary = scenario_telemetry_summary(telemetry_xarr)
+    telemetry_xarr = telemetry_xarr.copy()
+    telemetry_xarr.attrs.update(summary)
+    tmp_path = atomic_write_path(telemetry_path)
+    telemetry_xarr.to_dataset(name="telemetry").to_netcdf(tmp_path)
+    os.replace(tmp_path, telemetry_path)
+    return summary
+
+
+def load_scenario_telemetry(scenario_path):
+    """
+    Returns:
+    ------------------
+    xarray.DataArray, dim: (trans_date, field), the telemetry of the
+    scenario file, and the summary statistics in the attributes.
+    """
+    telemetry_path = scenario_telemetry_path(scenario_path)
+    if not os.path.exists(telemetry_path):
+        raise ValueError("{} not exists.".format(telemetry_path))
+    return xr.open_dataarray(telemetry_path)
+
+
+def scenario_errors(scenarios, tgt_moments, tgt_corrs):
+    """
+    the errors of the scenarios, the same as the convergence criterion of
+    HeMM with unbiased estimators.
+
+    Parameters:
+    ------------------
+    scenarios: numpy.array, shape: (n_symbol, n_scenario)
+    tgt_moments: numpy.array, shape: (n_symbol, 4)
+    tgt_corrs: numpy.array, shape: (n_symbol, n_symbol)
+
+    Returns:
+    ------------------
+    (moment_err, corr_err), root mean square errors
+    """
+    moments = np.column_stack((
+        scenarios.mean(axis=1),
+        scenarios.std(axis=1, ddof=1),
+        spstats.skew(scenarios, axis=1, bias=False),
+        spstats.kurtosis(scenarios, axis=1, bias=False),
+    ))
+    moment_err = np.sqrt(((moments - tgt_moments) ** 2).sum())
+    corr_err = np.sqrt(((np.corrcoef(scenarios) - tgt_corrs) ** 2).sum())
+    return moment_err, corr_err
+
+
+def scenario_date_seed(scenario_set_idx, sc_date):
+    """
+    the seed of the independent random stream of a scenario date
+
+    Parameters:
+    ------------------
+    scenario_set_idx: positive integer
+    sc_date: datetime.date
+
+    Returns:
+    ------------------
+    integer, seed of numpy.random
+    """
+    return int(np.random.SeedSequence(
+        [scenario_set_idx, int(sc_date.strftime("%Y%m%d"))]
+    ).generate_state(1)[0])
+
+
+def hemm_generating_scenarios_of_dates(
+        roi_data,
+        sc_trans_dates,
+        symbols,
+        rolling_window_size,
+        n_scenario,
+        scenario_set_idx,
+        parameters="",
+        retry_cnt=5,
+        print_interval=10,
+):
+    """
+    generating the scenarios of contiguous dates using Heuristic moment
+    matching, the random stream of each date is seeded by
+    (scenario_set_idx, date).
+
+    Parameters:
+    ------------------
+    roi_data: numpy.array, shape: (n_sc_period + rolling_window_size - 1,
+        n_symbol), the roi of the rolling windows of the dates
+    sc_trans_dates: pandas.DatetimeIndex, the scenario dates
+    symbols: list of str
+    rolling_window_size: positive integer, number of historical periods
+    n_scenario: integer, number of scenarios to generating
+    scenario_set_idx: positive integer
+    parameters: str, description of the scenario file for logging
+    retry_cnt: positive integer, maximum retry of scenarios
+    print_interval: positive integer
+
+    Returns:
+    ------------------
+    scenarios: numpy.array, shape: (n_sc_period, n_symbol, n_scenario)
+    """
+    return hemm_generating_multi_window_scenarios_of_dates(
+        roi_data, sc_trans_dates, symbols, [rolling_window_size, ],
+        n_scenario, scenario_set_idx, parameters, retry_cnt,
+        print_interval)[0]
+
+
+def hemm_generating_multi_window_scenarios_of_dates(
+        roi_data,
+        sc_trans_dates,
+        symbols,
+        rolling_window_sizes,
+        n_scenario,
+        scenario_set_idx,
+        parameters="",
+        retry_cnt=5,
+        print_interval=10,
+        return_telemetry=False,
+):
+    """
+    generating the scenarios of contiguous dates of several rolling window
+    sizes, the random stream of each (window size, date) is seeded by
+    (scenario_set_idx, date), so the windows share the same base draws.
+
+    Parameters:
+    ------------------
+    roi_data: numpy.array, shape: (n_sc_period + max_window_size - 1,
+        n_symbol), the roi of the rolling windows of the dates
+    rolling_window_sizes: list of positive integer
+    return_telemetry: bool, returning the generation telemetry
+    the other parameters are the same as hemm_generating_scenarios_of_dates.
+
+    Returns:
+    ------------------
+    scenarios: numpy.array, shape: (n_window, n_sc_period, n_symbol,
+        n_scenario)
+    telemetry: numpy.array, shape: (n_window, n_sc_period, n_field), the
+        fields are TELEMETRY_FIELDS, only if return_telemetry is True.
+    """
+    n_symbol = len(symbols)
+    n_sc_period = len(sc_trans_dates)
+    n_window = len(rolling_window_sizes)
+    max_window_size = max(rolling_window_sizes)
+    assert roi_data.shape == (n_sc_period + max_window_size - 1, n_symbol)
+
     # estimating moments and correlation matrix
     est_moments = xr.DataArray(
         np.zeros((n_symbol, 4)),
@@ -119,76 +697,106 @@ def hemm_generating_scenarios_xarr(
         coords=(symbols, ["mean", "std", "skew", "ex-kurt"]),
     )
 
-    # output scenario xarray, shape: (n_sc_period, n_stock, n_scenario)
-    scenario_xarr = xr.DataArray(
-        np.zeros((n_sc_period, n_symbol, n_scenario)),
-        dims=("trans_date", "symbol", "scenario"),
-        coords=(sc_trans_dates, symbols, range(n_scenario)),
-    )
+    # output scenarios, shape: (n_window, n_sc_period, n_stock, n_scenario)
+    scenarios = np.zeros((n_window, n_sc_period, n_symbol, n_scenario))
+    telemetry = np.zeros((n_window, n_sc_period, len(TELEMETRY_FIELDS)))
+
+    # rolling estimators of the moments and correlation matrix, each
+    # estimator contains the periods of its window before the first
+    # scenario date.
+    estimators = []
+    for rolling_window_size in rolling_window_sizes:
+        estimator = RollingMoments(n_symbol, rolling_window_size)
+        for rdx in range(max_window_size - rolling_window_size,
+                         max_window_size - 1):
+            estimator.push(roi_data[rdx])
+        estimators.append(estimator)
 
     for tdx, sc_date in enumerate(sc_trans_dates):
         t1 = time()
-
-        # rolling historical window indices, containing today
-        est_start_idx = sc_start_idx + tdx - rolling_window_size + 1
-        est_end_idx = sc_start_idx + tdx + 1
-        hist_interval = trans_dates[est_start_idx:est_end_idx]
-
-        assert len(hist_interval) == rolling_window_size
-        assert hist_interval[-1] == sc_date
-
-        # hist_data, shape: (win_length, n_stock)
-        hist_data = asset_xarr.loc[hist_interval, symbols, "simple_roi"]
-
-        # unbiased moments and corrs estimators
-        est_moments.loc[:, "mean"] = hist_data.mean(axis=0)
-        est_moments.loc[:, "std"] = hist_data.std(axis=0, ddof=1)
-        est_moments.loc[:, "skew"] = spstats.skew(hist_data,
-                                                  axis=0, bias=False)
-        est_moments.loc[:, "ex-kurt"] = spstats.kurtosis(hist_data,
-                                                         axis=0, bias=False)
-        # est_corrs = (hist_data.T).corr("pearson")
-        est_corrs = np.corrcoef(hist_data.T)
-
-        # generating unbiased scenario
-        for error_count in range(retry_cnt):
-            try:
-                for error_exponent in range(-3, 0):
-                    try:
-                        # default moment and corr errors (1e-3, 1e-3)
-                        # df shape: (n_stock, n_scenario)
-                        max_moment_err = 10 ** error_exponent
-                        max_corr_err = 10 ** error_exponent
-                        scenario_df = HeMM(
-                            est_moments.values,
-                            est_corrs,
-                            n_scenario,
-                            False,
-                            max_moment_err,
-                            max_corr_err,
-                        )
-                    except ValueError as _:
-                        logging.warning(
-                            "{} relaxing max err: {}_max_mom_err:{}, "
-                            "max_corr_err{}".format(
-                                parameters, sc_date, max_moment_err,
-                                max_corr_err
+        today_roi = roi_data[tdx + max_window_size - 1]
+        date_seed = scenario_date_seed(scenario_set_idx, sc_date)
+
+        for wdx, estimator in enumerate(estimators):
+            # rolling historical window containing today, the unbiased
+            # moments and corrs estimators
+            estimator.push(today_roi)
+            est_moments[:] = estimator.moments()
+
+            # the kurtosis of any distribution is not less than
+            # skewness^2 + 1, projecting the impossible unbiased estimators
+            # instead of retrying.
+            skews = est_moments.loc[:, "skew"].values
+            min_ex_kurts = skews * skews - 2.
+            min_ex_kurts += 0.05 * (1. + np.abs(min_ex_kurts))
+            infeasible = est_moments.loc[:, "ex-kurt"].values < min_ex_kurts
+            if infeasible.any():
+                logging.warning(
+                    "{} {} h{} infeasible (skew, ex-kurt) of {}, "
+                    "projected".format(
+                        sc_date, parameters, rolling_window_sizes[wdx],
+                        list(np.asarray(symbols)[infeasible])))
+                est_moments.loc[:, "ex-kurt"] = np.maximum(
+                    est_moments.loc[:, "ex-kurt"].values, min_ex_kurts)
+
+            est_corrs = estimator.corrcoef()
+
+            # independent random stream of the date, shared by the windows
+            np.random.seed(date_seed)
+
+            # generating unbiased scenario
+            t2 = time()
+            n_attempt, wasted = 0, 0.
+            for error_count in range(retry_cnt):
+                try:
+                    scenario_df = None
+                    for error_exponent in range(-3, 0):
+                        t3 = time()
+                        n_attempt += 1
+                        try:
+                            # default moment and corr errors (1e-3, 1e-3)
+                            # df shape: (n_stock, n_scenario)
+                            max_moment_err = 10 ** error_exponent
+                            max_corr_err = 10 ** error_exponent
+                            scenario_df = HeMM(
+                                est_moments.values,
+                                est_corrs,
+                                n_scenario,
+                                False,
+                                max_moment_err,
+                                max_corr_err,
+                            )
+                        except ValueError as _:
+                            wasted += time() - t3
+                            logging.warning(
+                                "{} relaxing max err: {}_max_mom_err:{}, "
+                                "max_corr_err{}".format(
+                                    parameters, sc_date, max_moment_err,
+                                    max_corr_err
+                                )
                             )
-                        )
-                    else:
-                        # generating scenarios success
-                        break
-
-            except Exception as e:
-                # catch any other exception
-                if error_count == retry_cnt - 1:
-                    raise Exception(e)
-            else:
-                # generating scenarios success
-                break
-
-        # store scenarios, scenario_df shape: (n_stock, n_scenario)
-        scenario_xarr.loc[sc_date, :, :] = scenario_df
+                        else:
+                            # generating scenarios success
+                            break
+                    if scenario_df is None:
+                        raise ValueError(
+                            "{} {} not converge at the max err {}".format(
+                                parameters, sc_date, max_moment_err))
+
+                except Exception as e:
+                    # catch any other exception
+                    if error_count == retry_cnt - 1:
+                        raise Exception(e)
+                else:
+                    # generating scenarios success
+                    break
+
+            telemetry[wdx, tdx] = (
+                (time() - t2, wasted, n_attempt, max_moment_err) +
+                scenario_errors(scenario_df, est_moments.values, est_corrs))
+
+            # store scenarios, scenario_df shape: (n_stock, n_scenario)
+            scenarios[wdx, tdx] = scenario_df
 
         # clear est data
         if tdx % print_interval == 0:
@@ -202,13 +810,9 @@ def hemm_generating_scenarios_xarr(
                 )
             )
 
-    # write scenario
-    scenario_xarr.to_netcdf(scenario_path)
-
-    msg = "generating scenarios {} OK, {:.3f} secs".format(
-        parameters, time() - t0)
-    logging.info(msg)
-    return msg
+    if return_telemetry:
+        return scenarios, telemetry
+    return scenarios
 
 
 def _hemm_all_scenario_names(exp_name):
@@ -289,96 +893,108 @@ def _hemm_all_scenario_names(exp_name):
         }
 
 
-def hemm_checking_existed_scenario_names(exp_name, scenario_set_dir=None):
+def hemm_checking_existed_scenario_names(exp_name, scenario_set_dir=None,
+                                         resync=False):
     """
-    return unfinished experiment parameters.
+    return unfinished experiment parameters, the finished scenario sets are
+    queried from the catalog, which is synchronized with the scenario
+    directory at the first query.
+
+    resync: bool, synchronizing the catalog with the scenario directory
+        even if it has been synchronized.
     """
     if scenario_set_dir is None:
         scenario_set_dir = pp.SCENARIO_SET_DIR
     all_names = _hemm_all_scenario_names(exp_name)
 
-    os.chdir(scenario_set_dir)
-    existed_names = glob.glob("*.nc")
-    for name in existed_names:
-        all_names.pop(name, None)
-
     # unfinished params
-    return all_names
+    with Catalog() as catalog:
+        return catalog.unfinished(SCENARIO, all_names, scenario_set_dir,
+                                  resync)
 
 
-def hemm_dispatch_scenario_names(exp_name, scenario_set_dir=pp.SCENARIO_SET_DIR):
+def group_multi_window_params(params,
+                              max_n_window=DEFAULT_MAX_N_WINDOW):
     """
-    ipyparalllel load balance view parallel processing
-
-    """
-    unfinished_names = hemm_checking_existed_scenario_names(exp_name,
-                                                            scenario_set_dir)
-    print("Unfinished scenario: {}".format(len(unfinished_names)))
-    params = unfinished_names.values()
-
-    # task interface
-    rc = ipp.Client(profile="ssh")
-    dv = rc[:]
-    dv.use_dill()
-    dv.scatter("engine_id", rc.ids, flatten=True)
-    print("Engine IDs: ", dv["engine_id"])
-    n_engine = len(rc.ids)
-
-    # import packages on each node
-    with dv.sync_imports():
-        import sys
-        import platform
-        import os
-        import portfolio_programming.simulation.hemm_gen_scenarios
-
-    def name_pid():
-        return "node:{}, pid:{}".format(platform.node(), os.getpid())
-
-    # show available nodes
-    infos = dv.apply_sync(name_pid)
-    for info in infos:
-        print(info)
-
-    lbv = rc.load_balanced_view()
-    print("starting  load-balance view.")
-    try:
-        #  ipyparallel.client.asyncresult.AsyncMapResult
-        ar = lbv.map_async(
-            lambda
-                x: portfolio_programming.simulation.hemm_gen_scenarios.hemm_generating_scenarios_xarr(
-                *x
-            ),
-            params,
-        )
-
-        while not ar.ready():
-            print(
-                "{} n_engine:{} gen_scenarios task: {}/{} {:10.1f} "
-                "secs".format(
-                    str(dt.datetime.now()), n_engine,
-                    ar.progress, len(ar), ar.elapsed
-                )
-            )
-            sys.stdout.flush()
-            sleep(5)
+    grouping the parameters of the dissertation scenario files, which differ
+    only in the rolling window size, into the parameters of
+    hemm_generating_multi_window_scenarios_xarr.
 
-            # type(ar.stdout) == list, and the length is equal to the number of
-            # task.
-            stdouts = ar.stdout
-            if not any(stdouts):
-                continue
+    Parameters:
+    ------------------
+    params: iterable of (group_name, n_symbol, rolling_window_size,
+        n_scenario, scenario_set_idx, scenario_start_date, scenario_end_date)
+    max_n_window: positive integer, max number of window sizes of a group,
+        which bounds the memory of a task, None for no limit.
 
-            for task_idx, outs in enumerate(stdouts):
-                print("{}: {}".format(task_idx, outs.split("\n")[-1]))
-            sys.stdout.flush()
+    Returns:
+    ------------------
+    list of (group_name, n_symbol, rolling_window_sizes, n_scenario,
+        scenario_set_idx, scenario_start_date, scenario_end_date)
+    """
+    groups = {}
+    for group_name, n_symbol, h, s, sdx, s_date, e_date in params:
+        key = (group_name, n_symbol, s, sdx, s_date, e_date)
+        groups.setdefault(key, []).append(h)
+
+    multi_window_params = []
+    for (group_name, n_symbol, s, sdx, s_date, e_date), hs in sorted(
+            groups.items()):
+        hs = sorted(hs)
+        step = max_n_window if max_n_window else len(hs)
+        for idx in range(0, len(hs), step):
+            multi_window_params.append(
+                (group_name, n_symbol, hs[idx:idx + step], s, sdx, s_date,
+                 e_date))
+    return multi_window_params
+
+
+def hemm_dispatch_scenario_names(exp_name, scenario_set_dir=pp.SCENARIO_SET_DIR,
+                                 multi_window=False,
+                                 max_n_window=DEFAULT_MAX_N_WINDOW,
+                                 n_worker=None, timeout=None, retry_cnt=1,
+                                 resync=False):
+    """
+    generating the unfinished scenario files by the local worker processes.
+
+    multi_window: bool, each task generates the scenario files of all
+        unfinished window sizes of a group in one pass.
+    max_n_window: positive integer, max number of window sizes of a task
+        in the multi-window mode, None for no limit.
+    n_worker: positive integer, optional, max number of concurrent tasks,
+        default is the number of CPUs.
+    timeout: float, optional, max seconds of a task
+    retry_cnt: non-negative integer, max number of retries of a task
+    resync: bool, synchronizing the catalog with the scenario directory
+        even if it has been synchronized.
 
-    except Exception as e:
-        print(e)
-        ar.abort()
-        sys.exit(1)
+    Returns:
+    -------------
+    dict, the summary of the scheduler, see async_scheduler.schedule_tasks
+    """
+    unfinished_names = hemm_checking_existed_scenario_names(
+        exp_name, scenario_set_dir, resync)
+    print("Unfinished scenario: {}".format(len(unfinished_names)))
+    if multi_window:
+        params = {
+            "{}_Mc{}_h{}_s{}_sdx{}".format(
+                group_name, n_symbol, "-".join(str(h) for h in hs), s, sdx):
+                (group_name, n_symbol, hs, s, sdx, s_date, e_date)
+            for group_name, n_symbol, hs, s, sdx, s_date, e_date in
+            group_multi_window_params(unfinished_names.values(),
+                                      max_n_window)
+        }
+        gen_func = hemm_generating_multi_window_scenarios_xarr
+    else:
+        params = unfinished_names
+        gen_func = hemm_generating_scenarios_xarr
+    print("number of tasks: {}".format(len(params)))
 
-    print(ar.get())
-    print("speed up:{:.2%}".format(ar.serial_time / ar.wall_time))
+    summary = run_async_tasks(gen_func, params, n_worker, timeout,
+                              retry_cnt)
+    for name, reason in summary['failed'].items():
+        print("failed: {} {}".format(name, reason))
+    return summary
 
 
 def merge_scenario(
@@ -446,22 +1062,21 @@ def merge_scenario(
                         merge_count += 1
                         continue
 
-                    if os.path.exists(nc1_path):
-                        xarr1 = xr.open_dataarray(open(nc1_path, "rb"))
-                    else:
+                    if not os.path.exists(nc1_path):
                         logging.info("{} does not exist.".format(nc1))
                         unfinished_params.append(nc1_path)
                         continue
 
-                    if os.path.exists(nc2_path):
-                        xarr2 = xr.open_dataarray(open(nc2_path, "rb"))
-                    else:
+                    if not os.path.exists(nc2_path):
                         logging.info("{} does not exist.".format(nc2))
                         unfinished_params.append(nc2_path)
                         continue
 
-                    concat_xarr = xr.concat([xarr1, xarr2], dim="trans_date")
-                    concat_xarr.to_netcdf(scenario_path)
+                    # copying the dates chunk by chunk, a stopped merge is
+                    # resumed by the next call
+                    stream_concat_scenarios(
+                        [nc1_path, nc2_path], scenario_path,
+                        parameters=(sdx, s_date1, e_date2, m, h, s))
                     logging.info(
                         "concat scenario {} and {} to {}".format(nc1, nc2,
                                                                  concat_nc)
@@ -538,13 +1153,87 @@ if __name__ == "__main__":
         help="pre-generated scenario set index.",
     )
 
+    parser.add_argument(
+        "--n_worker",
+        type=int,
+        default=1,
+        help="number of local processes generating the dates of a "
+             "scenario file.",
+    )
+
+    parser.add_argument(
+        "--no_compress",
+        default=False,
+        action="store_true",
+        help="writing the uncompressed scenario file.",
+    )
+
+    parser.add_argument(
+        "--float32",
+        default=False,
+        action="store_true",
+        help="writing the scenarios in single precision.",
+    )
+
+    parser.add_argument(
+        "--multi_window",
+        default=False,
+        action="store_true",
+        help="generating the scenarios of all window sizes of a group in "
+             "one pass.",
+    )
+
+    parser.add_argument(
+        "--max_n_window",
+        type=int,
+        default=DEFAULT_MAX_N_WINDOW,
+        help="max number of window sizes generated in one pass of the "
+             "multi-window mode.",
+    )
+
+    parser.add_argument(
+        "--n_task",
+        type=int,
+        default=None,
+        help="number of concurrent tasks of the parallel mode, default is "
+             "the number of CPUs.",
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="max seconds of a task of the parallel mode.",
+    )
+
+    parser.add_argument(
+        "--retry",
+        type=int,
+        default=1,
+        help="max number of retries of a task of the parallel mode.",
+    )
+
+    parser.add_argument(
+        "--resync",
+        default=False,
+        action="store_true",
+        help="synchronizing the catalog with the scenario directory "
+             "before querying the unfinished scenarios.",
+    )
+
     args = parser.parse_args()
     if args.exp_name not in pp.valid_exp_name():
         raise ValueError('unknown exp_name:{}'.format(args.exp_name))
 
     if args.parallel:
         print("generating scenario in parallel mode")
-        hemm_dispatch_scenario_names(args.exp_name)
+        hemm_dispatch_scenario_names(args.exp_name,
+                                     multi_window=args.multi_window,
+                                     max_n_window=args.max_n_window,
+                                     n_worker=args.n_task,
+                                     timeout=args.timeout,
+                                     retry_cnt=args.retry,
+                                     resync=args.resync)
     elif args.merge:
         merge_scenario()
     else:
@@ -554,12 +1243,25 @@ if __name__ == "__main__":
         if args.group_name not in group_symbols.keys():
             raise ValueError('unknown group_name: {}'.format(args.group_name))
 
-        hemm_generating_scenarios_xarr(
-            args.group_name,
-            len(group_symbols[args.group_name]),
-            args.rolling_window_size,
-            args.n_scenario,
-            args.sdx,
-            pp.SCENARIO_START_DATE,
-            pp.SCENARIO_END_DATE,
-        )
+        if args.multi_window:
+            # all window sizes of the dissertation, at most max_n_window
+            # window sizes in a pass
+            rolling_window_sizes = list(range(50, 240 + 10, 10))
+            step = args.max_n_window
+        else:
+            rolling_window_sizes = [args.rolling_window_size, ]
+            step = 1
+
+        for idx in range(0, len(rolling_window_sizes), step):
+            hemm_generating_multi_window_scenarios_xarr(
+                args.group_name,
+                len(group_symbols[args.group_name]),
+                rolling_window_sizes[idx:idx + step],
+                args.n_scenario,
+                args.sdx,
+                pp.SCENARIO_START_DATE,
+                pp.SCENARIO_END_DATE,
+                n_worker=args.n_worker,
+                compress=not args.no_compress,
+                float32=args.float32,
+            )
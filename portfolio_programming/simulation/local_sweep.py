@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+local sweep of the simulations on a single host, which is an
+alternative of the zmq parameter server and clients.
+
+The tasks are run by the scheduler of async_scheduler: each task runs in
+its own child process, and at most n_worker tasks run concurrently. A task
+is retried if its process exits abnormally (an exception, or killed by the
+system), or it runs longer than the timeout. The progress and the
+throughput are logged periodically.
+"""
+
+import datetime as dt
+import logging
+import platform
+import sys
+from time import time
+
+import portfolio_programming as pp
+from portfolio_programming.simulation.async_scheduler import (
+    log_task_event, run_async_tasks, sweep_progress)
+from portfolio_programming.simulation.task_cost import order_by_cost
+
+
+def run_local_sweep(func, params, n_worker=None, timeout=None, retry_cnt=2,
+                    progress_interval=60):
+    """
+    the tasks are run by async_scheduler.schedule_tasks, and the progress
+    is logged at most every progress_interval seconds.
+
+    Parameters:
+    -------------
+    func: callable, the simulation function, func(*args) of each task
+    params: dict, key: task name (e.g. the report name), value: tuple of
+        the arguments of func
+    n_worker: positive integer, optional, max number of concurrent
+        processes, default is the number of CPUs.
+    timeout: float, optional, max seconds of a run of a task
+    retry_cnt: non-negative integer, max number of retries of a task
+    progress_interval: float, seconds between the progress summaries
+
+    Returns:
+    -------------
+    dict, finished: list of the finished task names,
+        failed: dict of the failed task names and their last reasons,
+        n_retry: total number of retries, elapsed: seconds
+    """
+    last_progress = [time()]
+
+    def log_event(event):
+        now = time()
+        with_progress = (event['event'] != "started" and
+                         now - last_progress[0] >= progress_interval)
+        if with_progress:
+            last_progress[0] = now
+        log_task_event(event, with_progress)
+
+    logging.info("{} local sweep of {} tasks".format(platform.node(),
+                                                     len(params)))
+    summary = run_async_tasks(func, params, n_worker, timeout, retry_cnt,
+                              log_event)
+    logging.info(sweep_progress(len(params), len(summary['finished']),
+                                len(summary['failed']), 0,
+                                summary['n_retry'], summary['elapsed']))
+    return summary
+
+
+def spsp_cvar_sweep(exp_name, setting, yearly=False):
+    """
+    Returns:
+    -------------
+    (func, params) of the unfinished SPSP_CVaR reports in the
+    longest-expected-first order
+    """
+    from portfolio_programming.simulation.parallel_spsp_cvar import (
+        checking_existed_spsp_cvar_report)
+    from portfolio_programming.simulation.run_spsp_cvar import run_SPSP_CVaR
+    return (run_SPSP_CVaR, order_by_cost(
+        checking_existed_spsp_cvar_report(exp_name, setting, yearly))[0])
+
+
+def nr_spsp_cvar_sweep(exp_name, regret_type):
+    """
+    Returns:
+    -------------
+    (func, params) of the unfinished NER or NIR SPSP_CVaR reports in the
+    longest-expected-first order
+    """
+    from portfolio_programming.simulation.run_nr_spsp_cvar import (
+        checking_existed_spsp_cvar_report, run_NR_SPSP_CVaR)
+    return (run_NR_SPSP_CVaR, order_by_cost(
+        checking_existed_spsp_cvar_report(exp_name, regret_type))[0])
+
+
+def weight_portfolio_sweep(strategy, exp_type=None, strategy_param=None,
+                           exp_start_date=dt.date(2005, 1, 1),
+                           exp_end_date=dt.date(2018, 12, 28)):
+    """
+    the weight portfolio runs of all groups.
+
+    Parameters:
+    -------------
+    strategy: str, {"bah", "eg", "poly"}
+    exp_type: str, experiment type of eg or poly
+    strategy_param: float, eta of eg, or power of poly
+
+    Returns:
+    -------------
+    (func, params), key of params is the group name
+    """
+    group_names = list(pp.GROUP_SYMBOLS.keys())
+    if strategy == "bah":
+        from portfolio_programming.simulation.run_wp_bah import run_bah
+        return run_bah, {
+            group_name: ("dissertation", group_name, exp_start_date,
+                         exp_end_date)
+            for group_name in group_names}
+    elif strategy == "eg":
+        from portfolio_programming.simulation.run_wp_eg import run_eg
+        func = run_eg
+    elif strategy == "poly":
+        from portfolio_programming.simulation.run_wp_poly import run_poly
+        func = run_poly
+    else:
+        raise ValueError("unknown weight portfolio strategy: {}".format(
+            strategy))
+    return func, {
+        group_name: (strategy_param, exp_type, group_name, exp_start_date,
+                     exp_end_date)
+        for group_name in group_names}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        stream=sys.stdout,
+        format='%(filename)15s %(levelname)10s %(asctime)s\n'
+               '%(message)s',
+        datefmt='%Y%m%d-%H:%M:%S',
+        level=logging.INFO)
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("target", type=str,
+                        choices=("spsp_cvar", "nr_spsp_cvar", "bah", "eg",
+                                 "poly"),
+                        help="the simulation of the sweep")
+    parser.add_argument("-e", "--exp_name", type=str,
+                        default="dissertation",
+                        choices=["dissertation", "stocksp_cor15"],
+                        help="name of the experiment")
+    parser.add_argument("--setting", type=str,
+                        choices=("compact", "general"),
+                        help="SPSP setting")
+    parser.add_argument("--yearly", default=False, action='store_true',
+                        help="yearly experiment")
+    parser.add_argument("-r", "--regret", type=str,
+                        choices=("external", "internal"),
+                        help="regret type of NR_SPSP_CVaR")
+    parser.add_argument("--exp_type", type=str,
+                        help="experiment type of the weight portfolio")
+    parser.add_argument("--param", type=float,
+                        help="eta of eg, or power of poly")
+    parser.add_argument("-n", "--n_worker", type=int, default=None,
+                        help="number of concurrent processes")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="max seconds of a task")
+    parser.add_argument("--retry", type=int, default=2,
+                        help="max number of retries of a task")
+    parser.add_argument("--progress_interval", type=float, default=60,
+                        help="seconds between the progress summaries")
+    args = parser.parse_args()
+
+    if args.target == "spsp_cvar":
+        sweep_func, sweep_params = spsp_cvar_sweep(
+            args.exp_name, args.setting, args.yearly)
+    elif args.target == "nr_spsp_cvar":
+        sweep_func, sweep_params = nr_spsp_cvar_sweep(args.exp_name,
+                                                      args.regret)
+    else:
+        sweep_func, sweep_params = weight_portfolio_sweep(
+            args.target, args.exp_type, args.param)
+
+    summary = run_local_sweep(sweep_func, sweep_params, args.n_worker,
+                              args.timeout, args.retry,
+                              args.progress_interval)
+    for task_name, fail_reason in summary['failed'].items():
+        print("failed: {} {}".format(task_name, fail_reason))
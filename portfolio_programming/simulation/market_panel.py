@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+node-local shared-memory loader of the read-only market data panels.
+
+The first process on a node decodes the netCDF panel and publishes the
+float array and its coordinates in a POSIX shared memory segment. The
+later processes attach zero-copy views of the same segment instead of
+reading and decoding their own copies. The name of the segment is a
+prefix of the path followed by a version of the size and the modification
+time of the file, so a regenerated file is published again, and the
+segments of the older versions are removed by the publisher or by
+release_market_panel. A segment whose publisher died before it was ready
+is removed after the timeout of the waiting process, which publishes it
+again.
+
+layout of a segment:
+    [0, 8): length of the pickled metadata, 0 until the segment is ready
+    [8, 8 + length): pickled metadata, dims, coords, dtype, shape, attrs
+    [data_offset, ...): the values of the panel in C order
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from time import time, sleep
+
+import numpy as np
+import xarray as xr
+
+import portfolio_programming as pp
+
+_HEADER_SIZE = 8
+_ALIGNMENT = 64
+_MAX_META_SIZE = 1 << 24
+
+# the directory of the POSIX shared memory segments on Linux, the stale
+# segments are not removed on the platforms without it.
+_SHM_DIR = "/dev/shm"
+
+# key: path, value: (name, SharedMemory, DataArray) of the attached
+# panels, the segments are mapped until the process exits.
+_PANELS = {}
+
+
+def market_panel_path(market):
+    """
+    Parameters:
+    -------------
+    market: str, {"TW", "US"}, or the path of a netCDF panel
+
+    Returns:
+    -------------
+    str, path of the netCDF panel
+    """
+    if market == "TW":
+        return pp.TAIEX_2005_MKT_CAP_NC
+    elif market == "US":
+        return pp.DJIA_2005_NC
+    elif os.path.splitext(market)[1] == ".nc":
+        return market
+    raise ValueError("unknown market: {}".format(market))
+
+
+def shared_panel_prefix(path):
+    """
+    Returns:
+    -------------
+    str, the common prefix of the names of the segments of all versions of
+    the file
+    """
+    return "pp_{}_".format(
+        hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16])
+
+
+def shared_panel_name(path):
+    """
+    Returns:
+    -------------
+    str, name of the shared memory segment of the current version of the
+    file
+    """
+    stat = os.stat(path)
+    version = "{}|{}".format(stat.st_size, stat.st_mtime_ns)
+    return shared_panel_prefix(path) + hashlib.sha1(
+        version.encode()).hexdigest()[:8]
+
+
+def _segment_names(prefix):
+    """ names of the existing segments with the prefix """
+    if not os.path.isdir(_SHM_DIR):
+        return []
+    return [name for name in os.listdir(_SHM_DIR) if name.startswith(prefix)]
+
+
+def _remove_segment(name, inode=None, empty_only=False):
+    """
+    removing the segment, if inode is given, the segment is removed only if
+    it is still the same file, e.g. not published again by the other
+    process.
+
+    Returns:
+    -------------
+    bool, the segment is removed
+    """
+    seg_path = os.path.join(_SHM_DIR, name)
+    try:
+        stat = os.stat(seg_path)
+        if ((inode is not None and stat.st_ino != inode) or
+                (empty_only and stat.st_size)):
+            return False
+        os.remove(seg_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _untrack(shm):
+    # the segment outlives the processes, it is removed by
+    # release_market_panel instead of the resource tracker.
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def _data_offset(meta_size):
+    offset = _HEADER_SIZE + meta_size
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _view(shm, meta):
+    values = np.ndarray(meta['shape'], dtype=meta['dtype'], buffer=shm.buf,
+                        offset=meta['data_offset'])
+    values.flags.writeable = False
+    return xr.DataArray(values, coords=meta['coords'], dims=meta['dims'],
+                        name=meta['name'], attrs=meta['attrs'])
+
+
+def _publish(path, name):
+    """
+    Returns:
+    -------------
+    (SharedMemory, DataArray), or None if the segment exists.
+    """
+    with xr.open_dataarray(path) as xarr:
+        xarr = xarr.load()
+    values = np.ascontiguousarray(xarr.values)
+    meta = {
+        "dims": xarr.dims,
+        "coords": [(dim, xarr.get_index(dim).values) for dim in xarr.dims],
+        "name": xarr.name,
+        "attrs": dict(xarr.attrs),
+        "dtype": values.dtype.str,
+        "shape": values.shape,
+    }
+    meta_size = len(pickle.dumps(meta, pickle.HIGHEST_PROTOCOL)) + 64
+    meta['data_offset'] = _data_offset(meta_size)
+    meta_bytes = pickle.dumps(meta, pickle.HIGHEST_PROTOCOL)
+    if len(meta_bytes) > meta_size:
+        raise ValueError("metadata of {} is too large".format(path))
+
+    try:
+        shm = shared_memory.SharedMemory(
+            name, create=True, size=meta['data_offset'] + values.nbytes)
+    except FileExistsError:
+        return None
+    _untrack(shm)
+    shm.buf[_HEADER_SIZE:_HEADER_SIZE + len(meta_bytes)] = meta_bytes
+    np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf,
+               offset=meta['data_offset'])[...] = values
+    # the segment is ready after the length is written
+    shm.buf[:_HEADER_SIZE] = struct.pack("<Q", len(meta_bytes))
+    logging.info("published {} in shared memory {}, {:.1f} MB".format(
+        path, name, shm.size / 2 ** 20))
+
+    # the segments of the older versions of the file
+    for old_name in _segment_names(shared_panel_prefix(path)):
+        if old_name != name and _remove_segment(old_name):
+            logging.info("removed shared memory {} of the older version "
+                         "of {}".format(old_name, path))
+    return shm, _view(shm, meta)
+
+
+def _attach(name, timeout):
+    """
+    Returns:
+    -------------
+    (SharedMemory, DataArray), or None if the segment is not ready before
+    the timeout, then the publisher is regarded as dead, and the incomplete
+    segment is removed.
+    """
+    t0 = time()
+    while True:
+        try:
+            shm = shared_memory.SharedMemory(name)
+            break
+        except ValueError:
+            # the segment is created but not yet sized by the publisher
+            if time() - t0 > timeout:
+                if _remove_segment(name, empty_only=True):
+                    logging.warning("removed the empty shared memory "
+                                    "{}".format(name))
+                return None
+            sleep(0.05)
+    _untrack(shm)
+    while True:
+        meta_size = struct.unpack("<Q", bytes(shm.buf[:_HEADER_SIZE]))[0]
+        if 0 < meta_size <= _MAX_META_SIZE:
+            break
+        if time() - t0 > timeout:
+            if _remove_segment(name, os.fstat(shm._fd).st_ino):
+                logging.warning("removed the incomplete shared memory "
+                                "{}".format(name))
+            shm.close()
+            return None
+        sleep(0.05)
+    meta = pickle.loads(bytes(shm.buf[_HEADER_SIZE:
+                                      _HEADER_SIZE + meta_size]))
+    return shm, _view(shm, meta)
+
+
+def open_market_panel(market, shared=True, timeout=60.):
+    """
+    the read-only market data panel, shape: (n_trans_date, n_symbol,
+    n_attribute).
+
+    Parameters:
+    -------------
+    market: str, {"TW", "US"}, or the path of a netCDF panel
+    shared: bool, attaching the shared memory panel of the node, or
+        reading a private copy of the file.
+    timeout: float, seconds to wait for the other process publishing the
+        panel, the incomplete segment is removed and published again after
+        the timeout, and the file is read privately after the second
+        timeout.
+
+    Returns:
+    -------------
+    xarray.DataArray, the values are read-only if it is shared.
+    """
+    path = market_panel_path(market)
+    if not shared:
+        return xr.open_dataarray(path)
+
+    name = shared_panel_name(path)
+    if path in _PANELS and _PANELS[path][0] == name:
+        return _PANELS[path][2]
+
+    panel = None
+    try:
+        # the second round publishes the segment of a dead publisher again
+        for _ in range(2):
+            try:
+                panel = _attach(name, timeout)
+            except FileNotFoundError:
+                panel = _publish(path, name)
+                if panel is None:
+                    # published by the other process in the meantime
+                    panel = _attach(name, timeout)
+            if panel is not None:
+                break
+    except OSError as e:
+        logging.warning("shared memory panel of {} failed: {}".format(
+            path, e))
+        panel = None
+
+    if panel is None:
+        logging.warning("reading private panel of {}".format(path))
+        return xr.open_dataarray(path)
+    _PANELS[path] = (name,) + panel
+    return panel[1]
+
+
+def release_market_panel(market):
+    """
+    removing the shared memory segments of all versions of the panel from
+    the node, the attached processes keep their views until they exit.
+
+    Returns:
+    -------------
+    bool, any segment existed
+    """
+    path = market_panel_path(market)
+    names = set(_segment_names(shared_panel_prefix(path)))
+    if os.path.exists(path):
+        names.add(shared_panel_name(path))
+    released = False
+    for name in names:
+        try:
+            shm = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            continue
+        except ValueError:
+            # the empty segment of a dead publisher
+            released |= _remove_segment(name, empty_only=True)
+            continue
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            continue
+        released = True
+    return released
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    logging.basicConfig(
+        stream=sys.stdout,
+        format='%(filename)15s %(levelname)10s %(asctime)s\n'
+               '%(message)s',
+        datefmt='%Y%m%d-%H:%M:%S',
+        level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("markets", type=str, nargs="+",
+                        help="TW, US, or paths of the netCDF panels")
+    parser.add_argument("--release", default=False, action='store_true',
+                        help="removing the shared memory panels of the node")
+    args = parser.parse_args()
+
+    for mkt in args.markets:
+        if args.release:
+            print("{} released: {}".format(mkt, release_market_panel(mkt)))
+        else:
+            print(open_market_panel(mkt).shape)
@@ -4,22 +4,28 @@ Authors: Hung-Hsin Chen <chen1116@gmail.com>
 """
 
 import datetime as dt
-import glob
 import logging
-import multiprocessing as mp
 import os
 import pickle
 import platform
 import sys
-import pandas as pd
-from time import (time, sleep)
+import zlib
+from time import time
 
 import numpy as np
 import xarray as xr
 import zmq
 
 import portfolio_programming as pp
+from portfolio_programming.simulation.catalog import (Catalog, REPORT)
+from portfolio_programming.simulation.report_aggregation import (
+    REPORT_ORIGINALS, REPORT_ADDITIONALS, aggregate_report_metrics)
+from portfolio_programming.simulation.report_index import (
+    ReportIndex, report_name_parameters)
 from portfolio_programming.simulation.run_spsp_cvar import run_SPSP_CVaR
+from portfolio_programming.simulation.task_server import (
+    TaskQueue, serve_tasks, run_task_client)
+from portfolio_programming.simulation.task_cost import order_by_cost
 
 
 def get_zmq_version():
@@ -133,9 +139,13 @@ def _all_spsp_cvar_params(exp_name, setting, yearly=False):
             }
 
 
-def checking_existed_spsp_cvar_report(exp_name, setting, yearly):
+def checking_existed_spsp_cvar_report(exp_name, setting, yearly,
+                                       resync=False):
     """
     return unfinished experiment parameters.
+
+    resync: bool, synchronizing the catalog with the report directory
+        even if it has been synchronized.
     """
     if yearly:
         report_dir = os.path.join(pp.REPORT_DIR,
@@ -149,146 +159,64 @@ def checking_existed_spsp_cvar_report(exp_name, setting, yearly):
     print("{} {} totally n_parameter: {}".format(
         exp_name, setting, len(all_reports)))
 
-    os.chdir(report_dir)
-    existed_reports = glob.glob("*.pkl")
-    for report in existed_reports:
-        all_reports.pop(report, None)
+    with Catalog() as catalog:
+        all_reports = catalog.unfinished(REPORT, all_reports, report_dir,
+                                         resync)
 
     # unfinished params
     return all_reports
 
 
-def parameter_server(exp_name, setting, yearly):
-    node = platform.node()
-    pid = os.getpid()
-    server_node_pid = "{}[pid:{}]".format(node, pid)
-    context = zmq.Context()
-
-    # zmq.sugar.socket.Socket
-    socket = context.socket(zmq.REP)
-
-    # Protocols supported include tcp, udp, pgm, epgm, inproc and ipc.
-    socket.bind("tcp://*:25555")
-
-    # multiprocessing queue is thread-safe.
-    params = mp.Queue()
-    [params.put(v) for v in
-     checking_existed_spsp_cvar_report(exp_name, setting, yearly).values()]
-    progress_node_pid = set()
-    progress_node_count = {}
-    finished = {}
-    print("Ready to serving, {} {} remaining {} n_parameter.".format(
-        exp_name, setting, params.qsize()))
-
-    svr_start_time = dt.datetime.now()
-    t0 = time()
-
-    while not params.empty():
-        # Wait for request from client
-        client_node_pid = socket.recv_string()
-        print("{:<15}, {} Received request: {}".format(
-            str(dt.datetime.now()),
-            server_node_pid,
-            client_node_pid))
-
-        #  Send reply back to client
-        work = params.get()
-        print("send {} to {}".format(work, client_node_pid))
-        socket.send_pyobj(work)
-
-        c_node, c_pid = client_node_pid.split('_')
-        finished.setdefault(c_node, 0)
-        if client_node_pid in progress_node_pid:
-            # the node have done a work
-            finished[c_node] += 1
-            progress_node_count[c_node]['req_time'] = dt.datetime.now()
-        else:
-            progress_node_count.setdefault(
-                c_node, {"req_time": dt.datetime.now(), "cnt": 0})
-            progress_node_count[c_node]['req_time'] = dt.datetime.now()
-            progress_node_count[c_node]['cnt'] += 1
-
-        # the progress set is not robust, because we don't track
-        # if a process on a node is crashed or not.
-        progress_node_pid.add(client_node_pid)
-
-        print("server start time:{}, elapsed:{}\nremaining n_parameter:{}, "
-              "".format(svr_start_time.strftime("%Y%m%d-%H:%M:%S"),
-                        time() - t0, params.qsize()))
-
-        print("progressing: {}".format(len(progress_node_pid)))
-        for c_node, cnt in finished.items():
-            print("node:{:<8} progress:{:>3} ,finish:{:>3} last req:{}".format(
-                c_node, progress_node_count[c_node]['cnt'], cnt,
-                progress_node_count[c_node]['req_time'].strftime(
-                    "%Y%m%d-%H:%M:%S"))
-            )
-
-    print("end of serving, remaining {} parameters.".format(params.qsize()))
-    socket.close()
-    context.term()
-    params.close()
-
-
-def parameter_client(server_ip="140.117.168.49", max_reconnect_count=30):
-    node = platform.node()
-    pid = os.getpid()
-
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    url = "tcp://{}:25555".format(server_ip)
-    socket.connect(url)
-
-    # for IO monitoring
-    poll = zmq.Poller()
-    poll.register(socket, zmq.POLLIN)
-
-    node_pid = "{}_{}".format(node, pid)
-    reconnect_count = 0
-    while True:
-        # send request to server
-        socket.send_string(node_pid)
-
-        # wait 10 seconds for server responding
-        socks = dict(poll.poll(10000))
-
-        if socks.get(socket) == zmq.POLLIN:
-            # still connected
-            reconnect_count = 0
-
-            # receive parameters from server
-            work = socket.recv_pyobj()
-            print("{:<15} receiving: {}".format(
-                str(dt.datetime.now()),
-                work))
-            run_SPSP_CVaR(*work)
+def task_queue_path(exp_name, setting, yearly=False):
+    """ path of the persistent task queue of the parameter server """
+    return os.path.join(pp.DATA_DIR, "task_queue",
+                        "SPSP_CVaR_{}_{}{}.sqlite".format(
+                            exp_name, setting, "_yearly" if yearly else ""))
 
-        else:
-            # no response from server, reconnected
-            reconnect_count += 1
-            sleep(10)
-            if reconnect_count >= max_reconnect_count:
-                break
-
-            socket.setsockopt(zmq.LINGER, 0)
-            socket.close()
-            poll.unregister(socket)
-
-            # reconnection
-            socket = context.socket(zmq.REQ)
-            socket.connect(url)
-            poll.register(socket, zmq.POLLIN)
 
-            # socket.send_string(node_pid)
-            print('{}, reconnect to {}'.format(dt.datetime.now(), url))
-
-    socket.close()
-    context.term()
+def parameter_server(exp_name, setting, yearly, lease_secs=600.,
+                     port=25555, resync=False):
+    """
+    the tasks are leased to the clients, and requeued if the leases expire.
+    The queue is persisted, so a restarted server resumes the leases.
+    The tasks are leased in the longest-expected-first order of the cost
+    model fitted from the finished reports.
 
+    resync: bool, synchronizing the catalog with the report directory
+        even if it has been synchronized.
+    """
+    with TaskQueue(task_queue_path(exp_name, setting, yearly),
+                   lease_secs) as task_queue:
+        params, costs = order_by_cost(
+            checking_existed_spsp_cvar_report(exp_name, setting, yearly,
+                                              resync))
+        n_new = task_queue.add(params, costs)
+        print("Ready to serving, {} {}, queued n_parameter: {}.".format(
+            exp_name, setting, n_new))
+        serve_tasks(task_queue, "tcp://*:{}".format(port))
+        for name, reason in task_queue.failed().items():
+            print("failed: {} {}".format(name, reason))
+
+
+def parameter_client(server_ip="140.117.168.49", max_reconnect_count=30,
+                     heartbeat_secs=60., port=25555):
+    run_task_client(run_SPSP_CVaR, server_ip, port, heartbeat_secs,
+                    max_reconnect_count)
+
+
+def aggregating_reports(exp_name, setting, yearly=False, n_worker=None,
+                        cache_path=None):
+    """
+    aggregating the reports into a netCDF file.
 
-def aggregating_reports(exp_name, setting, yearly=False):
+    The metrics of the reports are computed by a process pool, and cached
+    by the checksums of the reports, so a rerun only processes the new or
+    changed reports.
 
-    import arch.bootstrap.multiple_comparison as arch_comp
+    n_worker: positive integer, optional, number of processes, default is
+        the number of CPUs.
+    cache_path: str, optional, path of the cache of the report metrics
+    """
 
     if exp_name not in ('dissertation', 'stocksp_cor15'):
         raise ValueError('unknown exp_name:{}'.format(exp_name))
@@ -380,15 +308,7 @@ def aggregating_reports(exp_name, setting, yearly=False):
         n_scenarios = [1000, ]
         alphas = ["{:.2f}".format(v / 100.) for v in range(50, 100, 5)]
 
-    originals = [
-        'initial_wealth', 'final_wealth',
-        'cum_roi', 'daily_roi', 'daily_mean_roi',
-        'daily_std_roi', 'daily_skew_roi', 'daily_ex-kurt_roi',
-        'Sharpe', 'Sortino_full', 'Sortino_partial'
-    ]
-    # additional attributes
-    additionals = ['annual_roi', 'daily_VSS', 'SPA_c']
-    attributes = originals + additionals
+    attributes = list(REPORT_ORIGINALS + REPORT_ADDITIONALS)
 
     report_xarr = xr.DataArray(
         np.zeros((len(years),
@@ -415,80 +335,52 @@ def aggregating_reports(exp_name, setting, yearly=False):
                 attributes)
     )
     t0 = time()
+    if cache_path is None:
+        cache_path = os.path.join(pp.DATA_DIR, "report_metric_cache.sqlite")
+
     # key: report_name, value: parameters
     report_dict = _all_spsp_cvar_params(exp_name, setting, yearly)
-    report_count = 0
-    no_report_count_params = []
-    no_report_count = 0
     parent_dir = pp.REPORT_DIR
-
-    for idx, (name, param) in enumerate(report_dict.items()):
-        t1 = time()
-        path = os.path.join(parent_dir, name)
-        print(path)
-        exp_name, setting, grp, m, h, s, a, sdx, s_date, e_date = param
-        interval = "{}_{}".format(s_date.strftime("%Y%m%d"),
-                                  e_date.strftime("%Y%m%d"))
-        alpha = "{:.2f}".format(a)
-        try:
-            report = pd.read_pickle(path)
-
-            for attr in originals:
-                report_xarr.loc[
-                    interval, grp, sdx, m, h, alpha, attr] = report[attr]
-
-            year_count = (e_date.year - s_date.year) + 1
-            for attr in additionals:
-                if attr == 'annual_roi':
-                    val = np.power(report['cum_roi'] + 1, 1. / year_count) - 1
-                elif attr == 'daily_VSS':
-                    risks = report['estimated_risk_xarr']
-                    val = float(risks.loc[:, 'VSS'].mean() / report[
-                        'initial_wealth'])
-                elif attr == 'SPA_c':
-                    dec_xarr = report['decision_xarr']
-                    wealth_arr = dec_xarr.loc[:, :, 'wealth'].sum(
-                        axis=1).to_series()
-                    rois = wealth_arr.pct_change()
-                    rois[0] = 0
-                    # print(rois.values)
-                    spa_value = 0
-                    for _ in range(3):
-                        spa = arch_comp.SPA(rois.values,
-                                            np.zeros(rois.size),
-                                            reps=1000)
-                        spa.seed(np.random.randint(0, 2 ** 31 - 1))
-                        spa.compute()
-                        # preserve the worse p_value
-                        if spa.pvalues[1] > spa_value:
-                            spa_value = spa.pvalues[1]
-                    val = spa_value
-
-                report_xarr.loc[
-                    interval, grp, sdx, m, h, alpha, attr] = val
-
-            report_count += 1
-            print("[{}/{}] {} {:.2%} elapsed:{:.2f}/{:.2f} secs".format(
-                idx + 1, len(report_dict),
-                report['simulation_name'],
-                report['cum_roi'],
-                time() - t1,
-                time() - t0
-            ))
-
-        except FileNotFoundError:
-            no_report_count_params.append(name)
-            no_report_count += 1
-            continue
-        except Exception as e:
-            print("{} Error: {}".format(name, e))
-            sys.exit(-1)
+    reports = {}
+    for name, param in report_dict.items():
+        s_date, e_date = param[-2:]
+        year_count = (e_date.year - s_date.year) + 1
+        # the SPA seed of a report is fixed
+        reports[name] = (os.path.join(parent_dir, name),
+                         (year_count, zlib.crc32(name.encode())))
+
+    metrics, no_report_count_params, failed = aggregate_report_metrics(
+        reports, cache_path, n_worker=n_worker)
+    if failed:
+        for name, error in failed.items():
+            print("{} Error: {}".format(name, error))
+        raise ValueError("{} reports failed.".format(len(failed)))
+
+    # the positions of the coordinates
+    coord_positions = [{v: idx for idx, v in enumerate(
+        report_xarr.get_index(dim))} for dim in report_xarr.dims[:-1]]
+    indices, values = [], []
+    for name, metric in metrics.items():
+        _, _, grp, m, h, s, a, sdx, s_date, e_date = report_dict[name]
+        keys = ("{}_{}".format(s_date.strftime("%Y%m%d"),
+                               e_date.strftime("%Y%m%d")),
+                grp, sdx, m, h, "{:.2f}".format(a))
+        indices.append([pos[key] for pos, key in zip(coord_positions, keys)])
+        values.append([metric[attr] for attr in attributes])
+    if indices:
+        report_xarr.values[tuple(np.asarray(indices).T)] = values
+
+    # the derived metrics are merged into the runs of the report index
+    with ReportIndex() as report_index:
+        for name, metric in metrics.items():
+            kind, params = report_name_parameters(name)
+            report_index.add(name, kind, params, metric, parent_dir)
 
     for rp in no_report_count_params:
         print("no data:", rp)
 
-    print("report count:{}, no report count:{}".format(
-        report_count, no_report_count))
+    print("report count:{}, no report count:{}, {:.2f} secs".format(
+        len(metrics), len(no_report_count_params), time() - t0))
 
     report_xarr.to_netcdf(out_report_path)
 
@@ -534,6 +426,10 @@ if __name__ == '__main__':
                         action='store_true',
                         help="run SPSP_CVaR client mode")
 
+    parser.add_argument("--server_ip", type=str, default="140.117.168.49",
+                        help="ip of the parameter server")
+    parser.add_argument("--lease", type=float, default=600.,
+                        help="seconds of a task lease without heartbeat")
     parser.add_argument("--compact_report", default=False,
                         action="store_true",
                         help="SPSP_CVaR compact setting report")
@@ -542,6 +438,14 @@ if __name__ == '__main__':
                         action="store_true",
                         help="SPSP_CVaR general setting report")
 
+    parser.add_argument("-n", "--n_worker", type=int, default=None,
+                        help="number of processes aggregating the reports")
+
+    parser.add_argument("--resync", default=False, action="store_true",
+                        help="synchronizing the catalog with the report "
+                             "directory before querying the unfinished "
+                             "reports.")
+
     parser.add_argument("--unfinished_param", default=False,
                         action="store_true")
 
@@ -550,19 +454,22 @@ if __name__ == '__main__':
         print("run SPSP_CVaR parameter server mode")
         print("exp_name: {}, setting:{}, yearly:{}".format(
             args.exp_name, args.setting, args.yearly))
-        parameter_server(args.exp_name, args.setting, args.yearly)
+        parameter_server(args.exp_name, args.setting, args.yearly,
+                         args.lease, resync=args.resync)
     elif args.client:
         print("run SPSP_CVaR client mode")
-        parameter_client()
+        parameter_client(args.server_ip)
     elif args.compact_report:
         print("SPSP CVaR compact setting report")
-        aggregating_reports(args.exp_name, "compact", args.yearly)
+        aggregating_reports(args.exp_name, "compact", args.yearly,
+                            args.n_worker)
     elif args.general_report:
         print("SPSP CVaR general setting report")
-        aggregating_reports(args.exp_name, "general", args.yearly)
+        aggregating_reports(args.exp_name, "general", args.yearly,
+                            args.n_worker)
     elif args.unfinished_param:
-        params_dict = checking_existed_spsp_cvar_report(args.setting,
-                                                       args.yearly)
+        params_dict = checking_existed_spsp_cvar_report(
+            args.exp_name, args.setting, args.yearly, args.resync)
         for rp in params_dict.keys():
             print("no data:", rp)
         print("no data count: {}.".format(len(params_dict)))
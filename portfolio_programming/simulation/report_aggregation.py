@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+parallel and incremental aggregation of the simulation reports.
+
+The derived metrics of a report (e.g. annual_roi, daily_VSS, SPA_c) are
+computed by a process pool, and cached in a SQLite file keyed by the
+checksum of the report. A rerun only loads the new or changed reports.
+The checksum of an unchanged file (same size and modification time) is
+reused from the cache instead of reading the file again.
+"""
+
+import json
+import logging
+import multiprocessing as mp
+import os
+import sqlite3
+from time import time
+
+import numpy as np
+
+from portfolio_programming.simulation.catalog import file_checksum
+from portfolio_programming.statistics.spa import batch_spa_pvalues
+
+# the attributes copied from the report
+REPORT_ORIGINALS = (
+    'initial_wealth', 'final_wealth',
+    'cum_roi', 'daily_roi', 'daily_mean_roi',
+    'daily_std_roi', 'daily_skew_roi', 'daily_ex-kurt_roi',
+    'Sharpe', 'Sortino_full', 'Sortino_partial'
+)
+
+# the attributes derived from the report
+REPORT_ADDITIONALS = ('annual_roi', 'daily_VSS', 'SPA_c')
+
+
+def spa_consistent_pvalue(rois, n_trial=3, reps=1000, seed=None):
+    """
+    the consistent p-value of Hansen's SPA test of the rois against the
+    zero benchmark.
+
+    Parameters:
+    -------------
+    rois: numpy.array, shape: (n_period,)
+    n_trial: positive integer, the test is repeated n_trial times, and the
+        worst (largest) p-value is preserved.
+    reps: positive integer, number of the bootstrap replications
+    seed: integer, optional, seed of the bootstrap
+
+    Returns:
+    -------------
+    float
+    """
+    return float(batch_spa_pvalues(rois, reps, n_trial=n_trial,
+                                   seed=seed)[0, 1])
+
+
+def spsp_cvar_report_metrics(path, year_count, seed=None):
+    """
+    Parameters:
+    -------------
+    path: str, path of a SPSP_CVaR report
+    year_count: integer, number of the years of the experiment
+    seed: integer, optional, seed of the SPA test
+
+    Returns:
+    -------------
+    dict, key: attribute of REPORT_ORIGINALS and REPORT_ADDITIONALS
+    """
+    import pandas as pd
+
+    report = pd.read_pickle(path)
+    metrics = {attr: float(report[attr]) for attr in REPORT_ORIGINALS}
+    metrics['annual_roi'] = float(
+        np.power(report['cum_roi'] + 1, 1. / year_count) - 1)
+
+    risks = report['estimated_risk_xarr']
+    metrics['daily_VSS'] = float(risks.loc[:, 'VSS'].mean() /
+                                 report['initial_wealth'])
+
+    dec_xarr = report['decision_xarr']
+    wealth_arr = dec_xarr.loc[:, :, 'wealth'].sum(axis=1).to_series()
+    rois = wealth_arr.pct_change()
+    rois.iloc[0] = 0
+    metrics['SPA_c'] = spa_consistent_pvalue(rois.values, seed=seed)
+    return metrics
+
+
+class ReportMetricCache(object):
+    """
+    cache of the derived metrics of the reports
+    """
+
+    def __init__(self, cache_path, timeout=60.):
+        cache_dir = os.path.dirname(os.path.abspath(cache_path))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.conn = sqlite3.connect(cache_path, timeout=timeout)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS metric ("
+                "name TEXT PRIMARY KEY, "
+                "checksum TEXT NOT NULL, "
+                "size INTEGER, "
+                "mtime_ns INTEGER, "
+                "metrics TEXT NOT NULL, "
+                "updated REAL)"
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def checksum(self, name, path):
+        """
+        Returns:
+        -------------
+        str, checksum of the file, which is reused from the cache if the
+        size and the modification time of the file are unchanged.
+        """
+        stat = os.stat(path)
+        row = self.conn.execute(
+            "SELECT checksum FROM metric WHERE name = ? AND size = ? AND "
+            "mtime_ns = ?", (name, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row is not None:
+            return row[0]
+        return file_checksum(path)
+
+    def get(self, name, checksum):
+        """
+        Returns:
+        -------------
+        dict or None if the metrics of the checksum are not cached.
+        """
+        row = self.conn.execute(
+            "SELECT metrics FROM metric WHERE name = ? AND checksum = ?",
+            (name, checksum)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, name, path, checksum, metrics):
+        stat = os.stat(path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metric VALUES (?, ?, ?, ?, ?, ?)",
+                (name, checksum, stat.st_size, stat.st_mtime_ns,
+                 json.dumps(metrics), time()))
+
+
+def _metric_task(args):
+    """ the task of the process pool """
+    func, name, path, func_args = args
+    try:
+        return name, func(path, *func_args), None
+    except Exception as e:
+        return name, None, "{}: {}".format(type(e).__name__, e)
+
+
+def aggregate_report_metrics(reports, cache_path, metric_func=None,
+                             n_worker=None):
+    """
+    Parameters:
+    -------------
+    reports: dict, key: report name, value: (path, tuple of the arguments
+        of metric_func after the path)
+    cache_path: str, path of the SQLite cache file
+    metric_func: callable, metric_func(path, *args) returns a dict of the
+        metrics, it must be picklable. default is spsp_cvar_report_metrics.
+    n_worker: positive integer, optional, number of processes, default is
+        the number of CPUs.
+
+    Returns:
+    -------------
+    metrics: dict, key: report name, value: dict of the metrics
+    missing: list of the names whose files do not exist
+    failed: dict, key: report name, value: error of the metric_func
+    """
+    if metric_func is None:
+        metric_func = spsp_cvar_report_metrics
+    if n_worker is None:
+        n_worker = mp.cpu_count()
+
+    metrics, missing, failed = {}, [], {}
+    checksums, tasks = {}, []
+    t0 = time()
+    with ReportMetricCache(cache_path) as cache:
+        for name, (path, func_args) in reports.items():
+            if not os.path.exists(path):
+                missing.append(name)
+                continue
+            checksums[name] = cache.checksum(name, path)
+            cached = cache.get(name, checksums[name])
+            if cached is not None:
+                metrics[name] = cached
+            else:
+                tasks.append((metric_func, name, path, tuple(func_args)))
+
+        logging.info("{} reports, cached: {}, new or changed: {}, "
+                     "missing: {}".format(len(reports), len(metrics),
+                                          len(tasks), len(missing)))
+        if n_worker <= 1 or len(tasks) <= 1:
+            results = map(_metric_task, tasks)
+            pool = None
+        else:
+            pool = mp.Pool(processes=min(n_worker, len(tasks)))
+            results = pool.imap_unordered(_metric_task, tasks)
+
+        try:
+            for idx, (name, value, error) in enumerate(results):
+                if error is not None:
+                    failed[name] = error
+                    logging.warning("{} failed: {}".format(name, error))
+                    continue
+                metrics[name] = value
+                cache.put(name, reports[name][0], checksums[name], value)
+                logging.info("[{}/{}] {} elapsed: {:.2f} secs".format(
+                    idx + 1, len(tasks), name, time() - t0))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    return metrics, missing, failed
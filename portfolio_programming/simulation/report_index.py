@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+SQLite index of the parameters and the scalar metrics of the finished
+simulation runs.
+
+A simulation registers its parameters and metrics in the index when its
+report is written, and the aggregation adds the derived metrics (e.g.
+annual_roi, SPA_c) of the same run. The parameter searches query the
+index instead of reconstructing the report names and unpickling the
+reports.
+
+The parameters and the metrics of a run are stored as JSON objects, and a
+field in the filters, the order, or the group of a query is looked up in
+the parameters first, then in the metrics.
+"""
+
+import datetime as dt
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+from time import time
+
+import portfolio_programming as pp
+
+# the scalar metrics copied from a report
+INDEX_METRICS = (
+    'initial_wealth', 'final_wealth', 'n_exp_period', 'cum_trans_fee_loss',
+    'cum_roi', 'daily_roi', 'daily_mean_roi', 'daily_std_roi',
+    'daily_skew_roi', 'daily_ex-kurt_roi', 'Sharpe', 'Sortino_full',
+    'Sortino_partial', 'simulation_time'
+)
+
+# the comparison operators of the filters
+FILTER_OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "in")
+
+# the columns of the table, the other fields are in the JSON objects
+_COLUMNS = ("name", "kind", "directory", "updated")
+
+_KIND_PATTERN = re.compile(r"^(?:report_)?(SPSP_CVaR|NR_SPSP_CVaR|"
+                           r"NIR_SPSP_CVaR)_")
+_SPSP_CVAR_PATTERN = re.compile(
+    r"^(?:report_)?SPSP_CVaR_(?P<setting>[a-z0-9]+)_(?P<group_name>.+)"
+    r"_Mc(?P<n_symbol>\d+)_M(?P<max_portfolio_size>\d+)"
+    r"_h(?P<rolling_window_size>\d+)_s(?P<n_scenario>\d+)"
+    r"_a(?P<alpha>[0-9.]+)_sdx(?P<scenario_set_idx>\d+)"
+    r"_(?P<exp_start_date>\d{8})_(?P<exp_end_date>\d{8})(?:\.pkl)?$")
+_NR_SPSP_CVAR_PATTERN = re.compile(
+    r"^(?:report_)?N[RI]_SPSP_CVaR_(?P<nr_strategy>.+?)"
+    r"_(?P<nr_strategy_param>\d+\.\d+)_(?P<group_name>[^_]+)"
+    r"_(?P<expert_group_name>.+)_s(?P<n_scenario>\d+)"
+    r"_sdx(?P<scenario_set_idx>\d+)"
+    r"_(?P<exp_start_date>\d{8})_(?P<exp_end_date>\d{8})(?:\.pkl)?$")
+_INTEGER_PARAMETERS = ("n_symbol", "max_portfolio_size",
+                       "rolling_window_size", "n_scenario",
+                       "scenario_set_idx")
+_FLOAT_PARAMETERS = ("alpha", "nr_strategy_param")
+
+
+def _date_str(value):
+    """ date or datetime or 'YYYYMMDD' to 'YYYYMMDD' """
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.strftime("%Y%m%d")
+    return str(value)
+
+
+def spsp_cvar_parameters(setting, group_name, n_symbol, max_portfolio_size,
+                         rolling_window_size, n_scenario, alpha,
+                         scenario_set_idx, exp_start_date, exp_end_date):
+    """
+    Returns:
+    -------------
+    dict, the index parameters of a SPSP_CVaR run
+    """
+    return {
+        "setting": setting,
+        "group_name": group_name,
+        "n_symbol": int(n_symbol),
+        "max_portfolio_size": int(max_portfolio_size),
+        "rolling_window_size": int(rolling_window_size),
+        "n_scenario": int(n_scenario),
+        "alpha": round(float(alpha), 2),
+        "scenario_set_idx": int(scenario_set_idx),
+        "exp_start_date": _date_str(exp_start_date),
+        "exp_end_date": _date_str(exp_end_date),
+    }
+
+
+def nr_spsp_cvar_parameters(nr_strategy, nr_strategy_param, group_name,
+                            expert_group_name, n_scenario, scenario_set_idx,
+                            exp_start_date, exp_end_date):
+    """
+    Returns:
+    -------------
+    dict, the index parameters of a NR_SPSP_CVaR or NIR_SPSP_CVaR run
+    """
+    return {
+        "nr_strategy": nr_strategy,
+        "nr_strategy_param": round(float(nr_strategy_param), 2),
+        "group_name": group_name,
+        "expert_group_name": expert_group_name,
+        "n_scenario": int(n_scenario),
+        "scenario_set_idx": int(scenario_set_idx),
+        "exp_start_date": _date_str(exp_start_date),
+        "exp_end_date": _date_str(exp_end_date),
+    }
+
+
+def report_kind(name):
+    """
+    Parameters:
+    -------------
+    name: str, report file name or simulation name
+
+    Returns:
+    -------------
+    str, {"SPSP_CVaR", "NR_SPSP_CVaR", "NIR_SPSP_CVaR"}, or None if the
+    name is not a known report.
+    """
+    kind = _KIND_PATTERN.match(name)
+    return None if kind is None else kind.group(1)
+
+
+def report_name_parameters(name):
+    """
+    the parameters of the reports written before the index, which are only
+    recorded in the report names.
+
+    Parameters:
+    -------------
+    name: str, report file name or simulation name
+
+    Returns:
+    -------------
+    (kind, parameters), (None, None) if the name is not a known report.
+    """
+    kind = report_kind(name)
+    pattern = (_SPSP_CVAR_PATTERN if kind == "SPSP_CVaR" else
+               _NR_SPSP_CVAR_PATTERN)
+    matched = pattern.match(name) if kind is not None else None
+    if matched is None:
+        return None, None
+
+    params = matched.groupdict()
+    for key in _INTEGER_PARAMETERS:
+        if key in params:
+            params[key] = int(params[key])
+    for key in _FLOAT_PARAMETERS:
+        if key in params:
+            params[key] = round(float(params[key]), 2)
+    return kind, params
+
+
+def report_index_metrics(report):
+    """
+    Parameters:
+    -------------
+    report: dict, simulation report
+
+    Returns:
+    -------------
+    dict, the scalar metrics of INDEX_METRICS in the report
+    """
+    return {key: float(report[key]) for key in INDEX_METRICS
+            if key in report}
+
+
+def simulation_name_of(name):
+    """ report file name to simulation name """
+    if name.startswith("report_"):
+        name = name[len("report_"):]
+    if name.endswith(".pkl"):
+        name = name[:-len(".pkl")]
+    return name
+
+
+class ReportIndex(object):
+    """
+    index of the simulation runs, the key of a record is the simulation
+    name.
+    """
+
+    def __init__(self, db_path=None, timeout=60.):
+        """
+        Parameters:
+        -------------
+        db_path: str, optional, default is pp.CATALOG_DB, the index is a
+            table of the catalog file.
+        timeout: float, seconds to wait for the lock of other writers
+        """
+        self.db_path = db_path if db_path else pp.CATALOG_DB
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_index ("
+                "name TEXT PRIMARY KEY, "
+                "kind TEXT NOT NULL, "
+                "directory TEXT, "
+                "parameters TEXT NOT NULL, "
+                "metrics TEXT NOT NULL, "
+                "updated REAL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS report_index_kind "
+                "ON report_index (kind)")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, name, kind, parameters, metrics, directory=None):
+        """
+        add or update a run, the metrics are merged into the existing
+        metrics of the run, so the derived metrics of the aggregation and
+        the metrics of the simulation are kept together.
+
+        Parameters:
+        -------------
+        name: str, simulation name or report file name
+        kind: str, e.g. "SPSP_CVaR"
+        parameters: dict, the parameters of the run
+        metrics: dict, the scalar metrics of the run
+        directory: str, optional, directory of the report
+        """
+        name = simulation_name_of(name)
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT metrics, directory FROM report_index WHERE name = ?",
+                (name,)).fetchone()
+            merged = json.loads(row[0]) if row is not None else {}
+            merged.update({key: float(value)
+                           for key, value in metrics.items()})
+            if directory is None and row is not None:
+                directory = row[1]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO report_index VALUES "
+                "(?, ?, ?, ?, ?, ?)",
+                (name, kind,
+                 os.path.abspath(directory) if directory else None,
+                 json.dumps(parameters, sort_keys=True),
+                 json.dumps(merged, sort_keys=True), time()))
+
+    def add_report(self, report, directory=None, parameters=None):
+        """
+        add the run of a simulation report.
+
+        Parameters:
+        -------------
+        report: dict, simulation report, which has the simulation_name
+        directory: str, optional, directory of the report
+        parameters: dict, optional, default is parsed from the simulation
+            name.
+        """
+        name = report['simulation_name']
+        kind, name_params = report_name_parameters(name)
+        if kind is None:
+            raise ValueError("unknown report: {}".format(name))
+        self.add(name, kind, parameters if parameters else name_params,
+                 report_index_metrics(report), directory)
+
+    def get(self, name):
+        """
+        Returns:
+        -------------
+        dict with the keys name, kind, directory, parameters, metrics,
+        or None if the run is not indexed.
+        """
+        row = self.conn.execute(
+            "SELECT name, kind, directory, parameters, metrics "
+            "FROM report_index WHERE name = ?",
+            (simulation_name_of(name),)).fetchone()
+        if row is None:
+            return None
+        return {"name": row[0], "kind": row[1], "directory": row[2],
+                "parameters": json.loads(row[3]),
+                "metrics": json.loads(row[4])}
+
+    def names(self, kind=None):
+        """
+        Returns:
+        -------------
+        set of the indexed simulation names
+        """
+        if kind is None:
+            rows = self.conn.execute("SELECT name FROM report_index")
+        else:
+            rows = self.conn.execute(
+                "SELECT name FROM report_index WHERE kind = ?", (kind,))
+        return {row[0] for row in rows}
+
+    def remove(self, name):
+        with self.conn:
+            self.conn.execute("DELETE FROM report_index WHERE name = ?",
+                              (simulation_name_of(name),))
+
+    @staticmethod
+    def _field(field, args):
+        """
+        the SQL expression of a field, the JSON path is a bound argument.
+        """
+        if field in _COLUMNS:
+            return field
+        path = '$."{}"'.format(field.replace('"', '\\"'))
+        args.extend((path, path))
+        return ("COALESCE(json_extract(parameters, ?), "
+                "json_extract(metrics, ?))")
+
+    def _where(self, kind, filters, args):
+        clauses = []
+        if kind is not None:
+            clauses.append("kind = ?")
+            args.append(kind)
+        for field, cond in (filters or {}).items():
+            op, value = (cond if isinstance(cond, tuple) and len(cond) == 2
+                         and cond[0] in FILTER_OPERATORS else ("=", cond))
+            expr = self._field(field, args)
+            if op == "in":
+                values = list(value)
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append("{} IN ({})".format(
+                    expr, ", ".join("?" * len(values))))
+                args.extend(values)
+            else:
+                clauses.append("{} {} ?".format(expr, op))
+                args.append(value)
+        return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def query(self, kind=None, filters=None, order_by=None, ascending=False,
+              group_by=None, limit=None):
+        """
+        Parameters:
+        -------------
+        kind: str, optional, e.g. "SPSP_CVaR"
+        filters: dict, optional, key: parameter or metric name,
+            value: the equal value, or a tuple (operator, value) where the
+            operator is in FILTER_OPERATORS, the value of "in" is a list.
+        order_by: str or list of str, optional, parameters or metrics
+        ascending: boolean, the order of all the order_by fields
+        group_by: str or list of str, optional, parameters of the groups,
+            the limit is applied to each group.
+        limit: positive integer, optional, max number of the runs of the
+            result (of each group if group_by is set).
+
+        Returns:
+        -------------
+        pandas.DataFrame, one row of each run, the columns are name, kind,
+        directory, the parameters, and the metrics.
+        """
+        import pandas as pd
+
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        if limit is not None and limit <= 0:
+            raise ValueError("limit {} should be positive.".format(limit))
+
+        direction = "ASC" if ascending else "DESC"
+        order_args, group_args, where_args = [], [], []
+        order_sql = ", ".join("{} {}".format(
+            self._field(field, order_args), direction)
+            for field in (order_by or []))
+        where_sql = self._where(kind, filters, where_args)
+
+        select = "SELECT name, kind, directory, parameters, metrics"
+        if group_by:
+            group_sql = ", ".join(self._field(field, group_args)
+                                  for field in group_by)
+            sql = ("SELECT name, kind, directory, parameters, metrics FROM "
+                   "({}, ROW_NUMBER() OVER (PARTITION BY {}{}) AS row_rank "
+                   "FROM report_index{})".format(
+                       select, group_sql,
+                       " ORDER BY " + order_sql if order_sql else "",
+                       where_sql))
+            args = group_args + order_args + where_args
+            if limit is not None:
+                sql += " WHERE row_rank <= ?"
+                args.append(limit)
+            # the groups are in order, and so are the runs of a group
+            args = args + group_args
+            sql += " ORDER BY {}, row_rank".format(", ".join(
+                self._field(field, []) for field in group_by))
+        else:
+            sql = select + " FROM report_index" + where_sql
+            args = where_args
+            if order_sql:
+                sql += " ORDER BY " + order_sql
+                args = args + order_args
+            if limit is not None:
+                sql += " LIMIT ?"
+                args.append(limit)
+
+        records = []
+        for name, kind_, directory, params, metrics in self.conn.execute(
+                sql, args):
+            record = {"name": name, "kind": kind_, "directory": directory}
+            record.update(json.loads(params))
+            record.update(json.loads(metrics))
+            records.append(record)
+        return pd.DataFrame.from_records(records)
+
+
+def rebuild_index(report_dir, db_path=None):
+    """
+    index the existing reports of the directory, the parameters are parsed
+    from the report names.
+
+    Parameters:
+    -------------
+    report_dir: str, directory of the reports
+    db_path: str, optional, path of the index
+
+    Returns:
+    -------------
+    number of the indexed reports
+    """
+    import pandas as pd
+
+    t0 = time()
+    names = sorted(name for name in os.listdir(report_dir)
+                   if name.endswith(".pkl") and report_kind(name))
+    n_indexed = 0
+    with ReportIndex(db_path) as index:
+        for rdx, name in enumerate(names):
+            try:
+                report = pd.read_pickle(os.path.join(report_dir, name))
+                index.add_report(report, report_dir)
+            except Exception as e:
+                logging.warning("{} failed: {}".format(name, e))
+                continue
+            n_indexed += 1
+            logging.info("[{}/{}] {} indexed, {:.2f} secs".format(
+                rdx + 1, len(names), name, time() - t0))
+    return n_indexed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        stream=sys.stdout,
+        format='%(filename)15s %(levelname)10s %(asctime)s\n'
+               '%(message)s',
+        datefmt='%Y%m%d-%H:%M:%S',
+        level=logging.INFO)
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", type=str, default=None,
+                        help="index the reports of the directory")
+    parser.add_argument("--db_path", type=str, default=None,
+                        help="path of the index, default is the catalog")
+    parser.add_argument("--kind", type=str, default=None,
+                        choices=("SPSP_CVaR", "NR_SPSP_CVaR",
+                                 "NIR_SPSP_CVaR"),
+                        help="kind of the reports")
+    parser.add_argument("--order_by", type=str, default="cum_roi",
+                        help="the parameter or the metric of the order")
+    parser.add_argument("--group_by", type=str, default=None,
+                        help="the parameter of the groups")
+    parser.add_argument("-n", "--limit", type=int, default=10,
+                        help="number of the runs of each group")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print("{} reports indexed.".format(
+            rebuild_index(args.rebuild, args.db_path)))
+    else:
+        with ReportIndex(args.db_path) as report_index:
+            print(report_index.query(kind=args.kind, order_by=args.order_by,
+                                     group_by=args.group_by,
+                                     limit=args.limit).to_string())
@@ -4,20 +4,24 @@ Author: Hung-Hsin Chen <chenhh@par.cse.nsysu.edu.tw>
 """
 
 import datetime as dt
-import glob
 import os
 import platform
 import sys
-from time import (time, sleep)
 import logging
-import multiprocess as mp
 import numpy as np
 import xarray as xr
 import zmq
 
 import portfolio_programming as pp
+from portfolio_programming.simulation.market_panel import open_market_panel
+from portfolio_programming.simulation.catalog import (Catalog, REPORT)
 from portfolio_programming.simulation.spsp_cvar import (
     NER_SPSP_CVaR, NIR_SPSP_CVaR)
+from portfolio_programming.simulation.scenario_provider import (
+    HeMMScenarioProvider)
+from portfolio_programming.simulation.task_server import (
+    TaskQueue, serve_tasks, run_task_client)
+from portfolio_programming.simulation.task_cost import order_by_cost
 
 
 def get_zmq_version():
@@ -99,147 +103,61 @@ def all_nr_spsp_cvar_params(exp_name, regret_type):
     return params
 
 
-def checking_existed_spsp_cvar_report(exp_name, regret_type):
+def checking_existed_spsp_cvar_report(exp_name, regret_type, resync=False):
+    """
+    return unfinished experiment parameters.
+
+    resync: bool, synchronizing the catalog with the report directory
+        even if it has been synchronized.
+    """
     all_reports = all_nr_spsp_cvar_params(exp_name, regret_type)
 
     report_dir = pp.NRSPSPCVaR_DIR
     print("{} {} totally n_parameter: {}".format(
         exp_name, regret_type, len(all_reports)))
 
-    os.chdir(report_dir)
-    existed_reports = glob.glob("*.pkl")
-    for report in existed_reports:
-        all_reports.pop(report, None)
+    with Catalog() as catalog:
+        all_reports = catalog.unfinished(REPORT, all_reports, report_dir,
+                                         resync)
 
     return all_reports
 
 
-def parameter_server(exp_name, regret_type):
-    node = platform.node()
-    pid = os.getpid()
-    server_node_pid = "{}[pid:{}]".format(node, pid)
-    context = zmq.Context()
-
-    # zmq.sugar.socket.Socket
-    socket = context.socket(zmq.REP)
-
-    # Protocols supported include tcp, udp, pgm, epgm, inproc and ipc.
-    socket.bind("tcp://*:25555")
-
-    # multiprocessing queue is thread-safe.
-    params = mp.Queue()
-    [params.put(v) for v in
-     checking_existed_spsp_cvar_report(exp_name, regret_type).values()]
-    progress_node_pid = set()
-    progress_node_count = {}
-    finished = {}
-    print("Ready to serving, {} {} remaining {} n_parameter.".format(
-        exp_name, regret_type, params.qsize()))
-
-    svr_start_time = dt.datetime.now()
-    t0 = time()
-
-    while not params.empty():
-        # Wait for request from client
-        client_node_pid = socket.recv_string()
-        print("{:<15}, {} Received request: {}".format(
-            str(dt.datetime.now()),
-            server_node_pid,
-            client_node_pid))
-
-        #  Send reply back to client
-        work = params.get()
-        print("send {} to {}".format(work, client_node_pid))
-        socket.send_pyobj(work)
-
-        c_node, c_pid = client_node_pid.split('_')
-        finished.setdefault(c_node, 0)
-        if client_node_pid in progress_node_pid:
-            # the node have done a work
-            finished[c_node] += 1
-            progress_node_count[c_node]['req_time'] = dt.datetime.now()
-        else:
-            progress_node_count.setdefault(
-                c_node, {"req_time": dt.datetime.now(), "cnt": 0})
-            progress_node_count[c_node]['req_time'] = dt.datetime.now()
-            progress_node_count[c_node]['cnt'] += 1
-
-        # the progress set is not robust, because we don't track
-        # if a process on a node is crashed or not.
-        progress_node_pid.add(client_node_pid)
-
-        print("server start time:{}, elapsed:{}\nremaining n_parameter:{}, "
-              "".format(svr_start_time.strftime("%Y%m%d-%H:%M:%S"),
-                        time() - t0, params.qsize()))
-
-        print("progressing: {}".format(len(progress_node_pid)))
-        for c_node, cnt in finished.items():
-            print("node:{:<8} progress:{:>3} ,finish:{:>3} last req:{}".format(
-                c_node, progress_node_count[c_node]['cnt'], cnt,
-                progress_node_count[c_node]['req_time'].strftime(
-                    "%Y%m%d-%H:%M:%S"))
-            )
-
-    print("end of serving, remaining {} parameters.".format(params.qsize()))
-    socket.close()
-    context.term()
-    params.close()
-
-
-def parameter_client(server_ip="140.117.168.49", max_reconnect_count=10):
-    node = platform.node()
-    pid = os.getpid()
-
-    context = zmq.Context()
-    socket = context.socket(zmq.REQ)
-    url = "tcp://{}:25555".format(server_ip)
-    socket.connect(url)
-
-    # for IO monitoring
-    poll = zmq.Poller()
-    poll.register(socket, zmq.POLLIN)
-
-    node_pid = "{}_{}".format(node, pid)
-    reconnect_count = 0
-    while True:
-        # send request to server
-        socket.send_string(node_pid)
-
-        # wait 10 seconds for server responding
-        socks = dict(poll.poll(10000))
+def task_queue_path(exp_name, regret_type):
+    """ path of the persistent task queue of the parameter server """
+    return os.path.join(pp.DATA_DIR, "task_queue",
+                        "NR_SPSP_CVaR_{}_{}.sqlite".format(exp_name,
+                                                           regret_type))
 
-        if socks.get(socket) == zmq.POLLIN:
-            # still connected
-            reconnect_count = 0
 
-            # receive parameters from server
-            work = socket.recv_pyobj()
-            print("{:<15} receiving: {}".format(
-                str(dt.datetime.now()),
-                work))
-            run_NR_SPSP_CVaR(*work)
-
-        else:
-            # no response from server, reconnected
-            reconnect_count += 1
-            sleep(10)
-            if reconnect_count >= max_reconnect_count:
-                break
-
-            socket.setsockopt(zmq.LINGER, 0)
-            socket.close()
-            poll.unregister(socket)
+def parameter_server(exp_name, regret_type, lease_secs=600., port=25555,
+                     resync=False):
+    """
+    the tasks are leased to the clients, and requeued if the leases expire.
+    The queue is persisted, so a restarted server resumes the leases.
+    The tasks are leased in the longest-expected-first order of the cost
+    model fitted from the finished reports.
 
-            # reconnection
-            socket = context.socket(zmq.REQ)
-            socket.connect(url)
-            poll.register(socket, zmq.POLLIN)
+    resync: bool, synchronizing the catalog with the report directory
+        even if it has been synchronized.
+    """
+    with TaskQueue(task_queue_path(exp_name, regret_type),
+                   lease_secs) as task_queue:
+        params, costs = order_by_cost(
+            checking_existed_spsp_cvar_report(exp_name, regret_type,
+                                              resync))
+        n_new = task_queue.add(params, costs)
+        print("Ready to serving, {} {}, queued n_parameter: {}.".format(
+            exp_name, regret_type, n_new))
+        serve_tasks(task_queue, "tcp://*:{}".format(port))
+        for name, reason in task_queue.failed().items():
+            print("failed: {} {}".format(name, reason))
 
-            # socket.send_string(node_pid)
-            print('{}, reconnect to {}'.format(dt.datetime.now(), url))
 
-    socket.close()
-    context.term()
+def parameter_client(server_ip="140.117.168.49", max_reconnect_count=10,
+                     heartbeat_secs=60., port=25555):
+    run_task_client(run_NR_SPSP_CVaR, server_ip, port, heartbeat_secs,
+                    max_reconnect_count)
 
 
 def get_experts(expert_group_name):
@@ -260,12 +178,13 @@ def get_experts(expert_group_name):
 def run_NR_SPSP_CVaR(exp_name, regret_type,
                      nr_strategy, nr_param, expert_group_name,
                      group_name, n_scenario, scenario_set_idx,
-                     exp_start_date, exp_end_date):
-    market = group_name[:2]
-    if market == "TW":
-        risky_roi_xarr = xr.open_dataarray(pp.TAIEX_2005_MKT_CAP_NC)
-    elif market == "US":
-        risky_roi_xarr = xr.open_dataarray(pp.DJIA_2005_NC)
+                     exp_start_date, exp_end_date, scenario_cache_dir=None):
+    """
+    scenario_cache_dir: str, optional, the scenarios are generated on demand
+        and cached in the directory instead of loading the pre-generated
+        scenario files.
+    """
+    risky_roi_xarr = open_market_panel(group_name[:2])
 
     candidate_symbols = pp.GROUP_SYMBOLS[group_name]
     n_symbol = len(candidate_symbols)
@@ -286,6 +205,13 @@ def run_NR_SPSP_CVaR(exp_name, regret_type,
 
     experts = get_experts(expert_group_name)
 
+    scenario_provider = None
+    if scenario_cache_dir is not None:
+        scenario_provider = HeMMScenarioProvider(
+            group_name,
+            risky_roi_xarr.loc[:, candidate_symbols, 'simple_roi'],
+            n_scenario, scenario_set_idx, cache_dir=scenario_cache_dir)
+
     if regret_type == "external":
         obj = NER_SPSP_CVaR
     elif regret_type == 'internal':
@@ -306,7 +232,8 @@ def run_NR_SPSP_CVaR(exp_name, regret_type,
         end_date=exp_trans_dates[-1],
         n_scenario=n_scenario,
         scenario_set_idx=scenario_set_idx,
-        print_interval=1
+        print_interval=1,
+        scenario_provider=scenario_provider
     )
     instance.run()
 
@@ -314,7 +241,7 @@ def run_NR_SPSP_CVaR(exp_name, regret_type,
 def get_nr_spsp_cvar_report(report_dir=pp.NRSPSPCVaR_DIR):
     import csv
     import pandas as pd
-    import arch.bootstrap.multiple_comparison as arch_comp
+    from portfolio_programming.statistics.spa import batch_spa_pvalues
 
     group_params = {
         'TWG1': 'h140-200-10_a85-95-5',
@@ -393,6 +320,7 @@ def get_nr_spsp_cvar_report(report_dir=pp.NRSPSPCVaR_DIR):
             writer.writeheader()
 
             not_exist_reports = []
+            rows, roi_series = [], []
             for gdx, (s_name, report_file) in enumerate(report_files):
                 try:
                     rp = pd.read_pickle(os.path.join(report_dir, report_file))
@@ -404,17 +332,9 @@ def get_nr_spsp_cvar_report(report_dir=pp.NRSPSPCVaR_DIR):
                 rois = rp['portfolio_xarr'].loc[
                           :, 'main', 'wealth'].to_series().pct_change()
                 rois[0] = 0
-                spa_value = 0
-                for _ in range(3):
-                    spa = arch_comp.SPA(rois.values, np.zeros(rois.size),
-                                        reps=1000)
-                    spa.seed(np.random.randint(0, 2 ** 31 - 1))
-                    spa.compute()
-                    # preserve the worse p_value
-                    if spa.pvalues[1] > spa_value:
-                        spa_value = spa.pvalues[1]
-
-                writer.writerow(
+                roi_series.append(rois.values)
+
+                rows.append(
                     {
                         "simulation_name": rp["simulation_name"],
                         "s_name": s_name,
@@ -435,7 +355,6 @@ def get_nr_spsp_cvar_report(report_dir=pp.NRSPSPCVaR_DIR):
                         "Sharpe": rp['Sharpe'],
                         "Sortino_full": rp['Sortino_full'],
                         "Sortino_partial": rp['Sortino_partial'],
-                        "SPA_c": spa_value
                     }
                 )
                 print(
@@ -444,6 +363,17 @@ def get_nr_spsp_cvar_report(report_dir=pp.NRSPSPCVaR_DIR):
                         rp['cum_roi']
                     )
                 )
+
+            # the SPA tests of the reports of the same length in one pass
+            lengths = np.array([len(v) for v in roi_series])
+            for length in np.unique(lengths):
+                rdx = np.flatnonzero(lengths == length)
+                spa_values = batch_spa_pvalues(
+                    np.array([roi_series[idx] for idx in rdx]),
+                    n_trial=3)[:, 1]
+                for idx, spa_value in zip(rdx, spa_values):
+                    rows[idx]["SPA_c"] = spa_value
+            writer.writerows(rows)
             print(report_dir)
             print(not_exist_reports)
 
@@ -481,6 +411,17 @@ if __name__ == '__main__':
                         help="parameter server mode")
     parser.add_argument("-c", "--client", default=False, action='store_true',
                         help="run NR_SPSP_CVaR client mode")
+    parser.add_argument("--server_ip", type=str, default="140.117.168.49",
+                        help="ip of the parameter server")
+    parser.add_argument("--lease", type=float, default=600.,
+                        help="seconds of a task lease without heartbeat")
+    parser.add_argument("--resync", default=False, action='store_true',
+                        help="synchronizing the catalog with the report "
+                             "directory before querying the unfinished "
+                             "reports.")
+    parser.add_argument("--scenario_cache_dir", type=str,
+                        help="generating scenarios on demand and caching "
+                             "them in the directory.")
 
     args = parser.parse_args()
 
@@ -489,7 +430,8 @@ if __name__ == '__main__':
         sys.exit()
 
     if args.check:
-        res = checking_existed_spsp_cvar_report('dissertation', args.regret)
+        res = checking_existed_spsp_cvar_report('dissertation', args.regret,
+                                                args.resync)
         print(len(res), res)
         sys.exit()
 
@@ -497,13 +439,15 @@ if __name__ == '__main__':
         print("run NR_SPSP_CVaR parameter server mode")
         print("exp_name: {},regret:{}".format(
             args.exp_name,  args.regret))
-        parameter_server(args.exp_name,  args.regret)
+        parameter_server(args.exp_name, args.regret, args.lease,
+                         resync=args.resync)
         sys.exit()
     elif args.client:
         print("run NR_SPSP_CVaR client mode")
-        parameter_client()
+        parameter_client(args.server_ip)
         sys.exit()
     else:
         run_NR_SPSP_CVaR('dissertation', args.regret, args.nr_strategy,
                      args.nr_param, args.expert_group_name, args.group_name,
-                     args.n_scenario, args.sdx, '20050103', '20181228')
+                     args.n_scenario, args.sdx, '20050103', '20181228',
+                     args.scenario_cache_dir)
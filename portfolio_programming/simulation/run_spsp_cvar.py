@@ -17,7 +17,10 @@ import pandas as pd
 import xarray as xr
 
 import portfolio_programming as pp
+from portfolio_programming.simulation.market_panel import open_market_panel
 import portfolio_programming.simulation.spsp_cvar
+from portfolio_programming.simulation.scenario_provider import (
+    HeMMScenarioProvider)
 
 
 def valid_exp_name(exp_name):
@@ -32,12 +35,14 @@ def valid_setting(setting):
 
 def run_SPSP_CVaR(exp_name, setting, group_name, max_portfolio_size,
                   rolling_window_size, n_scenario, alpha,
-                  scenario_set_idx, exp_start_date, exp_end_date):
-    market = group_name[:2]
-    if market == "TW":
-        risky_roi_xarr = xr.open_dataarray(pp.TAIEX_2005_MKT_CAP_NC)
-    elif market == "US":
-        risky_roi_xarr = xr.open_dataarray(pp.DJIA_2005_NC)
+                  scenario_set_idx, exp_start_date, exp_end_date,
+                  scenario_cache_dir=None):
+    """
+    scenario_cache_dir: str, optional, the scenarios are generated on demand
+        and cached in the directory instead of loading the pre-generated
+        scenario file.
+    """
+    risky_roi_xarr = open_market_panel(group_name[:2])
 
     symbols = pp.GROUP_SYMBOLS[group_name]
     if setting in ('compact',):
@@ -57,6 +62,14 @@ def run_SPSP_CVaR(exp_name, setting, group_name, max_portfolio_size,
                                        dims=('symbol',),
                                        coords=(candidate_symbols,))
     initial_risk_free_wealth = 1e6
+
+    scenario_provider = None
+    if scenario_cache_dir is not None:
+        scenario_provider = HeMMScenarioProvider(
+            group_name,
+            risky_roi_xarr.loc[:, candidate_symbols, 'simple_roi'],
+            n_scenario, scenario_set_idx, cache_dir=scenario_cache_dir)
+
     print(exp_name, setting, exp_start_date, exp_end_date,
           max_portfolio_size, rolling_window_size, n_scenario, alpha)
     instance = portfolio_programming.simulation.spsp_cvar.SPSP_CVaR(
@@ -74,7 +87,8 @@ def run_SPSP_CVaR(exp_name, setting, group_name, max_portfolio_size,
         alpha=alpha,
         n_scenario=n_scenario,
         scenario_set_idx=scenario_set_idx,
-        print_interval=10
+        print_interval=10,
+        scenario_provider=scenario_provider
     )
     instance.run()
 
@@ -575,125 +589,90 @@ def plot_yearly_2d_contour_by_alpha(setting, z_dim="cum_roi"):
     plt.show()
 
 
-def get_spsp_cvar_report(report_dir=pp.DATA_DIR):
-    import csv
-
-    REPORT_FORMAT = "report_SPSP_CVaR_{setting}_{group_name}_Mc{n_symbol}_M{max_portfolio_size}_h{rolling_window_size}_s{n_scenario}_a{alpha}_sdx{sdx}_{exp_start_date}_{exp_end_date}.pkl"
-
+def get_spsp_cvar_report(db_path=None):
+    """
+    the statistics of the compact SPSP_CVaR runs of the dissertation, which
+    are queried from the report index.
 
-    max_portfolio_sizes = [5, ]
-    group_symbols = pp.GROUP_SYMBOLS
-    window_sizes = range(50, 240 + 10, 10)
-    n_scenarios = [1000, ]
-    alphas = ["{:.2f}".format(v / 100.) for v in range(50, 100, 5)]
-    years = [(dt.date(2005, 1, 3), dt.date(2018, 12, 28))]
-    set_indices = [1, 2, 3]
-    report_files = [
-        REPORT_FORMAT.format(
-            setting="compact",
-            group_name=group_name,
-            n_symbol=len(symbols),
-            max_portfolio_size=m,
-            rolling_window_size=h,
-            n_scenario=s,
-            alpha=a,
-            sdx=sdx,
-            exp_start_date=s_date.strftime("%Y%m%d"),
-            exp_end_date=e_date.strftime("%Y%m%d")
-        )
-        for group_name, symbols in group_symbols.items()
-        for m in max_portfolio_sizes
-        for h in window_sizes
-        for s in n_scenarios
-        for a in alphas
-        for sdx in set_indices
-        for s_date, e_date in years
+    db_path: str, optional, path of the report index
+    """
+    from portfolio_programming.simulation.report_index import ReportIndex
+
+    with ReportIndex(db_path) as report_index:
+        df = report_index.query(
+            kind="SPSP_CVaR",
+            filters={"setting": "compact",
+                     "max_portfolio_size": 5,
+                     "n_scenario": 1000,
+                     "alpha": ("in", [v / 100. for v in range(50, 100, 5)]),
+                     "rolling_window_size": ("in", range(50, 240 + 10, 10)),
+                     "exp_start_date": "20050103",
+                     "exp_end_date": "20181228"})
+    if df.empty:
+        raise ValueError("no SPSP_CVaR run in the report index.")
+
+    df = df.rename(columns={
+        "name": "simulation_name",
+        "scenario_set_idx": "sdx",
+        "exp_start_date": "start_date",
+        "exp_end_date": "end_date",
+        "n_exp_period": "n_data",
+        "daily_mean_roi": "roi_mu",
+        "daily_std_roi": "std",
+        "daily_skew_roi": "skew",
+        "daily_ex-kurt_roi": "ex_kurt",
+    })
+    for col in ("start_date", "end_date"):
+        df[col] = pd.to_datetime(df[col], format="%Y%m%d").dt.strftime(
+            "%Y-%m-%d")
+    fields = [
+        "simulation_name", "group_name", 'rolling_window_size',
+        'n_scenario', 'alpha', 'sdx', "start_date", "end_date", "n_data",
+        "cum_roi", "annual_roi", "roi_mu", "std", "skew", "ex_kurt",
+        "Sharpe", "Sortino_full", "Sortino_partial",
     ]
-
-    group_names = pp.GROUP_SYMBOLS.keys()
     stat_file = os.path.join(pp.TMP_DIR, "spsp_cvar_stat.csv")
-    with open(stat_file, "w", newline='') as csv_file:
-        fields = [
-            "simulation_name",
-            "group_name",
-            'rolling_window_size',
-            'n_scenario',
-            'alpha',
-            'sdx',
-            "start_date",
-            "end_date",
-            "n_data",
-            "cum_roi",
-            "annual_roi",
-            "roi_mu",
-            "std",
-            "skew",
-            "ex_kurt",
-            "Sharpe",
-            "Sortino_full",
-            "Sortino_partial",
-        ]
-
-        writer = csv.DictWriter(csv_file, fieldnames=fields)
-        writer.writeheader()
-
-        for gdx, report_file in enumerate(report_files):
-            rp = pd.read_pickle(os.path.join(pp.REPORT_DIR, report_file))
-            params = rp["simulation_name"].split('_')
-            writer.writerow(
-                {
-                    "simulation_name": rp["simulation_name"],
-                    "group_name": rp['group_name'],
-                    'rolling_window_size': rp['rolling_window_size'],
-                    'n_scenario': params[7][1:],
-                    'alpha': params[8][1:],
-                    'sdx': params[9][-1],
-                    "start_date": rp['exp_start_date'].strftime("%Y-%m-%d"),
-                    "end_date": rp['exp_end_date'].strftime("%Y-%m-%d"),
-                    "n_data": rp['n_exp_period'],
-                    "cum_roi": rp['cum_roi'],
-                    #"annual_roi": rp['annual_roi'],
-                    "roi_mu": rp['daily_mean_roi'],
-                    "std": rp['daily_std_roi'],
-                    "skew": rp['daily_skew_roi'],
-                    "ex_kurt": rp['daily_ex-kurt_roi'],
-                    "Sharpe": rp['Sharpe'],
-                    "Sortino_full": rp['Sortino_full'],
-                    "Sortino_partial": rp['Sortino_partial']
-                }
-            )
-            print(
-                "[{}/{}] {}, cum_roi:{:.2%}".format(
-                    gdx + 1, len(report_files), rp["simulation_name"],
-                    rp['cum_roi']
-                )
-            )
+    df.reindex(columns=fields).sort_values(
+        by=["group_name", "rolling_window_size", "alpha", "sdx"]).to_csv(
+        stat_file, index=False)
+    print("{} runs, {}".format(len(df), stat_file))
 
 
-def get_spsp_best_results(n_param = 3):
-    xarr = xr.open_dataarray(os.path.join(pp.DATA_DIR,
-        'report_SPSP_CVaR_whole_dissertation_compact_20050103_20181228.nc'))
-    # (interval: 1, group_name: 12, scenario_set_idx: 3,
-    # max_portfolio_size: 1, rolling_window_size: 20, alpha: 10, attribute: 14)
-    print(xarr)
+def get_spsp_best_results(n_param=3, db_path=None):
+    """
+    the best n_param (rolling_window_size, alpha) of each group by the
+    cum_roi, which are queried from the report index.
+
+    db_path: str, optional, path of the report index
+    """
+    from portfolio_programming.simulation.report_index import ReportIndex
+
     attrs = ['cum_roi','annual_roi', 'daily_mean_roi', 'daily_std_roi',
              'daily_skew_roi', 'daily_ex-kurt_roi', 'Sharpe',
              'Sortino_full', 'SPA_c']
-
-    csv_file = os.path.join(pp.TMP_DIR, 'spsp_best_{}.csv'.format(n_param))
     groups = ["{}G{}".format(mkt, idx) for idx in range(1, 7)
               for mkt in ['TW', 'US']]
-    results = []
-    for group in groups:
-        pnl = xarr.loc[:, group, 1, 5, :, :, attrs].squeeze().to_pandas()
-        df = pnl.swapaxes('items', 'minor_axis').to_frame()
-        results.append(group)
-        results.append(df.sort_values(by=['cum_roi',],
-                       ascending=False)[:n_param].to_csv())
-
-    with open(csv_file, 'w') as fout:
-            fout.writelines(results)
 
+    with ReportIndex(db_path) as report_index:
+        df = report_index.query(
+            kind="SPSP_CVaR",
+            filters={"setting": "compact",
+                     "group_name": ("in", groups),
+                     "scenario_set_idx": 1,
+                     "max_portfolio_size": 5,
+                     "exp_start_date": "20050103",
+                     "exp_end_date": "20181228"},
+            order_by="cum_roi", group_by="group_name", limit=n_param)
+    if df.empty:
+        raise ValueError("no SPSP_CVaR run in the report index.")
+
+    df = df.rename(columns={"group_name": "group"})
+    df['group'] = pd.Categorical(df['group'], categories=groups,
+                                 ordered=True)
+    csv_file = os.path.join(pp.TMP_DIR, 'spsp_best_{}.csv'.format(n_param))
+    df.sort_values(by=['group', 'cum_roi'], ascending=[True, False]).reindex(
+        columns=['group', 'rolling_window_size', 'alpha'] + attrs).to_csv(
+        csv_file, index=False)
 
 
 if __name__ == '__main__':
@@ -768,6 +747,9 @@ if __name__ == '__main__':
                         help="SPSP_cVaR experiment plot")
 
     parser.add_argument("--best", default=False, action='store_true')
+    parser.add_argument("--scenario_cache_dir", type=str,
+                        help="generating scenarios on demand and caching "
+                             "them in the directory.")
     args = parser.parse_args()
 
     print("run_SPSP_CVaR in single mode")
@@ -803,6 +785,7 @@ if __name__ == '__main__':
             float(args.alpha),
             args.sdx,
             '20050103', '20181228',
+            args.scenario_cache_dir,
             )
     else:
         years = {
@@ -831,5 +814,6 @@ if __name__ == '__main__':
             float(args.alpha),
             args.sdx,
             years[args.year][0],
-            years[args.year][1]
+            years[args.year][1],
+            args.scenario_cache_dir,
         )
@@ -14,6 +14,7 @@ import pandas as pd
 import xarray as xr
 
 import portfolio_programming as pp
+from portfolio_programming.simulation.market_panel import open_market_panel
 from portfolio_programming.simulation.wp_bah import BAHPortfolio
 
 
@@ -24,11 +25,7 @@ def run_bah(exp_name, group_name, exp_start_date, exp_end_date):
     symbols = group_symbols[group_name]
     n_symbol = len(symbols)
 
-    market = group_name[:2]
-    if market == "TW":
-        roi_xarr = xr.open_dataarray(pp.TAIEX_2005_MKT_CAP_NC)
-    elif market == "US":
-        roi_xarr = xr.open_dataarray(pp.DJIA_2005_NC)
+    roi_xarr = open_market_panel(group_name[:2])
 
     rois = roi_xarr.loc[exp_start_date:exp_end_date, symbols, 'simple_roi']
 
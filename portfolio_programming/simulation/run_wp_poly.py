@@ -11,6 +11,7 @@ import numpy as np
 import xarray as xr
 
 import portfolio_programming as pp
+from portfolio_programming.simulation.market_panel import open_market_panel
 from portfolio_programming.simulation.wp_poly import (PolynomialPortfolio,
                                                       NIRPolynomialPortfolio)
 
@@ -43,11 +44,7 @@ def run_poly(poly_power, exp_type, group_name, exp_start_date, exp_end_date):
     symbols = group_symbols[group_name]
     n_symbol = len(symbols)
 
-    market = group_name[:2]
-    if market == "TW":
-        roi_xarr = xr.open_dataarray(pp.TAIEX_2005_MKT_CAP_NC)
-    elif market == "US":
-        roi_xarr = xr.open_dataarray(pp.DJIA_2005_NC)
+    roi_xarr = open_market_panel(group_name[:2])
 
     rois = roi_xarr.loc[exp_start_date:exp_end_date, symbols, 'simple_roi']
 
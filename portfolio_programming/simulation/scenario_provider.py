@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+scenario providers of the stage-wise portfolio stochastic programming models.
+
+The pre-generated scenario files are loaded by SPSPBase, while the HeMM
+provider generates the scenarios of a date only when the simulation asks for
+them. The random stream of each date is seeded by (scenario_set_idx, date),
+the same as hemm_generating_scenarios_xarr, so the scenarios do not depend on
+the order of the requests, and a bounded LRU cache keeps the recently used
+dates in memory and optionally on disk. The disk cache may be shared by
+concurrent simulations, so its files are written atomically, and an
+unreadable file is a cache miss. The moments of each date are
+estimated from its own window instead of the rolling estimator, so the
+scenarios follow the same distribution as those of the pre-generated file,
+but they are not bitwise identical.
+"""
+
+import collections
+import logging
+import os
+from time import time
+
+import numpy as np
+import xarray as xr
+
+from portfolio_programming.simulation.catalog import atomic_write_path
+from portfolio_programming.simulation.hemm_gen_scenarios import (
+    hemm_generating_scenarios_of_dates)
+
+
+class ScenarioCache(object):
+    """
+    least recently used cache of the scenarios, the evicted items of the
+    memory cache are kept in the disk cache if cache_dir is given.
+    """
+
+    def __init__(self, max_size=256, cache_dir=None, max_disk_size=None):
+        """
+        Parameters:
+        -------------
+        max_size: positive integer, max number of items in memory
+        cache_dir: str, optional, directory of the disk cache
+        max_disk_size: positive integer, optional, max number of items on
+            disk, default is unbounded.
+        """
+        if max_size <= 0:
+            raise ValueError("max_size {} should be positive.".format(
+                max_size))
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.max_disk_size = max_disk_size
+        self.memory = collections.OrderedDict()
+        self.n_hit = 0
+        self.n_miss = 0
+
+        # the disk items ordered by the last access time
+        self.disk = collections.OrderedDict()
+        if cache_dir is not None:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            files = [f for f in os.listdir(cache_dir) if f.endswith(".npy")]
+            files.sort(key=lambda f: os.path.getmtime(
+                os.path.join(cache_dir, f)))
+            for file_name in files:
+                self.disk[file_name[:-4]] = True
+
+    def __len__(self):
+        return len(self.memory)
+
+    def __contains__(self, key):
+        return key in self.memory or key in self.disk
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, "{}.npy".format(key))
+
+    def get(self, key):
+        """
+        Parameters:
+        -------------
+        key: str
+
+        Returns:
+        -------------
+        numpy.array or None if the key is not cached.
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.n_hit += 1
+            return self.memory[key]
+
+        if key in self.disk:
+            path = self._disk_path(key)
+            try:
+                value = np.load(path)
+                # update the access time
+                os.utime(path, None)
+            except (OSError, ValueError, EOFError) as e:
+                # removed by other process, or not a complete file
+                logging.warning("scenario cache {} unreadable: {}".format(
+                    key, e))
+                del self.disk[key]
+            else:
+                self.disk.move_to_end(key)
+                self.n_hit += 1
+                self._put_memory(key, value)
+                return value
+
+        self.n_miss += 1
+        return None
+
+    def put(self, key, value):
+        """
+        Parameters:
+        -------------
+        key: str
+        value: numpy.array
+        """
+        self._put_memory(key, value)
+        if self.cache_dir is not None and key not in self.disk:
+            # the complete file is renamed, the readers never see a part
+            path = self._disk_path(key)
+            tmp_path = atomic_write_path(path)
+            with open(tmp_path, 'wb') as fout:
+                np.save(fout, value)
+            os.replace(tmp_path, path)
+            self.disk[key] = True
+            if self.max_disk_size is not None:
+                while len(self.disk) > self.max_disk_size:
+                    old_key, _ = self.disk.popitem(last=False)
+                    try:
+                        os.remove(self._disk_path(old_key))
+                    except FileNotFoundError:
+                        # removed by other process
+                        pass
+
+    def _put_memory(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+
+class ScenarioProvider(object):
+    """
+    interface of the scenarios of the SPSP models
+    """
+
+    def get_scenarios(self, rolling_window_size, trans_date):
+        """
+        Parameters:
+        -------------
+        rolling_window_size: positive integer
+        trans_date: datetime.date
+
+        Returns:
+        -------------
+        xarray.DataArray, dims: (symbol, scenario),
+            shape: (n_symbol, n_scenario)
+        """
+        raise NotImplementedError('get_scenarios() does not be implemented.')
+
+
+class HeMMScenarioProvider(ScenarioProvider):
+    """
+    generating the scenarios of a date by heuristic moment matching when it
+    is requested.
+    """
+
+    def __init__(self, group_name, risk_rois, n_scenario, scenario_set_idx,
+                 cache_size=256, cache_dir=None, max_disk_size=None,
+                 retry_cnt=5):
+        """
+        Parameters:
+        -------------
+        group_name: str
+        risk_rois: xarray.DataArray, dims: (trans_date, symbol),
+            the rois of the candidate symbols, which must contain the
+            rolling windows before the first requested date.
+        n_scenario: positive integer
+        scenario_set_idx: positive integer
+        cache_size: positive integer, max number of dates in memory
+        cache_dir: str, optional, directory of the disk cache
+        max_disk_size: positive integer, optional, max number of dates on
+            disk
+        retry_cnt: positive integer, maximum retry of scenarios
+        """
+        self.group_name = group_name
+        self.risk_rois = risk_rois
+        self.trans_dates = risk_rois.get_index('trans_date')
+        self.symbols = list(risk_rois.get_index('symbol'))
+        self.n_scenario = n_scenario
+        self.scenario_set_idx = scenario_set_idx
+        self.retry_cnt = retry_cnt
+        self.cache = ScenarioCache(cache_size, cache_dir, max_disk_size)
+
+    def cache_key(self, rolling_window_size, trans_date):
+        return "{}_Mc{}_h{}_s{}_sdx{}_{}".format(
+            self.group_name, len(self.symbols), rolling_window_size,
+            self.n_scenario, self.scenario_set_idx,
+            trans_date.strftime("%Y%m%d"))
+
+    def get_scenarios(self, rolling_window_size, trans_date):
+        key = self.cache_key(rolling_window_size, trans_date)
+        scenarios = self.cache.get(key)
+        if scenarios is None:
+            t0 = time()
+            tdx = self.trans_dates.get_loc(trans_date)
+            if tdx < rolling_window_size - 1:
+                raise ValueError("{} has only {} historical periods, "
+                                 "less than the rolling window size "
+                                 "{}.".format(trans_date, tdx + 1,
+                                              rolling_window_size))
+            roi_data = self.risk_rois[
+                       tdx - rolling_window_size + 1: tdx + 1].values
+            scenarios = hemm_generating_scenarios_of_dates(
+                roi_data, self.trans_dates[tdx:tdx + 1], self.symbols,
+                rolling_window_size, self.n_scenario, self.scenario_set_idx,
+                key, self.retry_cnt)[0]
+            self.cache.put(key, scenarios)
+            logging.debug("generating scenarios {}, {:.4f} secs".format(
+                key, time() - t0))
+
+        return xr.DataArray(
+            scenarios,
+            dims=('symbol', 'scenario'),
+            coords=(self.symbols, np.arange(self.n_scenario)),
+        )
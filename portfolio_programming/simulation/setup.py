@@ -52,6 +52,11 @@ extensions = [
         ["wp_eg.pyx", ],
         include_dirs=[np.get_include()],
     ),
+    Extension(
+        "wp_ons",
+        ["wp_ons.pyx", ],
+        include_dirs=[np.get_include()],
+    ),
     # Extension(
     #     "wp_poly",
     #     ["wp_poly.pyx", ],
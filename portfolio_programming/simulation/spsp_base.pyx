@@ -131,7 +131,8 @@ class SPSPBase(ValidMixin):
                  int n_scenario=200,
                  int scenario_set_idx=1,
                  int print_interval=10,
-                 str report_dir=pp.WEIGHT_PORTFOLIO_REPORT_DIR):
+                 str report_dir=pp.WEIGHT_PORTFOLIO_REPORT_DIR,
+                 scenario_provider=None):
         """
         stage-wise portfolio stochastic programming basic model
 
@@ -192,6 +193,10 @@ class SPSPBase(ValidMixin):
 
         print_interval : positive integer
 
+        scenario_provider : ScenarioProvider, optional
+            The provider of the scenarios of each trans_date. If it is None,
+            the scenarios are loaded from the pre-generated file.
+
         Data
         --------------
         decision xarray.DataArray, shape: (n_exp_period, n_stock+1, 5)
@@ -292,9 +297,11 @@ class SPSPBase(ValidMixin):
 
         # load scenario panel, shape:(n_exp_period, n_stock, n_scenario)
         self.scenario_set_idx = scenario_set_idx
-        self.scenario_xarr = self.load_generated_scenario()
-        print("scenario shape:", self.scenario_xarr.shape)
-        print(self.scenario_xarr)
+        self.scenario_provider = scenario_provider
+        if scenario_provider is None:
+            self.scenario_xarr = self.load_generated_scenario()
+            print("scenario shape:", self.scenario_xarr.shape)
+            print(self.scenario_xarr)
 
         # results data
         # decision xarray, shape: (n_exp_period, n_symbol+1, 4)
@@ -317,7 +324,8 @@ class SPSPBase(ValidMixin):
 
     def load_generated_scenario(self):
         """
-        load generated scenario xarray
+        load generated scenario xarray, the data are lazily loaded, and
+        only the chunks of the indexed dates are decompressed.
 
         Returns
         ---------------
@@ -365,8 +373,12 @@ class SPSPBase(ValidMixin):
         ----------------------------
         xarray.DataArray, shape: (n_stock, n_scenario)
         """
+        if self.scenario_provider is not None:
+            return self.scenario_provider.get_scenarios(
+                self.rolling_window_size, kwargs['trans_date'])
+        # the scenarios may be stored in single precision
         xarr = self.scenario_xarr.loc[kwargs['trans_date']]
-        return xarr
+        return xarr.astype(np.float64)
 
     def get_estimated_risk_free_roi(self, *arg, **kwargs):
         """
@@ -25,6 +25,11 @@ import portfolio_programming as pp
 from portfolio_programming.statistics.risk_adjusted import (
     Sharpe, Sortino_full, Sortino_partial)
 
+from portfolio_programming.simulation.catalog import (
+    Catalog, REPORT, atomic_write_path)
+from portfolio_programming.simulation.report_index import (
+    ReportIndex, report_kind, report_index_metrics, spsp_cvar_parameters,
+    nr_spsp_cvar_parameters)
 from portfolio_programming.simulation.spsp_base import (ValidMixin, SPSPBase)
 from portfolio_programming.simulation.wp_base import (NIRUtility, )
 
@@ -334,7 +339,8 @@ class SPSP_CVaR(SPSPBase):
                  double alpha=0.05,
                  int scenario_set_idx=1,
                  int print_interval=10,
-                 str report_dir=pp.WEIGHT_PORTFOLIO_REPORT_DIR):
+                 str report_dir=pp.WEIGHT_PORTFOLIO_REPORT_DIR,
+                 scenario_provider=None):
         """
         stage-wise portfolio stochastic programming  model
 
@@ -398,6 +404,9 @@ class SPSP_CVaR(SPSPBase):
 
         print_interval : positive integer
 
+        scenario_provider : ScenarioProvider, optional
+            The provider of the scenarios of each trans_date. If it is None,
+            the scenarios are loaded from the pre-generated file.
 
         Data
         --------------
@@ -422,7 +431,8 @@ class SPSP_CVaR(SPSPBase):
             n_scenario,
             scenario_set_idx,
             print_interval,
-            report_dir
+            report_dir,
+            scenario_provider
         )
 
         # verify alpha
@@ -636,8 +646,24 @@ class SPSP_CVaR(SPSPBase):
             "report_{}.pkl".format(self.get_simulation_name())
         )
 
-        with open(report_path, 'wb') as fout:
+        # the finished report is renamed and registered in the catalog
+        tmp_path = atomic_write_path(report_path)
+        with open(tmp_path, 'wb') as fout:
             pickle.dump(reports, fout, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, report_path)
+        with Catalog() as catalog:
+            catalog.register(REPORT, report_path, {
+                "simulation_name": simulation_name,
+                "simulation_time": reports['simulation_time']})
+        with ReportIndex() as report_index:
+            report_index.add(simulation_name, "SPSP_CVaR",
+                             spsp_cvar_parameters(
+                                 self.setting, self.group_name,
+                                 self.n_symbol, self.max_portfolio_size,
+                                 self.rolling_window_size, self.n_scenario,
+                                 self.alpha, self.scenario_set_idx,
+                                 self.exp_start_date, self.exp_end_date),
+                             report_index_metrics(reports), self.report_dir)
 
         print("{}-{} {} OK, {:.4f} secs".format(
             platform.node(),
@@ -669,6 +695,7 @@ class NER_SPSP_CVaR(ValidMixin):
                  int scenario_set_idx=1,
                  int print_interval=2,
                  report_dir=pp.NRSPSPCVaR_DIR,
+                 scenario_provider=None,
                  ):
         """
         no external regret stage-wise portfolio stochastic programming model
@@ -737,6 +764,11 @@ class NER_SPSP_CVaR(ValidMixin):
         is_parallel: bool
             Does parallel solve the experts
 
+        scenario_provider : ScenarioProvider, optional
+            The provider of the scenarios of each trans_date and rolling
+            window size. If it is None, the scenarios of all experts are
+            loaded from the pre-generated files.
+
         Data
         --------------
         decision xarray.DataArray, shape: (n_exp_period, n_stock+1, 5)
@@ -830,26 +862,29 @@ class NER_SPSP_CVaR(ValidMixin):
 
         # load scenario panel, shape:(n_exp_period, n_stock, n_scenario)
         self.scenario_set_idx = scenario_set_idx
-        distinct_rolling_window_sizes = set(h for h, _ in experts)
-        self.scenario_xarr = xr.DataArray(
-            np.zeros((len(distinct_rolling_window_sizes),
-                      self.n_exp_period,
-                      self.n_symbol,
-                      self.n_scenario)),
-            dims=('rolling_window_size', 'trans_date', 'symbol', 'scenario'),
-            coords=(list(distinct_rolling_window_sizes),
-                    self.exp_trans_dates,
-                    candidate_symbols,
-                    np.arange(n_scenario)
-                    )
-        )
+        self.scenario_provider = scenario_provider
+        if scenario_provider is None:
+            distinct_rolling_window_sizes = set(h for h, _ in experts)
+            self.scenario_xarr = xr.DataArray(
+                np.zeros((len(distinct_rolling_window_sizes),
+                          self.n_exp_period,
+                          self.n_symbol,
+                          self.n_scenario)),
+                dims=('rolling_window_size', 'trans_date', 'symbol',
+                      'scenario'),
+                coords=(list(distinct_rolling_window_sizes),
+                        self.exp_trans_dates,
+                        candidate_symbols,
+                        np.arange(n_scenario)
+                        )
+            )
 
-        t0 = time()
-        for h in distinct_rolling_window_sizes:
-            self.scenario_xarr.loc[h] = self.load_generated_scenario(h)
-        print("group:{}, expert:{} scenario shape:{}, {:.3f} secs".format(
-            group_name, expert_group_name,
-            self.scenario_xarr.shape, time() - t0))
+            t0 = time()
+            for h in distinct_rolling_window_sizes:
+                self.scenario_xarr.loc[h] = self.load_generated_scenario(h)
+            print("group:{}, expert:{} scenario shape:{}, {:.3f} secs".format(
+                group_name, expert_group_name,
+                self.scenario_xarr.shape, time() - t0))
 
         # results data
         # decision xarray, shape: (n_exp_period, n_expert+1, n_symbol+1, 4)
@@ -1012,7 +1047,8 @@ class NER_SPSP_CVaR(ValidMixin):
 
     def load_generated_scenario(self, rolling_window_size):
         """
-        load generated scenario xarray
+        load generated scenario xarray, the data are lazily loaded, and
+        only the chunks of the experiment dates are decompressed.
 
         Returns
         ---------------
@@ -1056,6 +1092,9 @@ class NER_SPSP_CVaR(ValidMixin):
         scenarios on the trans_date
         xarray.DataArray, shape: (n_symbol, n_scenario)
         """
+        if self.scenario_provider is not None:
+            return self.scenario_provider.get_scenarios(
+                kwargs['rolling_window_size'], kwargs['trans_date'])
         xarr = self.scenario_xarr.loc[kwargs['rolling_window_size'],
                                       kwargs['trans_date']]
         return xarr
@@ -1403,8 +1442,23 @@ class NER_SPSP_CVaR(ValidMixin):
         report_path = os.path.join(
             self.report_dir, "report_{}.pkl".format(simulation_name))
 
-        with open(report_path, 'wb') as fout:
+        # the finished report is renamed and registered in the catalog
+        tmp_path = atomic_write_path(report_path)
+        with open(tmp_path, 'wb') as fout:
             pickle.dump(reports, fout, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, report_path)
+        with Catalog() as catalog:
+            catalog.register(REPORT, report_path, {
+                "simulation_name": simulation_name,
+                "simulation_time": reports['simulation_time']})
+        with ReportIndex() as report_index:
+            report_index.add(simulation_name, report_kind(simulation_name),
+                             nr_spsp_cvar_parameters(
+                                 self.nr_strategy, self.nr_strategy_param,
+                                 self.group_name, self.expert_group_name,
+                                 self.n_scenario, self.scenario_set_idx,
+                                 self.exp_start_date, self.exp_end_date),
+                             report_index_metrics(reports), self.report_dir)
 
         print("{}-{} {} OK, {:.4f} secs".format(
             platform.node(),
@@ -1436,6 +1490,7 @@ class NIR_SPSP_CVaR(NER_SPSP_CVaR, NIRUtility):
                  int scenario_set_idx=1,
                  int print_interval=1,
                  report_dir=pp.NRSPSPCVaR_DIR,
+                 scenario_provider=None,
                  ):
         """
         no internal regret stage-wise portfolio stochastic programming model
@@ -1458,7 +1513,8 @@ class NIR_SPSP_CVaR(NER_SPSP_CVaR, NIRUtility):
             n_scenario,
             scenario_set_idx,
             print_interval,
-            report_dir
+            report_dir,
+            scenario_provider
         )
         # fictitious experts,
         self.virtual_expert_names = [
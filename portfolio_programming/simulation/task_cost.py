@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+cost model of the simulation tasks, which is fitted from the recorded
+simulation_time of the finished reports.
+
+The features are parsed from the report names, so the model is shared by
+the SPSP_CVaR, NR_SPSP_CVaR, and NIR_SPSP_CVaR reports. The log of the
+simulation time is regressed on the logs of the numeric features, with one
+intercept of each kind (e.g. the compact and the general settings).
+The dispatchers send the tasks in the longest-expected-first order, so the
+long tasks do not dominate the tail of a sweep.
+"""
+
+import datetime as dt
+import logging
+import os
+import re
+
+import numpy as np
+
+from portfolio_programming.simulation.catalog import (Catalog, REPORT)
+
+# numeric features in the report names
+COST_FEATURES = ("n_day", "n_symbol", "rolling_window_size", "n_scenario")
+
+# the prior costs without any record, relative to a compact SPSP_CVaR
+PRIOR_KIND_COSTS = {
+    "SPSP_CVaR_compact": 1.,
+    "SPSP_CVaR_general": 10.,
+    "NR_SPSP_CVaR": 5.,
+    "NIR_SPSP_CVaR": 5.,
+}
+
+_KIND_PATTERN = re.compile(
+    r"^(?:report_)?(SPSP_CVaR_[a-z0-9]+|NR_SPSP_CVaR|NIR_SPSP_CVaR)_")
+_FEATURE_PATTERNS = {
+    "n_symbol": re.compile(r"_Mc(\d+)_"),
+    "rolling_window_size": re.compile(r"_h(\d+)_"),
+    "n_scenario": re.compile(r"_s(\d+)_"),
+}
+_DATE_PATTERN = re.compile(r"_(\d{8})_(\d{8})(?:\.pkl)?$")
+
+
+def report_name_features(name):
+    """
+    Parameters:
+    -------------
+    name: str, report file name or simulation name
+
+    Returns:
+    -------------
+    (kind, features), features is a dict of COST_FEATURES, a missing
+    feature is 1. (None, None) if the name is not a known report.
+    """
+    kind = _KIND_PATTERN.match(name)
+    dates = _DATE_PATTERN.search(name)
+    if kind is None or dates is None:
+        return None, None
+    start, end = [dt.datetime.strptime(v, "%Y%m%d") for v in dates.groups()]
+    features = {"n_day": max((end - start).days, 1)}
+    for key, pattern in _FEATURE_PATTERNS.items():
+        value = pattern.search(name)
+        features[key] = int(value.group(1)) if value else 1
+    return kind.group(1), features
+
+
+class TaskCostModel(object):
+    """
+    log-linear model of the simulation time
+    """
+
+    def __init__(self, ridge=1e-3):
+        """
+        Parameters:
+        -------------
+        ridge: float, the ridge penalty of the slopes, which keeps the
+            slopes of the constant features zero.
+        """
+        self.ridge = ridge
+        self.kinds = []
+        self.coefs = None
+        self.n_record = 0
+
+    def _design(self, kinds, features):
+        n_kind = len(self.kinds)
+        X = np.zeros((len(kinds), n_kind + len(COST_FEATURES)))
+        for idx, (kind, feature) in enumerate(zip(kinds, features)):
+            if kind in self.kinds:
+                X[idx, self.kinds.index(kind)] = 1.
+            else:
+                # the unseen kind uses the mean of the intercepts
+                X[idx, :n_kind] = 1. / n_kind
+            X[idx, n_kind:] = np.log([feature[key] for key in COST_FEATURES])
+        return X
+
+    def fit(self, costs):
+        """
+        Parameters:
+        -------------
+        costs: dict, key: report name, value: simulation time in seconds
+
+        Returns:
+        -------------
+        self
+        """
+        kinds, features, secs = [], [], []
+        for name, sec in costs.items():
+            kind, feature = report_name_features(name)
+            if kind is None or not sec or sec <= 0:
+                continue
+            kinds.append(kind)
+            features.append(feature)
+            secs.append(sec)
+
+        self.n_record = len(secs)
+        if not self.n_record:
+            self.kinds, self.coefs = [], None
+            return self
+
+        self.kinds = sorted(set(kinds))
+        X = self._design(kinds, features)
+        y = np.log(secs)
+        n_kind = len(self.kinds)
+        penalty = np.zeros(X.shape[1])
+        penalty[n_kind:] = self.ridge * len(y)
+        self.coefs = np.linalg.solve(X.T @ X + np.diag(penalty), X.T @ y)
+        return self
+
+    def predict(self, names):
+        """
+        Parameters:
+        -------------
+        names: iterable of report names
+
+        Returns:
+        -------------
+        dict, key: report name, value: expected seconds, the prior cost
+        (in relative units) is used if the model is not fitted.
+        """
+        names = list(names)
+        parsed = [report_name_features(name) for name in names]
+        known = [idx for idx, (kind, _) in enumerate(parsed)
+                 if kind is not None]
+        costs = {name: 0. for name in names}
+        if not known:
+            return costs
+
+        kinds = [parsed[idx][0] for idx in known]
+        features = [parsed[idx][1] for idx in known]
+        if self.coefs is None:
+            values = [PRIOR_KIND_COSTS.get(kind, 1.) *
+                      np.prod([feature[key] for key in COST_FEATURES])
+                      for kind, feature in zip(kinds, features)]
+        else:
+            values = np.exp(self._design(kinds, features) @ self.coefs)
+        for idx, value in zip(known, values):
+            costs[names[idx]] = float(value)
+        return costs
+
+
+def recorded_costs(catalog=None, scan_dirs=None):
+    """
+    the recorded simulation times of the finished reports.
+
+    Parameters:
+    -------------
+    catalog: Catalog, optional, default is the catalog of pp.CATALOG_DB
+    scan_dirs: list of str, optional, the reports in the directories without
+        recorded time are loaded once, and their times are saved in the
+        catalog.
+
+    Returns:
+    -------------
+    dict, key: report name, value: simulation time in seconds
+    """
+    if catalog is None:
+        with Catalog() as default_catalog:
+            return recorded_costs(default_catalog, scan_dirs)
+
+    costs = {}
+    records = catalog.parameters(REPORT)
+    for name, params in records.items():
+        if isinstance(params, dict) and params.get("simulation_time"):
+            costs[name] = params["simulation_time"]
+
+    import pandas as pd
+    for scan_dir in (scan_dirs or []):
+        if not os.path.isdir(scan_dir):
+            continue
+        for name in os.listdir(scan_dir):
+            if (not name.endswith(".pkl") or name in costs or
+                    report_name_features(name)[0] is None):
+                continue
+            try:
+                report = pd.read_pickle(os.path.join(scan_dir, name))
+                sec = float(report['simulation_time'])
+            except Exception as e:
+                logging.warning("no simulation_time of {}: {}".format(
+                    name, e))
+                continue
+            costs[name] = sec
+            if name in records:
+                params = records[name]
+                if not isinstance(params, dict):
+                    params = {"simulation_name": params}
+                params["simulation_time"] = sec
+                catalog.set_parameters(REPORT, name, params)
+    return costs
+
+
+def order_by_cost(params, costs=None, scan_dirs=None):
+    """
+    Parameters:
+    -------------
+    params: dict, key: report name, value: parameters of the task
+    costs: dict, optional, the recorded costs, default is recorded_costs()
+    scan_dirs: list of str, optional, see recorded_costs
+
+    Returns:
+    -------------
+    (ordered_params, expected), ordered_params is a dict in the
+    longest-expected-first order, and expected is the dict of the expected
+    seconds of the tasks.
+    """
+    if costs is None:
+        costs = recorded_costs(scan_dirs=scan_dirs)
+    model = TaskCostModel().fit(costs)
+    expected = model.predict(params.keys())
+    names = sorted(params.keys(), key=lambda name: -expected[name])
+    logging.info("cost model of {} records, {} tasks, expected total: "
+                 "{:.1f}".format(model.n_record, len(names),
+                                 sum(expected.values())))
+    return {name: params[name] for name in names}, expected
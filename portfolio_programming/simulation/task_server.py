@@ -0,0 +1,496 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+fault-tolerant work distribution of the parameter server and clients.
+
+A task sent to a client is leased instead of removed. The client renews
+the lease by heartbeats while the simulation is running, and reports the
+completion or the failure explicitly. The lease of a dead client expires,
+and the task is requeued. The state of the tasks is persisted in a SQLite
+file, so a restarted server resumes the queue, and the leases of the
+running clients are kept.
+
+protocol, the client sends a dict and the server replies a dict:
+    {"type": "request", "worker"} -> {"name", "params"}, or {"wait": secs}
+        if all remaining tasks are leased, or {"stop": True}
+    {"type": "heartbeat", "worker", "name"} -> {"ok": bool}, ok is False
+        if the lease is lost.
+    {"type": "done", "worker", "name"} -> {"ok": bool}
+    {"type": "fail", "worker", "name", "reason"} -> {"ok": bool}
+"""
+
+import datetime as dt
+import logging
+import os
+import pickle
+import platform
+import sqlite3
+import threading
+import traceback
+from time import time, sleep
+
+import zmq
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class TaskQueue(object):
+    """
+    persistent queue of the tasks with leases
+    """
+
+    def __init__(self, state_path, lease_secs=600., max_attempt=3,
+                 timeout=60.):
+        """
+        Parameters:
+        -------------
+        state_path: str, path of the SQLite file of the state
+        lease_secs: float, seconds of a lease without heartbeat
+        max_attempt: positive integer, a task is failed after max_attempt
+            failed or expired leases.
+        timeout: float, seconds to wait for the lock of the database
+        """
+        self.state_path = state_path
+        self.lease_secs = lease_secs
+        self.max_attempt = max_attempt
+        state_dir = os.path.dirname(os.path.abspath(state_path))
+        if not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        self.conn = sqlite3.connect(state_path, timeout=timeout)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS task ("
+                "name TEXT PRIMARY KEY, "
+                "seq INTEGER, "
+                "cost REAL NOT NULL DEFAULT 0, "
+                "params BLOB, "
+                "status TEXT NOT NULL, "
+                "worker TEXT, "
+                "lease_expire REAL, "
+                "n_attempt INTEGER NOT NULL DEFAULT 0, "
+                "reason TEXT, "
+                "updated REAL)"
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, params, costs=None):
+        """
+        adding the tasks, the params are the unfinished tasks, so the
+        existed tasks of params which are not leased (e.g. done before the
+        report was lost, or failed before the bug was fixed) are pending
+        again with a new attempt count.
+
+        Parameters:
+        -------------
+        params: dict, key: task name, value: tuple of the arguments
+        costs: dict, optional, key: task name, value: expected cost, the
+            tasks are leased in the descending order of the costs, and
+            then in the order of params. The costs of the existed tasks
+            are updated.
+
+        Returns:
+        -------------
+        integer, number of the new and the requeued tasks
+        """
+        costs = costs if costs is not None else {}
+        seq = self.conn.execute("SELECT COUNT(*) FROM task").fetchone()[0]
+        now = time()
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO task (name, seq, cost, params, "
+                "status, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                [(name, seq + idx, costs.get(name, 0.), pickle.dumps(value),
+                  PENDING, now)
+                 for idx, (name, value) in enumerate(params.items())])
+            n_new = cursor.rowcount
+            cursor = self.conn.executemany(
+                "UPDATE task SET status = ?, params = ?, n_attempt = 0, "
+                "worker = NULL, lease_expire = NULL, reason = NULL, "
+                "updated = ? WHERE name = ? AND status IN (?, ?)",
+                [(PENDING, pickle.dumps(value), now, name, DONE, FAILED)
+                 for name, value in params.items()])
+            n_requeued = cursor.rowcount
+            self.conn.executemany(
+                "UPDATE task SET cost = ? WHERE name = ?",
+                [(cost, name) for name, cost in costs.items()])
+        if n_requeued:
+            logging.info("{} done or failed tasks are requeued.".format(
+                n_requeued))
+        return n_new + n_requeued
+
+    def requeue_expired(self, now=None):
+        """
+        requeuing the tasks whose leases expired
+
+        Returns:
+        -------------
+        list of str, names of the expired tasks
+        """
+        now = time() if now is None else now
+        rows = self.conn.execute(
+            "SELECT name, worker, n_attempt FROM task WHERE status = ? AND "
+            "lease_expire < ?", (LEASED, now)).fetchall()
+        for name, worker, n_attempt in rows:
+            logging.warning("lease of {} by {} expired".format(name, worker))
+            self._release(name, "lease expired", n_attempt, now)
+        return [row[0] for row in rows]
+
+    def _release(self, name, reason, n_attempt, now):
+        status = PENDING if n_attempt < self.max_attempt else FAILED
+        with self.conn:
+            self.conn.execute(
+                "UPDATE task SET status = ?, worker = NULL, "
+                "lease_expire = NULL, reason = ?, updated = ? "
+                "WHERE name = ?", (status, reason, now, name))
+
+    def lease(self, worker, now=None):
+        """
+        Returns:
+        -------------
+        (name, params) of the first pending task, or None if no task is
+        pending.
+        """
+        now = time() if now is None else now
+        self.requeue_expired(now)
+        row = self.conn.execute(
+            "SELECT name, params FROM task WHERE status = ? "
+            "ORDER BY cost DESC, seq LIMIT 1", (PENDING,)).fetchone()
+        if row is None:
+            return None
+        name, params = row
+        with self.conn:
+            self.conn.execute(
+                "UPDATE task SET status = ?, worker = ?, lease_expire = ?, "
+                "n_attempt = n_attempt + 1, updated = ? WHERE name = ?",
+                (LEASED, worker, now + self.lease_secs, now, name))
+        return name, pickle.loads(params)
+
+    def _is_holder(self, name, worker):
+        row = self.conn.execute(
+            "SELECT status, worker FROM task WHERE name = ?",
+            (name,)).fetchone()
+        return row is not None and row[0] == LEASED and row[1] == worker
+
+    def heartbeat(self, name, worker, now=None):
+        """
+        Returns:
+        -------------
+        bool, the lease is renewed, False if the worker lost the lease.
+        """
+        now = time() if now is None else now
+        if not self._is_holder(name, worker):
+            return False
+        with self.conn:
+            self.conn.execute(
+                "UPDATE task SET lease_expire = ?, updated = ? "
+                "WHERE name = ?", (now + self.lease_secs, now, name))
+        return True
+
+    def complete(self, name, worker, now=None):
+        """
+        Returns:
+        -------------
+        bool, the task is leased by the worker. A late completion of an
+        expired lease is accepted unless the task is leased by the others.
+        """
+        now = time() if now is None else now
+        row = self.conn.execute(
+            "SELECT status, worker FROM task WHERE name = ?",
+            (name,)).fetchone()
+        if row is None or (row[0] == LEASED and row[1] != worker):
+            return False
+        with self.conn:
+            self.conn.execute(
+                "UPDATE task SET status = ?, worker = ?, "
+                "lease_expire = NULL, reason = NULL, updated = ? "
+                "WHERE name = ?", (DONE, worker, now, name))
+        return True
+
+    def fail(self, name, worker, reason, now=None):
+        """
+        the failed task is requeued unless it has been attempted
+        max_attempt times.
+
+        Returns:
+        -------------
+        bool, the task is leased by the worker
+        """
+        now = time() if now is None else now
+        if not self._is_holder(name, worker):
+            return False
+        n_attempt = self.conn.execute(
+            "SELECT n_attempt FROM task WHERE name = ?",
+            (name,)).fetchone()[0]
+        logging.warning("{} failed on {}: {}".format(name, worker, reason))
+        self._release(name, reason, n_attempt, now)
+        return True
+
+    def counts(self):
+        """
+        Returns:
+        -------------
+        dict, key: status, value: number of tasks
+        """
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(self.conn.execute(
+            "SELECT status, COUNT(*) FROM task GROUP BY status").fetchall())
+        return counts
+
+    def leases(self):
+        """
+        Returns:
+        -------------
+        list of (name, worker, lease_expire) of the leased tasks
+        """
+        return self.conn.execute(
+            "SELECT name, worker, lease_expire FROM task WHERE status = ? "
+            "ORDER BY seq", (LEASED,)).fetchall()
+
+    def failed(self):
+        """
+        Returns:
+        -------------
+        dict, key: name of the failed task, value: last reason
+        """
+        return dict(self.conn.execute(
+            "SELECT name, reason FROM task WHERE status = ?",
+            (FAILED,)).fetchall())
+
+
+def serve_tasks(task_queue, address="tcp://*:25555", poll_secs=1.,
+                wait_secs=30., progress_interval=60.):
+    """
+    serving the tasks until all tasks are done or failed.
+
+    Parameters:
+    -------------
+    task_queue: TaskQueue
+    address: str, zmq address to bind
+    poll_secs: float, seconds between the checks of the expired leases
+    wait_secs: float, seconds of a client to wait when all the remaining
+        tasks are leased
+    progress_interval: float, seconds between the progress summaries
+
+    Returns:
+    -------------
+    dict, counts of the task status
+    """
+    server_node_pid = "{}[pid:{}]".format(platform.node(), os.getpid())
+    context = zmq.Context()
+    socket = context.socket(zmq.REP)
+    socket.bind(address)
+    poll = zmq.Poller()
+    poll.register(socket, zmq.POLLIN)
+
+    counts = task_queue.counts()
+    print("{} ready to serving, {}".format(server_node_pid, counts))
+    t0 = time()
+    last_progress = t0
+
+    while True:
+        counts = task_queue.counts()
+        if counts[PENDING] == 0 and counts[LEASED] == 0:
+            break
+
+        socks = dict(poll.poll(int(poll_secs * 1000)))
+        if socks.get(socket) == zmq.POLLIN:
+            msg = socket.recv_pyobj()
+            msg_type, worker = msg.get("type"), msg.get("worker")
+            if msg_type == "request":
+                task = task_queue.lease(worker)
+                if task is not None:
+                    print("{:<15} send {} to {}".format(
+                        str(dt.datetime.now()), task[0], worker))
+                    reply = {"name": task[0], "params": task[1]}
+                else:
+                    reply = {"wait": wait_secs}
+            elif msg_type == "heartbeat":
+                reply = {"ok": task_queue.heartbeat(msg["name"], worker)}
+            elif msg_type == "done":
+                reply = {"ok": task_queue.complete(msg["name"], worker)}
+                print("{:<15} {} done by {}".format(
+                    str(dt.datetime.now()), msg["name"], worker))
+            elif msg_type == "fail":
+                reply = {"ok": task_queue.fail(msg["name"], worker,
+                                               msg.get("reason"))}
+            else:
+                reply = {"error": "unknown message type: {}".format(
+                    msg_type)}
+            socket.send_pyobj(reply)
+        else:
+            task_queue.requeue_expired()
+
+        if time() - last_progress >= progress_interval:
+            last_progress = time()
+            print("{} elapsed: {:.1f} secs, {}".format(
+                server_node_pid, time() - t0, task_queue.counts()))
+            for name, worker, lease_expire in task_queue.leases():
+                print("  {} on {}, lease expires in {:.0f} secs".format(
+                    name, worker, lease_expire - time()))
+
+    # replying the stop message to the clients for a while
+    stop_until = time() + wait_secs
+    while time() < stop_until:
+        socks = dict(poll.poll(int(poll_secs * 1000)))
+        if socks.get(socket) == zmq.POLLIN:
+            msg = socket.recv_pyobj()
+            if msg.get("type") == "request":
+                socket.send_pyobj({"stop": True})
+            else:
+                socket.send_pyobj({"ok": False})
+
+    print("end of serving, {}".format(counts))
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.close()
+    context.term()
+    return counts
+
+
+class _Connection(object):
+    """
+    the request socket of a client, which is reconnected if the server
+    does not reply in time.
+    """
+
+    def __init__(self, context, url, reply_secs=10.):
+        self.context = context
+        self.url = url
+        self.reply_secs = reply_secs
+        self.socket = None
+        self.poll = zmq.Poller()
+        self._connect()
+
+    def _connect(self):
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.connect(self.url)
+        self.poll.register(self.socket, zmq.POLLIN)
+
+    def _reconnect(self):
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.close()
+        self.poll.unregister(self.socket)
+        self._connect()
+
+    def send(self, msg):
+        """
+        Returns:
+        -------------
+        dict, the reply, or None if the server does not reply in time.
+        """
+        self.socket.send_pyobj(msg)
+        socks = dict(self.poll.poll(int(self.reply_secs * 1000)))
+        if socks.get(self.socket) == zmq.POLLIN:
+            return self.socket.recv_pyobj()
+        self._reconnect()
+        return None
+
+    def close(self):
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.close()
+
+
+def _heartbeat_loop(context, url, worker, name, heartbeat_secs, stop_event):
+    conn = _Connection(context, url)
+    try:
+        while not stop_event.wait(heartbeat_secs):
+            reply = conn.send({"type": "heartbeat", "worker": worker,
+                               "name": name})
+            if reply is None:
+                logging.warning("{} heartbeat of {} is not replied".format(
+                    worker, name))
+            elif not reply.get("ok"):
+                logging.warning("{} lost the lease of {}".format(worker,
+                                                                name))
+    finally:
+        conn.close()
+
+
+def run_task_client(func, server_ip="140.117.168.49", port=25555,
+                    heartbeat_secs=60., max_reconnect_count=10,
+                    reconnect_secs=10.):
+    """
+    requesting and running the tasks until the server stops.
+
+    Parameters:
+    -------------
+    func: callable, the simulation function, func(*params) of each task
+    server_ip: str
+    port: integer
+    heartbeat_secs: float, seconds between the heartbeats, which must be
+        less than the lease_secs of the server.
+    max_reconnect_count: positive integer, the client stops after the
+        server does not reply max_reconnect_count times in a row.
+    reconnect_secs: float, seconds to wait before the reconnection
+
+    Returns:
+    -------------
+    integer, number of the finished tasks of the client
+    """
+    worker = "{}_{}".format(platform.node(), os.getpid())
+    url = "tcp://{}:{}".format(server_ip, port)
+    context = zmq.Context()
+    conn = _Connection(context, url)
+    n_finished = 0
+    reconnect_count = 0
+
+    def send_until_replied(msg):
+        nonlocal reconnect_count
+        while reconnect_count < max_reconnect_count:
+            reply = conn.send(msg)
+            if reply is not None:
+                reconnect_count = 0
+                return reply
+            reconnect_count += 1
+            print('{}, reconnect to {}'.format(dt.datetime.now(), url))
+            sleep(reconnect_secs)
+        return None
+
+    try:
+        while True:
+            reply = send_until_replied({"type": "request", "worker": worker})
+            if reply is None or reply.get("stop"):
+                break
+            if "wait" in reply:
+                sleep(reply["wait"])
+                continue
+
+            name, params = reply["name"], reply["params"]
+            print("{:<15} receiving: {}".format(str(dt.datetime.now()),
+                                                name))
+            stop_event = threading.Event()
+            heartbeat = threading.Thread(
+                target=_heartbeat_loop,
+                args=(context, url, worker, name, heartbeat_secs,
+                      stop_event),
+                daemon=True)
+            heartbeat.start()
+            try:
+                func(*params)
+            except Exception:
+                msg = {"type": "fail", "worker": worker, "name": name,
+                       "reason": traceback.format_exc()}
+            else:
+                msg = {"type": "done", "worker": worker, "name": name}
+                n_finished += 1
+            finally:
+                stop_event.set()
+                heartbeat.join()
+
+            if send_until_replied(msg) is None:
+                break
+    finally:
+        conn.close()
+        context.term()
+    return n_finished
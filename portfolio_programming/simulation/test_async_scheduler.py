@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+the executor behavior (retry, timeout, failure) is tested by
+test_local_sweep, the tests here are about the scheduling and the events.
+"""
+
+import asyncio
+import multiprocessing as mp
+import sys
+from time import sleep, time
+
+import pytest
+
+from portfolio_programming.simulation.async_scheduler import (
+    run_async_tasks, schedule_tasks)
+
+
+def _exit_task(secs, exit_code=0):
+    sleep(secs)
+    if exit_code:
+        sys.exit(exit_code)
+
+
+def _raise_task():
+    raise ValueError("broken task")
+
+
+def test_async_scheduler_events():
+    params = {"t{}".format(idx): (0.2,) for idx in range(5)}
+    params["t2"] = (0., 3)
+    events = []
+    summary = run_async_tasks(_exit_task, params, n_worker=1, retry_cnt=1,
+                              callback=events.append)
+
+    # the tasks start in the order of params, the retry runs at once
+    starts = [e['name'] for e in events if e['event'] == "started"]
+    assert starts == ["t0", "t1", "t2", "t2", "t3", "t4"]
+    assert [e['n_running'] for e in events if e['event'] == "started"] == [
+        1] * 6
+    assert summary['failed'] == {"t2": "exit code 3"}
+    retry = [e for e in events if e['event'] == "retry"][0]
+    assert retry['reason'] == "exit code 3"
+    assert events[-1]['n_finished'] + events[-1]['n_failed'] == 5
+    assert all(e['n_task'] == 5 for e in events)
+
+    # the traceback of the child is sent back
+    summary = run_async_tasks(_raise_task, {"t": ()}, n_worker=1,
+                              retry_cnt=0, callback=None)
+    assert summary['failed']['t'].startswith("exit code 1\n")
+    assert "ValueError: broken task" in summary['failed']['t']
+
+
+def test_async_scheduler_cancel():
+    params = {"t{}".format(idx): (30.,) for idx in range(2)}
+
+    async def main():
+        await asyncio.wait_for(
+            schedule_tasks(_exit_task, params, n_worker=2, callback=None),
+            0.5)
+
+    t0 = time()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+    # the running processes are terminated instead of left as orphans
+    assert time() - t0 < 10
+    assert mp.active_children() == []
+
+
+def test_async_scheduler_loop():
+    params = {"t{}".format(idx): (0.5,) for idx in range(4)}
+    ticks = []
+
+    async def ticker(stop):
+        while not stop.is_set():
+            ticks.append(1)
+            await asyncio.sleep(0.05)
+
+    async def main():
+        stop = asyncio.Event()
+        tick_task = asyncio.ensure_future(ticker(stop))
+        summary = await schedule_tasks(_exit_task, params, n_worker=4,
+                                       callback=None)
+        stop.set()
+        await tick_task
+        return summary
+
+    summary = asyncio.run(main())
+    # the event loop is not blocked while the processes run concurrently
+    assert sorted(summary['finished']) == sorted(params.keys())
+    assert summary['elapsed'] < 1.5
+    assert len(ticks) >= 5
+
+    with pytest.raises(ValueError):
+        run_async_tasks(_exit_task, params, n_worker=0)
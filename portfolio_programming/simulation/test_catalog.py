@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import datetime as dt
+import os
+import tempfile
+
+from portfolio_programming.simulation.catalog import (
+    Catalog, SCENARIO, REPORT, RUNNING)
+
+
+def test_catalog():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "catalog.sqlite")
+        for name in ("a.pkl", "b.pkl", "c.txt"):
+            with open(os.path.join(tmp_dir, name), "w") as fout:
+                fout.write(name)
+        all_params = {"a.pkl": 1, "b.pkl": 2, "d.pkl": 3}
+
+        with Catalog(db_path) as catalog:
+            # synchronized with the directory at the first query
+            assert catalog.unfinished(REPORT, all_params, tmp_dir) == {
+                "d.pkl": 3}
+            assert catalog.verify(REPORT, "a.pkl")
+
+            path = os.path.join(tmp_dir, "d.pkl")
+            catalog.register(REPORT, path, status=RUNNING)
+            assert catalog.unfinished(REPORT, all_params) == {"d.pkl": 3}
+            with open(path, "w") as fout:
+                fout.write("d")
+            catalog.register(REPORT, path, ("d", dt.date(2005, 1, 3)))
+            assert catalog.unfinished(REPORT, all_params) == {}
+            assert catalog.get(REPORT, "d.pkl")["parameters"] == [
+                "d", "2005-01-03"]
+            assert catalog.names(SCENARIO) == set()
+
+        # the records persist, and the modified file is detected
+        with open(path, "w") as fout:
+            fout.write("modified")
+        with Catalog(db_path) as catalog:
+            assert not catalog.verify(REPORT, "d.pkl")
+            os.remove(os.path.join(tmp_dir, "a.pkl"))
+            catalog.sync_directory(REPORT, tmp_dir)
+            assert catalog.names(REPORT) == {"b.pkl", "d.pkl"}
+
+
+def test_catalog_register_before_first_query():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "catalog.sqlite")
+        for name in ("old1.pkl", "old2.pkl", "new.pkl"):
+            with open(os.path.join(tmp_dir, name), "w") as fout:
+                fout.write(name)
+        all_params = {"old1.pkl": 1, "old2.pkl": 2, "new.pkl": 3,
+                      "todo.pkl": 4}
+
+        with Catalog(db_path) as catalog:
+            # a writer registers its report before any dispatcher query
+            catalog.register(REPORT, os.path.join(tmp_dir, "new.pkl"))
+            assert not catalog.synced(REPORT, tmp_dir)
+            assert catalog.unfinished(REPORT, all_params, tmp_dir) == {
+                "todo.pkl": 4}
+            assert catalog.synced(REPORT, tmp_dir)
+
+            # the synchronized directory is not scanned again, the files
+            # changed outside the catalog need a forced re-sync
+            os.remove(os.path.join(tmp_dir, "old1.pkl"))
+            with open(os.path.join(tmp_dir, "todo.pkl"), "w") as fout:
+                fout.write("todo")
+            assert catalog.unfinished(REPORT, all_params, tmp_dir) == {
+                "todo.pkl": 4}
+            assert catalog.unfinished(REPORT, all_params, tmp_dir,
+                                      resync=True) == {"old1.pkl": 1}
+
+            # the invalidated record is unfinished again
+            catalog.delete(REPORT, "old2.pkl")
+            assert catalog.unfinished(REPORT, all_params, tmp_dir) == {
+                "old1.pkl": 1, "old2.pkl": 2}
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import portfolio_programming as pp
+from portfolio_programming.simulation import ct_gen_scenarios
+from portfolio_programming.simulation.ct_gen_scenarios import (
+    ct_generating_group_scenarios_xarr, ct_generating_scenarios_of_dates,
+    ct_generating_group_scenarios_of_dates, group_symbol_params)
+
+
+def test_group_scenarios(n_sc_period=5, n_symbol=3, n_scenario=200,
+                         rolling_window_size=20):
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    roi_data = 0.001 + np.random.standard_t(
+        5, (n_sc_period + rolling_window_size - 1, n_symbol)) * 0.02
+    sc_dates = pd.bdate_range('2005-01-03', periods=n_sc_period)
+
+    scenarios = ct_generating_group_scenarios_of_dates(
+        roi_data, sc_dates, symbols, rolling_window_size, n_scenario, 1)
+    assert scenarios.shape == (n_sc_period, n_symbol, n_scenario)
+
+    np.testing.assert_array_equal(
+        scenarios, ct_generating_group_scenarios_of_dates(
+            roi_data, sc_dates, symbols, rolling_window_size, n_scenario, 1))
+
+    # the marginal moments of each symbol match those of its window
+    for tdx in range(n_sc_period):
+        window = roi_data[tdx:tdx + rolling_window_size]
+        np.testing.assert_allclose(scenarios[tdx].mean(axis=1),
+                                   window.mean(axis=0), atol=1e-10)
+        np.testing.assert_allclose(scenarios[tdx].std(axis=1, ddof=1),
+                                   window.std(axis=0, ddof=1))
+
+    # the single symbol pipeline
+    single = ct_generating_scenarios_of_dates(
+        roi_data[:, 0], sc_dates, symbols[0], rolling_window_size,
+        n_scenario, 1)
+    assert single.shape == (n_sc_period, n_scenario)
+
+    # the symbols do not share the same random stream
+    assert not np.allclose(np.argsort(scenarios[0, 0]),
+                           np.argsort(scenarios[0, 1]))
+
+
+def test_scenarios_independent_of_n_worker(monkeypatch, n_symbol=3,
+                                            n_scenario=200,
+                                            rolling_window_size=20):
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    dates = pd.bdate_range('2005-01-03', periods=rolling_window_size + 6)
+    asset_xarr = xr.DataArray(
+        (0.001 + np.random.standard_t(
+            5, (len(dates), n_symbol)) * 0.02)[:, :, np.newaxis],
+        dims=("trans_date", "symbol", "data"),
+        coords=(dates, symbols, ["simple_roi", ]))
+    monkeypatch.setattr(ct_gen_scenarios, "open_market_panel",
+                        lambda market: asset_xarr)
+    monkeypatch.setattr(
+        pp, "SYMBOL_SCENARIO_NAME_FORMAT",
+        "sdx{sdx}_{scenario_start_date}_{scenario_end_date}_"
+        "symbol{symbol}_h{rolling_window_size}_s{n_scenario}.nc",
+        raising=False)
+
+    scenarios = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.setattr(pp, "CATALOG_DB",
+                            os.path.join(tmp_dir, "catalog.sqlite"))
+        for n_worker in (1, 2):
+            scenario_dir = os.path.join(tmp_dir, "w{}".format(n_worker))
+            monkeypatch.setattr(pp, "SCENARIO_SET_DIR", scenario_dir)
+            # 3 chunks of the 7 scenario dates
+            ct_generating_group_scenarios_xarr(
+                1, dates[rolling_window_size - 1], dates[-1], symbols,
+                rolling_window_size, n_scenario, n_worker=n_worker,
+                chunk_size=3)
+            worker_scenarios = {}
+            for symbol in symbols:
+                scenario_file, = [
+                    name for name in os.listdir(scenario_dir)
+                    if "symbol{}_".format(symbol) in name and
+                    name.endswith(".nc")]
+                with xr.open_dataarray(
+                        os.path.join(scenario_dir, scenario_file)) as xarr:
+                    worker_scenarios[symbol] = xarr.load()
+            scenarios.append(worker_scenarios)
+
+    for symbol in symbols:
+        assert scenarios[0][symbol].shape == (7, n_scenario)
+        xr.testing.assert_identical(scenarios[0][symbol],
+                                    scenarios[1][symbol])
+    # the symbols are seeded by their names, not by their positions
+    reversed_scenarios = ct_generating_group_scenarios_of_dates(
+        asset_xarr.values[:rolling_window_size + 2, ::-1, 0],
+        dates[rolling_window_size - 1:rolling_window_size + 2],
+        symbols[::-1], rolling_window_size, n_scenario, 1)
+    np.testing.assert_array_equal(
+        scenarios[0][symbols[0]].values[:3], reversed_scenarios[:, -1])
+
+
+def test_group_scenarios_not_converge(monkeypatch, n_symbol=3,
+                                      n_scenario=50, rolling_window_size=20):
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    roi_data = 0.001 + np.random.randn(rolling_window_size + 1,
+                                       n_symbol) * 0.02
+    sc_dates = pd.bdate_range('2005-01-03', periods=2)
+
+    def not_converge(*args, **kwargs):
+        raise ValueError("not converge")
+
+    monkeypatch.setattr(ct_gen_scenarios, "ct_sampling", not_converge)
+    try:
+        ct_generating_group_scenarios_of_dates(
+            roi_data, sc_dates, symbols, rolling_window_size, n_scenario, 1,
+            retry_cnt=2)
+    except ValueError as e:
+        assert "2005-01-03" in str(e)
+    else:
+        raise AssertionError("the failed date is not detected.")
+
+
+def test_group_symbol_params():
+    params = [(1, 's', 'e', '2330', 10, 200),
+              (1, 's', 'e', '1101', 10, 200),
+              (1, 's', 'e', '1101', 20, 200)]
+    assert group_symbol_params(params) == [
+        (1, 's', 'e', ['1101', '2330'], 10, 200),
+        (1, 's', 'e', ['1101'], 20, 200)]
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import portfolio_programming as pp
+from portfolio_programming.simulation import hemm_gen_scenarios
+from portfolio_programming.simulation.hemm_gen_scenarios import (
+    hemm_generating_scenarios_xarr, hemm_generating_scenarios_of_dates,
+    hemm_generating_multi_window_scenarios_of_dates,
+    write_scenario_telemetry, load_scenario_telemetry, TELEMETRY_FIELDS,
+    stream_concat_scenarios)
+
+
+def test_multi_window_scenarios(n_sc_period=5, n_symbol=3, n_scenario=50):
+    window_sizes = [10, 20]
+    max_window_size = max(window_sizes)
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    roi_data = 0.001 + np.random.randn(
+        n_sc_period + max_window_size - 1, n_symbol) * 0.02
+    sc_dates = pd.bdate_range('2005-01-03', periods=n_sc_period)
+
+    scenarios = hemm_generating_multi_window_scenarios_of_dates(
+        roi_data, sc_dates, symbols, window_sizes, n_scenario, 1)
+    assert scenarios.shape == (len(window_sizes), n_sc_period, n_symbol,
+                               n_scenario)
+
+    for wdx, h in enumerate(window_sizes):
+        single = hemm_generating_scenarios_of_dates(
+            roi_data[max_window_size - h:], sc_dates, symbols, h,
+            n_scenario, 1)
+        np.testing.assert_array_equal(scenarios[wdx], single)
+
+
+def test_scenarios_independent_of_n_worker(monkeypatch, n_scenario=50,
+                                            rolling_window_size=10):
+    group_name = 'TWG1'
+    symbols = pp.GROUP_SYMBOLS[group_name]
+    n_symbol = len(symbols)
+    dates = pd.bdate_range('2005-01-03', periods=rolling_window_size + 6)
+    asset_xarr = xr.DataArray(
+        (0.001 + np.random.randn(len(dates), n_symbol) * 0.02)[:, :,
+                                                               np.newaxis],
+        dims=("trans_date", "symbol", "data"),
+        coords=(dates, symbols, ["simple_roi", ]))
+    monkeypatch.setattr(hemm_gen_scenarios, "open_market_panel",
+                        lambda market: asset_xarr)
+
+    scenarios = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.setattr(pp, "CATALOG_DB",
+                            os.path.join(tmp_dir, "catalog.sqlite"))
+        for n_worker in (1, 2):
+            scenario_dir = os.path.join(tmp_dir, "w{}".format(n_worker))
+            monkeypatch.setattr(pp, "SCENARIO_SET_DIR", scenario_dir)
+            # 4 chunks of the 7 scenario dates, the files are written
+            # chunk by chunk
+            hemm_generating_scenarios_xarr(
+                group_name, n_symbol, rolling_window_size, n_scenario, 1,
+                dates[rolling_window_size - 1], dates[-1], n_worker=n_worker,
+                chunk_size=2)
+            scenario_file, = [name for name in os.listdir(scenario_dir)
+                              if name.endswith(".nc")]
+            assert not [name for name in os.listdir(scenario_dir)
+                        if name.endswith(".partial")]
+            with xr.open_dataarray(os.path.join(scenario_dir,
+                                                scenario_file)) as xarr:
+                scenarios.append(xarr.load())
+    assert scenarios[0].shape == (7, n_symbol, n_scenario)
+    xr.testing.assert_identical(scenarios[0], scenarios[1])
+
+    # the chunks are written to their dates
+    roi_data = asset_xarr.values[:, :, 0]
+    sc_dates = dates[rolling_window_size - 1:]
+    for idx in range(0, len(sc_dates), 2):
+        np.testing.assert_array_equal(
+            scenarios[0].values[idx:idx + 2],
+            hemm_generating_scenarios_of_dates(
+                roi_data[idx:idx + rolling_window_size + 1],
+                sc_dates[idx:idx + 2], symbols, rolling_window_size,
+                n_scenario, 1))
+
+
+def test_scenario_telemetry(n_sc_period=5, n_symbol=3, n_scenario=50,
+                            rolling_window_size=20):
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    roi_data = 0.001 + np.random.randn(
+        n_sc_period + rolling_window_size - 1, n_symbol) * 0.02
+    sc_dates = pd.bdate_range('2005-01-03', periods=n_sc_period)
+
+    scenarios, telemetry = hemm_generating_multi_window_scenarios_of_dates(
+        roi_data, sc_dates, symbols, [rolling_window_size, ], n_scenario, 1,
+        return_telemetry=True)
+    np.testing.assert_array_equal(
+        scenarios[0], hemm_generating_scenarios_of_dates(
+            roi_data, sc_dates, symbols, rolling_window_size, n_scenario, 1))
+    assert telemetry.shape == (1, n_sc_period, len(TELEMETRY_FIELDS))
+
+    telemetry_xarr = xr.DataArray(telemetry[0],
+                                  dims=("trans_date", "field"),
+                                  coords=(sc_dates, list(TELEMETRY_FIELDS)))
+    assert (telemetry_xarr.loc[:, "n_attempt"] >= 1).all()
+    assert (telemetry_xarr.loc[:, "moment_err"] <=
+            telemetry_xarr.loc[:, "max_err"]).all()
+    assert (telemetry_xarr.loc[:, "corr_err"] <=
+            telemetry_xarr.loc[:, "max_err"]).all()
+
+    with tempfile.TemporaryDirectory() as scenario_dir:
+        scenario_path = os.path.join(scenario_dir, "scenario.nc")
+        summary = write_scenario_telemetry(telemetry_xarr, scenario_path)
+        assert summary["n_date"] == n_sc_period
+        with load_scenario_telemetry(scenario_path) as loaded:
+            np.testing.assert_array_equal(loaded.values, telemetry[0])
+            assert loaded.attrs["n_relaxed_date"] == summary[
+                "n_relaxed_date"]
+
+
+def test_stream_concat_scenarios(monkeypatch, n_symbol=3, n_scenario=20):
+    import netCDF4
+    import portfolio_programming as pp
+
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    dates = pd.bdate_range('2005-01-03', periods=25)
+    values = np.random.randn(len(dates), n_symbol, n_scenario).astype(
+        np.float32)
+    xarr = xr.DataArray(values, dims=("trans_date", "symbol", "scenario"),
+                        coords=(dates, symbols, range(n_scenario)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monkeypatch.setattr(pp, "CATALOG_DB",
+                            os.path.join(tmp_dir, "catalog.sqlite"))
+        src_paths = [os.path.join(tmp_dir, "src1.nc"),
+                     os.path.join(tmp_dir, "src2.nc")]
+        xarr[:10].to_netcdf(src_paths[0])
+        xarr[10:].to_netcdf(src_paths[1])
+        dst_path = os.path.join(tmp_dir, "dst.nc")
+
+        # the sources are not contiguous in the trading dates
+        try:
+            stream_concat_scenarios(src_paths, dst_path, dates.delete(10))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("missing dates are not detected.")
+        try:
+            stream_concat_scenarios(src_paths[::-1], dst_path, dates)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("unordered sources are not detected.")
+
+        assert stream_concat_scenarios(src_paths, dst_path, dates,
+                                       chunk_size=4) == len(dates)
+        with xr.open_dataarray(dst_path) as merged:
+            assert merged.dtype == np.float32
+            xr.testing.assert_identical(merged.load(), xarr.rename(
+                "scenario_roi"))
+
+        # a stopped merge resumes from the copied dates
+        partial_path = dst_path + ".partial"
+        os.replace(dst_path, partial_path)
+        with netCDF4.Dataset(partial_path, "a") as dst:
+            dst.variables["scenario_roi"][:8] = 0.
+            dst.variables["scenario_roi"][8:] = np.nan
+            dst.n_copied = 8
+        stream_concat_scenarios(src_paths, dst_path, dates, chunk_size=4)
+        with xr.open_dataarray(dst_path) as merged:
+            assert (merged.values[:8] == 0).all()
+            np.testing.assert_array_equal(merged.values[8:], values[8:])
+        assert not os.path.exists(partial_path)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import tempfile
+from time import sleep
+
+from portfolio_programming.simulation.local_sweep import run_local_sweep
+
+
+def _touch_task(path, n_fail=0, secs=0.):
+    """ failing n_fail times before writing the file """
+    count_path = path + ".count"
+    count = 0
+    if os.path.exists(count_path):
+        with open(count_path) as fin:
+            count = int(fin.read())
+    with open(count_path, "w") as fout:
+        fout.write(str(count + 1))
+    sleep(secs)
+    if count < n_fail:
+        raise ValueError("failed run {}".format(count))
+    with open(path, "w") as fout:
+        fout.write("done")
+
+
+def test_local_sweep():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {name: os.path.join(tmp_dir, name)
+                 for name in ("ok", "retried", "failed", "timeout")}
+        params = {
+            "ok": (paths["ok"], ),
+            "retried": (paths["retried"], 1),
+            "failed": (paths["failed"], 5),
+            "timeout": (paths["timeout"], 0, 30.),
+        }
+        summary = run_local_sweep(_touch_task, params, n_worker=2,
+                                  timeout=2., retry_cnt=1)
+        assert sorted(summary["finished"]) == ["ok", "retried"]
+        assert sorted(summary["failed"].keys()) == ["failed", "timeout"]
+        assert summary["failed"]["timeout"].startswith("timeout")
+        assert summary["n_retry"] == 3
+        assert os.path.exists(paths["ok"])
+        assert os.path.exists(paths["retried"])
+        assert not os.path.exists(paths["timeout"])
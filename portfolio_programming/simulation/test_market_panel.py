@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from portfolio_programming.simulation.market_panel import (
+    open_market_panel, release_market_panel, shared_panel_name,
+    shared_panel_prefix)
+
+
+def _panel_sum(path, queue):
+    panel = open_market_panel(path, timeout=10.)
+    queue.put((float(panel.loc[:, ['s1', 's2'], 'simple_roi'].sum()),
+               panel.values.flags.writeable))
+
+
+def test_market_panel():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "panel.nc")
+        xarr = xr.DataArray(
+            np.random.RandomState(0).randn(20, 3, 2),
+            dims=("trans_date", "symbol", "data"),
+            coords=(pd.date_range("2005-01-03", periods=20),
+                    ["s1", "s2", "s3"], ["close_price", "simple_roi"]))
+        xarr.to_netcdf(path)
+        try:
+            panel = open_market_panel(path)
+            xr.testing.assert_identical(panel, xr.open_dataarray(path))
+            assert not panel.values.flags.writeable
+            assert open_market_panel(path) is panel
+
+            # the other process attaches the published panel
+            ctx = mp.get_context("spawn")
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_panel_sum, args=(path, queue))
+            proc.start()
+            total, writeable = queue.get(timeout=60)
+            proc.join()
+            np.testing.assert_allclose(
+                total, xarr.loc[:, ['s1', 's2'], 'simple_roi'].sum())
+            assert not writeable
+        finally:
+            assert release_market_panel(path)
+        assert not release_market_panel(path)
+
+
+def _shm_names(path):
+    if not os.path.isdir("/dev/shm"):
+        return set()
+    return {name for name in os.listdir("/dev/shm")
+            if name.startswith(shared_panel_prefix(path))}
+
+
+def test_market_panel_stale_segments():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "panel.nc")
+        xarr = xr.DataArray(np.arange(12.).reshape(3, 2, 2),
+                            dims=("trans_date", "symbol", "data"))
+        xarr.to_netcdf(path)
+        try:
+            # the segment of a publisher which died before it was ready
+            shm = shared_memory.SharedMemory(shared_panel_name(path),
+                                             create=True, size=4096)
+            resource_tracker.unregister(shm._name, "shared_memory")
+            shm.close()
+            panel = open_market_panel(path, timeout=0.2)
+            np.testing.assert_array_equal(panel.values, xarr.values)
+            assert not panel.values.flags.writeable
+
+            # the regenerated file is published with a new name, and the
+            # segment of the older version is removed
+            old_names = _shm_names(path)
+            os.utime(path, ns=(0, 0))
+            new_panel = open_market_panel(path)
+            np.testing.assert_array_equal(new_panel.values, xarr.values)
+            if os.path.isdir("/dev/shm"):
+                assert len(old_names) == 1
+                assert _shm_names(path) == {shared_panel_name(path)}
+
+            # the release removes the segments of all versions
+            os.utime(path, ns=(1, 1))
+        finally:
+            assert release_market_panel(path)
+        assert not _shm_names(path)
+        assert not release_market_panel(path)
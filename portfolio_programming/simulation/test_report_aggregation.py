@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from portfolio_programming.simulation.report_aggregation import (
+    REPORT_ORIGINALS, aggregate_report_metrics, spsp_cvar_report_metrics)
+
+
+def _synthetic_report(seed):
+    rs = np.random.RandomState(seed)
+    dates = pd.date_range("2005-01-03", periods=50)
+    wealth = 1e6 * np.cumprod(1 + rs.randn(50, 2) * 0.01, axis=0)
+    report = {attr: rs.rand() for attr in REPORT_ORIGINALS}
+    report['initial_wealth'] = 1e6
+    report['decision_xarr'] = xr.DataArray(
+        wealth[:, :, None], dims=("trans_date", "symbol", "decision"),
+        coords=(dates, ["s1", "s2"], ["wealth"]))
+    report['estimated_risk_xarr'] = xr.DataArray(
+        rs.rand(50, 2), dims=("trans_date", "risk"),
+        coords=(dates, ["CVaR", "VSS"]))
+    return report
+
+
+def _counting_metrics(path, year_count, seed):
+    """ counting the calls in the file next to the report """
+    with open(path + ".count", "a") as fout:
+        fout.write("1")
+    return spsp_cvar_report_metrics(path, year_count, seed)
+
+
+def test_aggregate_report_metrics():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, "cache.sqlite")
+        reports = {}
+        for idx in range(3):
+            name = "report_{}.pkl".format(idx)
+            path = os.path.join(tmp_dir, name)
+            if idx < 2:
+                pd.to_pickle(_synthetic_report(idx), path)
+            reports[name] = (path, (2, idx))
+
+        def count(idx):
+            path = os.path.join(tmp_dir, "report_{}.pkl.count".format(idx))
+            with open(path) as fin:
+                return len(fin.read())
+
+        metrics, missing, failed = aggregate_report_metrics(
+            reports, cache_path, _counting_metrics, n_worker=2)
+        assert sorted(metrics.keys()) == ["report_0.pkl", "report_1.pkl"]
+        assert missing == ["report_2.pkl"]
+        assert not failed
+        assert 0 <= metrics["report_0.pkl"]["SPA_c"] <= 1
+        report = pd.read_pickle(reports["report_0.pkl"][0])
+        np.testing.assert_allclose(metrics["report_0.pkl"]["annual_roi"],
+                                   np.sqrt(report["cum_roi"] + 1) - 1)
+
+        # only the changed report is processed again
+        pd.to_pickle(_synthetic_report(10), reports["report_1.pkl"][0])
+        metrics2, _, _ = aggregate_report_metrics(
+            reports, cache_path, _counting_metrics, n_worker=2)
+        assert (count(0), count(1)) == (1, 2)
+        assert metrics2["report_0.pkl"] == metrics["report_0.pkl"]
+        assert metrics2["report_1.pkl"] != metrics["report_1.pkl"]
+
+        # the SPA p-value of a fixed seed is deterministic
+        assert (spsp_cvar_report_metrics(reports["report_0.pkl"][0], 2, 0) ==
+                metrics["report_0.pkl"])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import tempfile
+
+from portfolio_programming.simulation.report_index import (
+    ReportIndex, report_name_parameters, spsp_cvar_parameters)
+
+
+def test_report_name_parameters():
+    kind, params = report_name_parameters(
+        "report_SPSP_CVaR_compact_TWG1_Mc5_M5_h100_s1000_a0.90_sdx1_"
+        "20050103_20181228.pkl")
+    assert kind == "SPSP_CVaR"
+    assert params == spsp_cvar_parameters(
+        "compact", "TWG1", 5, 5, 100, 1000, 0.9, 1, "20050103", "20181228")
+
+    kind, params = report_name_parameters(
+        "NR_SPSP_CVaR_EG_0.01_TWG1_h100-150-10_a50-70-5_s1000_sdx2_"
+        "20050103_20181228")
+    assert kind == "NR_SPSP_CVaR"
+    assert params['nr_strategy'] == "EG"
+    assert params['nr_strategy_param'] == 0.01
+    assert params['group_name'] == "TWG1"
+    assert params['expert_group_name'] == "h100-150-10_a50-70-5"
+    assert params['scenario_set_idx'] == 2
+
+    assert report_name_parameters("report_BAH_TWG1.pkl") == (None, None)
+
+
+def test_report_index_query():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "index.sqlite")
+        with ReportIndex(db_path) as index:
+            for group in ("TWG1", "USG1"):
+                for h in (50, 100, 150):
+                    for alpha in (0.5, 0.9):
+                        params = spsp_cvar_parameters(
+                            "compact", group, 5, 5, h, 1000, alpha, 1,
+                            "20050103", "20181228")
+                        name = "SPSP_CVaR_compact_{}_h{}_a{:.2f}".format(
+                            group, h, alpha)
+                        index.add(name, "SPSP_CVaR", params,
+                                  {"cum_roi": h * alpha,
+                                   "daily_ex-kurt_roi": 1.})
+            # the derived metrics are merged
+            index.add(name, "SPSP_CVaR", params, {"SPA_c": 0.01})
+            record = index.get(name)
+            assert record['metrics'] == {"cum_roi": 135.,
+                                         "daily_ex-kurt_roi": 1.,
+                                         "SPA_c": 0.01}
+            assert len(index.names("SPSP_CVaR")) == 12
+
+            df = index.query(kind="SPSP_CVaR",
+                             filters={"group_name": "TWG1",
+                                      "rolling_window_size": (">", 50)},
+                             order_by="cum_roi", limit=3)
+            assert list(df['cum_roi']) == [135., 90., 75.]
+
+            df = index.query(filters={"alpha": ("in", [0.5])},
+                             order_by="cum_roi", ascending=True)
+            assert len(df) == 6
+            assert df['cum_roi'].is_monotonic_increasing
+
+            df = index.query(order_by="cum_roi", group_by="group_name",
+                             limit=2)
+            assert list(df['group_name']) == ["TWG1", "TWG1",
+                                              "USG1", "USG1"]
+            assert list(df['cum_roi']) == [135., 90., 135., 90.]
+            assert list(df['rolling_window_size']) == [150, 100, 150, 100]
+            assert (df['daily_ex-kurt_roi'] == 1.).all()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+on-demand scenarios should not depend on the order of the requests.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from portfolio_programming.simulation.hemm_gen_scenarios import (
+    hemm_generating_scenarios_of_dates)
+from portfolio_programming.simulation.scenario_provider import (
+    ScenarioCache, HeMMScenarioProvider)
+
+
+def test_hemm_scenario_provider(n_period=40, n_symbol=3, n_scenario=50,
+                                rolling_window_size=20):
+    symbols = ["s{}".format(idx) for idx in range(n_symbol)]
+    dates = pd.bdate_range('2005-01-03', periods=n_period)
+    rois = xr.DataArray(0.001 + np.random.randn(n_period, n_symbol) * 0.02,
+                        dims=('trans_date', 'symbol'),
+                        coords=(dates, symbols))
+
+    sc_dates = dates[rolling_window_size - 1:]
+    scenarios = np.asarray([
+        hemm_generating_scenarios_of_dates(
+            rois.values[tdx: tdx + rolling_window_size], sc_dates[tdx:tdx + 1],
+            symbols, rolling_window_size, n_scenario, 1)[0]
+        for tdx in range(len(sc_dates))])
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        provider = HeMMScenarioProvider("TWG1", rois, n_scenario, 1,
+                                        cache_size=4, cache_dir=cache_dir)
+        # reversed requests
+        for tdx in range(len(sc_dates) - 1, -1, -1):
+            xarr = provider.get_scenarios(rolling_window_size, sc_dates[tdx])
+            assert xarr.shape == (n_symbol, n_scenario)
+            np.testing.assert_array_equal(xarr.values, scenarios[tdx])
+        assert len(provider.cache) == 4
+        assert provider.cache.n_miss == len(sc_dates)
+
+        # the new provider reuses the scenarios on disk
+        provider = HeMMScenarioProvider("TWG1", rois, n_scenario, 1,
+                                        cache_size=4, cache_dir=cache_dir)
+        xarr = provider.get_scenarios(rolling_window_size, sc_dates[0])
+        np.testing.assert_array_equal(xarr.values, scenarios[0])
+        assert provider.cache.n_hit == 1
+
+
+def test_scenario_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ScenarioCache(2, cache_dir, max_disk_size=3)
+        for idx in range(4):
+            cache.put("k{}".format(idx), np.full(2, idx))
+        assert list(cache.memory.keys()) == ["k2", "k3"]
+        assert "k0" not in cache
+        np.testing.assert_array_equal(cache.get("k1"), np.full(2, 1))
+        assert list(cache.memory.keys()) == ["k3", "k1"]
+        assert cache.get("k0") is None
+
+        # a file truncated or removed by other process is a cache miss
+        with open(os.path.join(cache_dir, "k2.npy"), "wb") as fout:
+            fout.write(b"\x93NUMPY")
+        os.remove(os.path.join(cache_dir, "k3.npy"))
+        cache = ScenarioCache(2, cache_dir)
+        assert cache.get("k2") is None
+        assert cache.get("k3") is None
+        assert cache.n_miss == 2
+        assert "k2" not in cache
+        assert not [f for f in os.listdir(cache_dir) if f.endswith(".tmp")]
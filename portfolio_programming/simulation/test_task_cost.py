@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from portfolio_programming.simulation.catalog import (Catalog, REPORT)
+from portfolio_programming.simulation.task_cost import (
+    report_name_features, TaskCostModel, recorded_costs, order_by_cost)
+from portfolio_programming.simulation.task_server import TaskQueue
+
+NAME_FORMAT = ("report_SPSP_CVaR_{}_TWG1_Mc5_M5_h{}_s1000_a0.50_sdx1_"
+               "{}_{}.pkl")
+
+
+def _secs(setting, h, n_day):
+    return (20. if setting == "general" else 2.) * h * n_day / 1e4
+
+
+def test_task_cost_model():
+    kind, features = report_name_features(NAME_FORMAT.format(
+        "general", 50, "20050103", "20051230"))
+    assert kind == "SPSP_CVaR_general"
+    assert features == {"n_day": 361, "n_symbol": 5,
+                        "rolling_window_size": 50, "n_scenario": 1000}
+    assert report_name_features(
+        "report_NR_SPSP_CVaR_EG_0.01_TWG1_TWG1_h140-200-10_a85-95-5_s1000"
+        "_sdx1_20050103_20181228.pkl")[0] == "NR_SPSP_CVaR"
+    assert report_name_features("unknown.pkl") == (None, None)
+
+    years = [("20050103", "20051230"), ("20050103", "20181228")]
+    costs = {}
+    for setting in ("compact", "general"):
+        for h in (50, 100, 200):
+            for start, end in years:
+                name = NAME_FORMAT.format(setting, h, start, end)
+                n_day = report_name_features(name)[1]["n_day"]
+                costs[name] = _secs(setting, h, n_day)
+
+    model = TaskCostModel(ridge=1e-6).fit(costs)
+    assert model.n_record == len(costs)
+    expected = model.predict(costs.keys())
+    for name, sec in costs.items():
+        np.testing.assert_allclose(expected[name], sec, rtol=1e-2)
+
+    # the longest task is the general whole-interval run of h240
+    tasks = {NAME_FORMAT.format(setting, h, start, end): (setting, h)
+             for setting in ("compact", "general") for h in (60, 240)
+             for start, end in years}
+    ordered, expected = order_by_cost(tasks, costs)
+    assert list(ordered.values())[0] == ("general", 240)
+    assert list(ordered.values())[-1] == ("compact", 60)
+    secs = [expected[name] for name in ordered]
+    assert secs == sorted(secs, reverse=True)
+
+    # the prior ordering without any record
+    ordered, _ = order_by_cost(tasks, {})
+    assert list(ordered.values())[0] == ("general", 240)
+    assert list(ordered.values())[-1] == ("compact", 60)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with TaskQueue(os.path.join(tmp_dir, "queue.sqlite")) as queue:
+            queue.add(tasks, expected)
+            assert queue.lease("w1")[1] == list(ordered.values())[0]
+
+
+def test_recorded_costs():
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        names = [NAME_FORMAT.format("compact", h, "20050103", "20051230")
+                 for h in (50, 60)]
+        for name, sec in zip(names, (1., 2.)):
+            pd.to_pickle({"simulation_time": sec},
+                         os.path.join(tmp_dir, name))
+
+        with Catalog(os.path.join(tmp_dir, "catalog.sqlite")) as catalog:
+            catalog.register(REPORT, os.path.join(tmp_dir, names[0]),
+                             {"simulation_name": names[0][7:-4],
+                              "simulation_time": 1.})
+            catalog.register(REPORT, os.path.join(tmp_dir, names[1]),
+                             names[1][7:-4])
+            assert recorded_costs(catalog) == {names[0]: 1.}
+            assert recorded_costs(catalog, [tmp_dir]) == {names[0]: 1.,
+                                                          names[1]: 2.}
+            # the scanned time is saved in the catalog
+            assert recorded_costs(catalog) == {names[0]: 1., names[1]: 2.}
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import os
+import socket
+import tempfile
+import threading
+
+from portfolio_programming.simulation.task_server import (
+    TaskQueue, serve_tasks, run_task_client, PENDING, LEASED, DONE, FAILED)
+
+
+def test_task_queue_lease():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "queue.sqlite")
+        with TaskQueue(path, lease_secs=10., max_attempt=2) as queue:
+            assert queue.add({"a": (1,), "b": (2,)}) == 2
+            assert queue.lease("w1", now=0.) == ("a", (1,))
+            assert queue.lease("w2", now=1.) == ("b", (2,))
+            assert queue.lease("w3", now=2.) is None
+
+            # the heartbeat of w1 keeps its lease, that of w2 expires
+            assert queue.heartbeat("a", "w1", now=8.)
+            assert not queue.heartbeat("a", "w2", now=8.)
+            assert queue.lease("w3", now=12.) == ("b", (2,))
+            assert not queue.heartbeat("b", "w2", now=12.)
+            assert queue.complete("a", "w1", now=13.)
+
+        # the state survives the restart, the leased task is kept, and the
+        # done task which is unfinished again is requeued
+        with TaskQueue(path, lease_secs=10., max_attempt=2) as queue:
+            assert queue.add({"c": (3,)}) == 1
+            assert queue.counts() == {PENDING: 1, LEASED: 1, DONE: 1,
+                                      FAILED: 0}
+            assert queue.add({"a": (1,), "b": (2,), "c": (3,)}) == 1
+            assert queue.counts() == {PENDING: 2, LEASED: 1, DONE: 0,
+                                      FAILED: 0}
+            assert queue.fail("b", "w3", "error", now=14.)
+            assert queue.counts()[FAILED] == 1
+            assert queue.failed() == {"b": "error"}
+
+            # the failed task is requeued with a new attempt count
+            assert queue.add({"b": (2,)}) == 1
+            assert queue.failed() == {}
+            assert [queue.lease("w4", now=15.) for _ in range(4)] == [
+                ("a", (1,)), ("b", (2,)), ("c", (3,)), None]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_serve_tasks():
+    port = _free_port()
+    results = []
+
+    def task(value):
+        if value < 0:
+            raise ValueError("negative value")
+        results.append(value)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "queue.sqlite")
+        with TaskQueue(path) as queue:
+            queue.add({"t{}".format(v): (v,) for v in (1, 2, -1)})
+            # a lease of a dead client
+            queue.lease("dead", now=-1e6)
+
+        def server():
+            with TaskQueue(path, lease_secs=5., max_attempt=2) as queue:
+                serve_tasks(queue, "tcp://127.0.0.1:{}".format(port),
+                            poll_secs=0.1, wait_secs=0.5)
+
+        server_thread = threading.Thread(target=server)
+        server_thread.start()
+        n_finished = run_task_client(task, "127.0.0.1", port,
+                                     heartbeat_secs=0.1,
+                                     max_reconnect_count=2,
+                                     reconnect_secs=0.1)
+        server_thread.join(30)
+        assert not server_thread.is_alive()
+
+        assert n_finished == 2
+        assert sorted(results) == [1, 2]
+        with TaskQueue(path) as queue:
+            assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: 2,
+                                      FAILED: 1}
+            assert "negative value" in queue.failed()["t-1"]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+the running accumulators of the exponential forecasters should give the
+same weights as the formulas over the whole history.
+"""
+
+import numpy as np
+import pytest
+
+from portfolio_programming.simulation.wp_eg import (
+    EGAdaptivePortfolio, ExpPortfolio, ExpAdaptivePortfolio, NIRExpPortfolio)
+
+
+def eg_adaptive_history_weights(obj, tdx):
+    yesterday = obj.exp_trans_dates[tdx - 1]
+    today = obj.exp_trans_dates[tdx]
+    low = np.min(obj.exp_rois.loc[:today, obj.symbols]) + 1
+    high = np.max(obj.exp_rois.loc[:today, obj.symbols]) + 1
+    eta = float(low / high) * np.sqrt(8 * np.log(obj.n_symbol) / tdx)
+    prev_weights = obj.decision_xarr.loc[yesterday, obj.symbols,
+                                         'weight'].values
+    price_relatives = obj.exp_rois.loc[today, obj.symbols].values + 1
+    new_weights = prev_weights * np.exp(
+        eta * price_relatives / prev_weights.dot(price_relatives))
+    return new_weights / new_weights.sum()
+
+
+def exp_history_weights(obj, tdx):
+    today = obj.exp_trans_dates[tdx]
+    stock_payoffs = obj.exp_rois.loc[:today, obj.symbols].sum(axis=0)
+    new_weights = np.exp(obj.eta * stock_payoffs.values)
+    return new_weights / new_weights.sum()
+
+
+def exp_adaptive_history_weights(obj, tdx):
+    today = obj.exp_trans_dates[tdx]
+    beta = np.max(obj.exp_rois.loc[:today, obj.symbols])
+    eta = 1 / float(beta) * np.sqrt(8 * np.log(obj.n_symbol) / tdx)
+    stock_payoffs = obj.exp_rois.loc[:today, obj.symbols].sum(axis=0)
+    new_weights = np.exp(eta * stock_payoffs.values)
+    return new_weights / new_weights.sum()
+
+
+def nir_exp_history_weights(obj, tdx):
+    today = obj.exp_trans_dates[tdx]
+    # shape: n_virtual_expert
+    virtual_cum_payoffs = np.log(
+        obj.virtual_expert_decision_xarr.loc[
+            :today, obj.virtual_experts, obj.symbols,
+            'portfolio_payoff'].sum(axis=2)
+    ).sum(axis=0).values
+    new_weights = np.exp(obj.eta * virtual_cum_payoffs)
+    S = obj.column_stochastic_matrix(obj.n_symbol,
+                                     new_weights / new_weights.sum())
+    eigs, eigvs = np.linalg.eig(S)
+    one_index = eigs.argmax()
+    return (eigvs[:, one_index] / eigvs[:, one_index].sum()).real
+
+
+@pytest.mark.parametrize("pf_class, params, history_weights", [
+    (EGAdaptivePortfolio, (), eg_adaptive_history_weights),
+    (ExpPortfolio, (0.1,), exp_history_weights),
+    (ExpAdaptivePortfolio, (), exp_adaptive_history_weights),
+    (NIRExpPortfolio, (0.1,), nir_exp_history_weights),
+])
+def test_accumulators(synthetic_backtest, pf_class, params,
+                      history_weights):
+    obj = synthetic_backtest(pf_class, params)
+    for tdx in range(1, obj.n_exp_period):
+        today = obj.exp_trans_dates[tdx]
+        np.testing.assert_array_almost_equal(
+            obj.decision_xarr.loc[today, obj.symbols, 'weight'].values,
+            history_weights(obj, tdx))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+streaming weight portfolios should reproduce the weights of the backtests.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from portfolio_programming.simulation.wp_bah import BAHPortfolio
+from portfolio_programming.simulation.wp_eg import (
+    EGPortfolio, EGAdaptivePortfolio, ExpPortfolio, ExpAdaptivePortfolio,
+    NIRExpPortfolio)
+from portfolio_programming.simulation.wp_poly import (
+    PolynomialPortfolio, NIRPolynomialPortfolio)
+from portfolio_programming.simulation.wp_ons import ONSPortfolio
+from portfolio_programming.simulation.wp_online import (
+    OnlineBAHPortfolio, OnlineEGPortfolio, OnlineEGAdaptivePortfolio,
+    OnlineExpPortfolio, OnlineExpAdaptivePortfolio,
+    OnlinePolynomialPortfolio, OnlineNIRExpPortfolio,
+    OnlineNIRPolynomialPortfolio, OnlineONSPortfolio, load_online_portfolio)
+
+
+@pytest.mark.parametrize("pf_class, params, online_class, online_params", [
+    (BAHPortfolio, (), OnlineBAHPortfolio, {}),
+    (EGPortfolio, (0.1,), OnlineEGPortfolio, {'eta': 0.1}),
+    (EGAdaptivePortfolio, (), OnlineEGAdaptivePortfolio, {}),
+    (ExpPortfolio, (0.1,), OnlineExpPortfolio, {'eta': 0.1}),
+    (ExpAdaptivePortfolio, (), OnlineExpAdaptivePortfolio, {}),
+    (PolynomialPortfolio, (2,), OnlinePolynomialPortfolio,
+     {'poly_power': 2}),
+    (NIRExpPortfolio, (0.1,), OnlineNIRExpPortfolio, {'eta': 0.1}),
+    (NIRPolynomialPortfolio, (2,), OnlineNIRPolynomialPortfolio,
+     {'poly_power': 2}),
+    (ONSPortfolio, (1., 0.125), OnlineONSPortfolio,
+     {'beta': 1., 'delta': 0.125}),
+])
+def test_online_weight_portfolios(synthetic_backtest, pf_class, params,
+                                  online_class, online_params, n_period=60):
+    obj = synthetic_backtest(pf_class, params, n_period)
+    weights = obj.decision_xarr.loc[:, obj.symbols, 'weight'].values
+    price_relatives = obj.exp_rois.loc[:, obj.symbols].values + 1
+
+    online = online_class(obj.n_symbol, **online_params)
+    half = n_period // 2
+    online_weights = [online.step(x) for x in price_relatives[:half]]
+
+    # the state is json-serializable and restorable
+    state = json.loads(json.dumps(online.get_state()))
+    online = load_online_portfolio(state)
+    online_weights.extend(online.step(x) for x in price_relatives[half:])
+
+    np.testing.assert_array_almost_equal(
+        weights, np.asarray(online_weights), 8,
+        err_msg=online_class.strategy)
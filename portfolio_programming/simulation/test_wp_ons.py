@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+running state and simplex projection of online Newton step
+"""
+
+import numpy as np
+import scipy.optimize as spopt
+
+from portfolio_programming.simulation.wp_ons import (
+    simplex_projection, quadratic_simplex_projection, IncrementalONS)
+
+
+def slsqp_projection(weights, quad_matrix):
+    """ the original projection by sequential least squares programming """
+
+    def objective(x):
+        return np.dot(np.dot(weights - x, quad_matrix), weights - x)
+
+    return spopt.fmin_slsqp(objective, weights,
+                            eqcons=[lambda x: x.sum() - 1, ],
+                            bounds=[(0, 1) for _ in range(len(weights))],
+                            disp=False, acc=1e-12)
+
+
+def test_simplex_projection(n_symbol=10, n_test=100):
+    for _ in range(n_test):
+        weights = np.random.randn(n_symbol)
+        proj = simplex_projection(weights)
+        np.testing.assert_almost_equal(proj.sum(), 1)
+        assert proj.min() >= 0
+        np.testing.assert_array_almost_equal(
+            proj, slsqp_projection(weights, np.identity(n_symbol)), 5)
+
+
+def test_quadratic_simplex_projection(n_symbol=5, n_test=100):
+    for _ in range(n_test):
+        grads = np.random.rand(20, n_symbol) + 0.5
+        a_mtx = np.identity(n_symbol) + grads.T.dot(grads)
+        weights = np.random.randn(n_symbol)
+
+        proj = quadratic_simplex_projection(weights, a_mtx,
+                                            np.linalg.inv(a_mtx))
+        np.testing.assert_almost_equal(proj.sum(), 1)
+        assert proj.min() >= 0
+
+        sp_proj = slsqp_projection(weights, a_mtx)
+        obj = np.dot(np.dot(weights - proj, a_mtx), weights - proj)
+        sp_obj = np.dot(np.dot(weights - sp_proj, a_mtx), weights - sp_proj)
+        assert obj <= sp_obj * (1 + 1e-6)
+
+
+def test_incremental_ons(n_symbol=5, n_period=200, beta=1., delta=0.125):
+    ons = IncrementalONS(n_symbol, beta, delta)
+    grads = 1 + np.random.randn(n_period, n_symbol) * 0.02
+    for grad in grads:
+        ons.update(grad)
+
+    a_mtx = np.identity(n_symbol) + grads.T.dot(grads)
+    np.testing.assert_array_almost_equal(ons.grad_sum, grads.sum(axis=0))
+    np.testing.assert_array_almost_equal(ons.a_mtx, a_mtx)
+    np.testing.assert_array_almost_equal(ons.a_inv.dot(a_mtx),
+                                         np.identity(n_symbol))
+
+    weights = ons.get_weights()
+    np.testing.assert_almost_equal(weights.sum(), 1)
+    assert weights.min() >= 0
+
+
+if __name__ == '__main__':
+    test_simplex_projection()
+    test_quadratic_simplex_projection()
+    test_incremental_ons()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+the running cumulative regrets of the polynomial aggregators should give
+the same weights as the formulas over the whole history.
+"""
+
+import numpy as np
+import pytest
+
+from portfolio_programming.simulation.wp_poly import (
+    PolynomialPortfolio, NIRPolynomialPortfolio)
+
+
+def poly_history_weights(obj, tdx):
+    today = obj.exp_trans_dates[tdx]
+    # shape: tdx
+    portfolio_payoffs = np.log(obj.decision_xarr.loc[
+        :today, obj.symbols, 'portfolio_payoff'].sum(axis=1))
+    # shape: tdx * n_symbol
+    stock_payoffs = obj.exp_rois.loc[:today, obj.symbols]
+    diff = (stock_payoffs - portfolio_payoffs).sum(axis=0).values
+    new_weights = np.power(np.maximum(diff, 0), obj.poly_power - 1)
+    return new_weights / new_weights.sum()
+
+
+def nir_poly_history_weights(obj, tdx):
+    today = obj.exp_trans_dates[tdx]
+    # shape: tdx
+    portfolio_payoffs = np.log(obj.decision_xarr.loc[
+        :today, obj.symbols, 'portfolio_payoff'].sum(axis=1))
+    # shape: tdx * n_virtual_expert
+    virtual_payoffs = np.log(obj.virtual_expert_decision_xarr.loc[
+        :today, obj.virtual_experts, obj.symbols,
+        'portfolio_payoff'].sum(axis=2))
+    diff = (virtual_payoffs - portfolio_payoffs).sum(axis=0).values
+    new_weights = np.power(np.maximum(diff, 0), obj.poly_power - 1)
+    S = obj.column_stochastic_matrix(obj.n_symbol,
+                                     new_weights / new_weights.sum())
+    eigs, eigvs = np.linalg.eig(S)
+    one_index = eigs.argmax()
+    return (eigvs[:, one_index] / eigvs[:, one_index].sum()).real
+
+
+@pytest.mark.parametrize("pf_class, history_weights", [
+    (PolynomialPortfolio, poly_history_weights),
+    (NIRPolynomialPortfolio, nir_poly_history_weights),
+])
+def test_accumulators(synthetic_backtest, pf_class, history_weights):
+    obj = synthetic_backtest(pf_class, (2,))
+    for tdx in range(1, obj.n_exp_period):
+        today = obj.exp_trans_dates[tdx]
+        np.testing.assert_array_almost_equal(
+            obj.decision_xarr.loc[today, obj.symbols, 'weight'].values,
+            history_weights(obj, tdx))
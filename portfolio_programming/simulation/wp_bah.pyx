@@ -22,12 +22,13 @@ class BAHPortfolio(WeightPortfolio):
                  double sell_trans_fee=pp.SELL_TRANS_FEE,
                  start_date=pp.EXP_START_DATE,
                  end_date=pp.EXP_END_DATE,
-                 int print_interval=10):
+                 int print_interval=10,
+                 report_dir=pp.WEIGHT_PORTFOLIO_REPORT_DIR):
         super(BAHPortfolio, self).__init__(
             group_name, symbols, risk_rois, initial_weights,
             initial_wealth, buy_trans_fee,
             sell_trans_fee, start_date,
-            end_date, print_interval)
+            end_date, print_interval, report_dir)
 
     def get_simulation_name(self, *args, **kwargs):
         return "BAH_{}_{}_{}".format(
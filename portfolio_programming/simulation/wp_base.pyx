@@ -503,4 +503,25 @@ class NIRUtility(object):
 
         # column stochastic matrix
         S = A.T / np.max(np.abs(A)) + np.identity(n_action)
-        return S
\ No newline at end of file
+        return S
+
+    @classmethod
+    def stationary_weights(cls, n_action, virtual_expert_weights):
+        """
+        the stationary distribution of the column stochastic matrix
+
+        Parameters:
+        ------------
+        n_action: int, number of actions
+        virtual_expert_weights: array like,
+            shape: n_action * (n_action-1)
+
+        Returns:
+        -------------
+        numpy.array, shape: n_action
+        """
+        S = cls.column_stochastic_matrix(n_action, virtual_expert_weights)
+        eigs, eigvs = np.linalg.eig(S)
+        # the largest eigvenvalue is 1, and its eigenvector is real
+        one_index = eigs.argmax()
+        return (eigvs[:, one_index] / eigvs[:, one_index].sum()).real
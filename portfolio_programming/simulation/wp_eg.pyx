@@ -53,6 +53,27 @@ class EGPortfolio(WeightPortfolio):
         reports['eta'] = self.eta
         return reports
 
+    @staticmethod
+    def eg_weights(prev_weights, price_relatives, eta):
+        """
+        multiplicative update of the weights, it is shared with the
+        streaming portfolios.
+
+        Parameters:
+        -------------
+        prev_weights: numpy.array, shape: n_symbol
+        price_relatives: numpy.array, shape: n_symbol
+        eta: float, learning rate
+
+        Returns:
+        -------------
+        numpy.array, shape: n_symbol
+        """
+        today_prev_weights_sum = prev_weights.dot(price_relatives)
+        new_weights = prev_weights * np.exp(eta * price_relatives /
+                                            today_prev_weights_sum)
+        return new_weights / new_weights.sum()
+
     def get_today_weights(self, *args, **kwargs):
         """
         remaining the same weight as the today_prev_weights
@@ -65,16 +86,11 @@ class EGPortfolio(WeightPortfolio):
         today_prev_portfolio_wealth=today_prev_portfolio_wealth
         """
         yesterday = kwargs['prev_trans_date']
-        today = kwargs['trans_date']
-        today_price_relative = kwargs['today_price_relative']
+        today_price_relative = kwargs['today_price_relative'].values
 
         prev_weights = self.decision_xarr.loc[
-            yesterday, self.symbols, 'weight']
-        today_prev_weights_sum = (prev_weights * today_price_relative).sum()
-        new_weights = (prev_weights * np.exp(self.eta * today_price_relative /
-                                             today_prev_weights_sum))
-        normalized_new_weights = new_weights / new_weights.sum()
-        return normalized_new_weights
+            yesterday, self.symbols, 'weight'].values
+        return self.eg_weights(prev_weights, today_price_relative, self.eta)
 
 
 class EGAdaptivePortfolio(WeightPortfolio):
@@ -115,6 +131,10 @@ class EGAdaptivePortfolio(WeightPortfolio):
         self.beta = beta
         self.log_m = np.log(self.n_symbol)
 
+        # running extrema of the historical rois
+        self.roi_low = None
+        self.roi_high = None
+
     def get_simulation_name(self, *args, **kwargs):
         if not self.beta:
             return "EG_Adaptive_{}_{}_{}".format(
@@ -136,6 +156,37 @@ class EGAdaptivePortfolio(WeightPortfolio):
         reports['adaptive_eta'] = self.etas
         return reports
 
+    @staticmethod
+    def adaptive_eta(roi_low, roi_high, log_m, tdx, beta=None):
+        """
+        learning rate by the running extrema of the rois
+
+        Parameters:
+        -------------
+        roi_low, roi_high: float, running extrema of the historical rois
+        log_m: float, log of the number of symbols
+        tdx: positive integer, index of today
+        beta: float, optional, the ratio of the lower and upper bounds of
+            the price relatives, estimated by the extrema by default.
+
+        Returns:
+        -------------
+        float
+        """
+        if not beta:
+            # lower bound of historical price relative
+            beta = (roi_low + 1) / (roi_high + 1)
+        return beta * np.sqrt(8 * log_m / tdx)
+
+    def pre_trading_operation(self, *args, **kargs):
+        """
+        initial extrema of the rois
+        """
+        start_rois = self.exp_rois.loc[self.exp_start_date,
+                                       self.symbols].values
+        self.roi_low = start_rois.min()
+        self.roi_high = start_rois.max()
+
     def get_today_weights(self, *args, **kwargs):
         """
         remaining the same weight as the today_prev_weights
@@ -152,23 +203,17 @@ class EGAdaptivePortfolio(WeightPortfolio):
         tdx = kwargs['tdx']
 
         prev_weights = self.decision_xarr.loc[
-            yesterday, self.symbols, 'weight']
-        # lower bound of historical price relative
-        if not self.beta:
-            low = np.min(self.exp_rois.loc[:today, self.symbols]) + 1
-            high = np.max(self.exp_rois.loc[:today, self.symbols]) + 1
-            beta = low / high
-        else:
-            beta = self.beta
-        self.etas.loc[today] = beta * np.sqrt(8 * self.log_m / tdx)
-
-        price_relatives = self.exp_rois.loc[today, self.symbols] + 1
-        today_prev_weights_sum = (prev_weights * price_relatives).sum()
-        new_weights = (prev_weights * np.exp(self.etas.loc[today] *
-                                             price_relatives /
-                                             today_prev_weights_sum))
-        normalized_new_weights = new_weights / new_weights.sum()
-        return normalized_new_weights
+            yesterday, self.symbols, 'weight'].values
+
+        # update running extrema of the rois
+        today_rois = self.exp_rois.loc[today, self.symbols].values
+        self.roi_low = min(self.roi_low, today_rois.min())
+        self.roi_high = max(self.roi_high, today_rois.max())
+
+        eta = self.adaptive_eta(self.roi_low, self.roi_high, self.log_m,
+                                tdx, self.beta)
+        self.etas.loc[today] = eta
+        return EGPortfolio.eg_weights(prev_weights, today_rois + 1, eta)
 
 
 class ExpPortfolio(WeightPortfolio):
@@ -197,6 +242,9 @@ class ExpPortfolio(WeightPortfolio):
         # learning rate
         self.eta = eta
 
+        # cumulative payoffs of the stocks, shape: n_symbol
+        self.cum_stock_payoffs = None
+
     def get_simulation_name(self, *args, **kwargs):
         return "Exp_{:.2f}_{}_{}_{}".format(
             self.eta,
@@ -209,6 +257,31 @@ class ExpPortfolio(WeightPortfolio):
         reports['eta'] = self.eta
         return reports
 
+    @staticmethod
+    def exp_weights(cum_payoffs, eta):
+        """
+        exponential weights of the cumulative payoffs, it is shared with the
+        streaming portfolios.
+
+        Parameters:
+        -------------
+        cum_payoffs: numpy.array, shape: n_expert
+        eta: float, learning rate
+
+        Returns:
+        -------------
+        numpy.array, shape: n_expert
+        """
+        new_weights = np.exp(eta * cum_payoffs)
+        return new_weights / new_weights.sum()
+
+    def pre_trading_operation(self, *args, **kargs):
+        """
+        initial cumulative payoffs of the stocks
+        """
+        self.cum_stock_payoffs = self.exp_rois.loc[
+            self.exp_start_date, self.symbols].values.copy()
+
     def get_today_weights(self, *args, **kwargs):
         """
         remaining the same weight as the today_prev_weights
@@ -225,11 +298,8 @@ class ExpPortfolio(WeightPortfolio):
         # shape:  n_symbol
         # does not need take log operation because
         # log(price relative) = simple roi
-        stock_payoffs = (self.exp_rois.loc[:today, self.symbols]).sum(axis=0)
-        new_weights = np.exp(self.eta * stock_payoffs)
-        normalized_new_weights = new_weights / new_weights.sum()
-
-        return normalized_new_weights
+        self.cum_stock_payoffs += self.exp_rois.loc[today, self.symbols].values
+        return self.exp_weights(self.cum_stock_payoffs, self.eta)
 
 
 class ExpAdaptivePortfolio(WeightPortfolio):
@@ -265,6 +335,10 @@ class ExpAdaptivePortfolio(WeightPortfolio):
         self.beta = beta
         self.log_m = np.log(self.n_symbol)
 
+        # cumulative payoffs and running maximum of the stocks' rois
+        self.cum_stock_payoffs = None
+        self.roi_high = None
+
     def get_simulation_name(self, *args, **kwargs):
         if not self.beta:
             return "Exp_Adaptive_{}_{}_{}".format(
@@ -286,6 +360,36 @@ class ExpAdaptivePortfolio(WeightPortfolio):
         reports['adaptive_eta'] = self.etas
         return reports
 
+    @staticmethod
+    def adaptive_eta(roi_high, log_m, tdx, beta=None):
+        """
+        learning rate by the running maximum of the rois
+
+        Parameters:
+        -------------
+        roi_high: float, running maximum of the historical rois
+        log_m: float, log of the number of symbols
+        tdx: positive integer, index of today
+        beta: float, optional, the range of the payoffs, estimated by the
+            maximum by default.
+
+        Returns:
+        -------------
+        float
+        """
+        if not beta:
+            beta = roi_high
+        return 1 / beta * np.sqrt(8 * log_m / tdx)
+
+    def pre_trading_operation(self, *args, **kargs):
+        """
+        initial cumulative payoffs and maximum of the rois
+        """
+        start_rois = self.exp_rois.loc[self.exp_start_date,
+                                       self.symbols].values
+        self.cum_stock_payoffs = start_rois.copy()
+        self.roi_high = start_rois.max()
+
     def get_today_weights(self, *args, **kwargs):
         """
         remaining the same weight as the today_prev_weights
@@ -301,20 +405,18 @@ class ExpAdaptivePortfolio(WeightPortfolio):
         today = kwargs['trans_date']
         tdx = kwargs['tdx']
 
-        if not self.beta:
-            beta = np.max(self.exp_rois.loc[:today, self.symbols])
-        else:
-            beta = self.beta
-        self.etas.loc[today] = 1 / beta * np.sqrt(8 * self.log_m / tdx)
+        # update running states of the rois
+        today_rois = self.exp_rois.loc[today, self.symbols].values
+        self.cum_stock_payoffs += today_rois
+        self.roi_high = max(self.roi_high, today_rois.max())
+
+        eta = self.adaptive_eta(self.roi_high, self.log_m, tdx, self.beta)
+        self.etas.loc[today] = eta
 
         # shape:  n_symbol
         # does not need take log operation because
         # log(price relative) = simple roi
-        stock_payoffs = (self.exp_rois.loc[:today, self.symbols]).sum(axis=0)
-        new_weights = np.exp(self.etas.loc[today] * stock_payoffs)
-        normalized_new_weights = new_weights / new_weights.sum()
-
-        return normalized_new_weights
+        return ExpPortfolio.exp_weights(self.cum_stock_payoffs, eta)
 
 
 class NIRExpPortfolio(WeightPortfolio, NIRUtility):
@@ -366,6 +468,10 @@ class NIRExpPortfolio(WeightPortfolio, NIRUtility):
             )
         )
 
+        # cumulative log payoffs of virtual experts,
+        # shape: n_virtual_expert
+        self.virtual_cum_payoffs = None
+
     def get_simulation_name(self, *args, **kwargs):
         return "NIRExp_{:.2f}_{}_{}_{}".format(
             self.eta,
@@ -392,13 +498,14 @@ class NIRExpPortfolio(WeightPortfolio, NIRUtility):
         ] = self.modified_probabilities(self.initial_weights)
 
         # the portfolio payoff of first decision
+        init_payoffs = self.modified_probabilities(self.initial_weights)
         self.virtual_expert_decision_xarr.loc[
             today,
             self.virtual_experts,
             self.symbols,
             'portfolio_payoff'
-        ] = self.modified_probabilities(self.initial_weights)
-
+        ] = init_payoffs
+        self.virtual_cum_payoffs = np.log(init_payoffs.sum(axis=1))
 
     def get_today_weights(self, *args, **kwargs):
         """
@@ -417,36 +524,25 @@ class NIRExpPortfolio(WeightPortfolio, NIRUtility):
 
         # record virtual experts' payoff,
         # shape: n_virtual_expert, n_symbol
-        self.virtual_expert_decision_xarr.loc[
-            today, self.virtual_experts, self.symbols, 'portfolio_payoff'] = (
+        virtual_payoffs = (
             self.virtual_expert_decision_xarr.loc[
-                yesterday, self.virtual_experts, self.symbols, 'weight']  *
-            today_price_relative
+                yesterday, self.virtual_experts, self.symbols,
+                'weight'].values *
+            today_price_relative.values
         )
+        self.virtual_expert_decision_xarr.loc[
+            today, self.virtual_experts, self.symbols, 'portfolio_payoff'] = (
+            virtual_payoffs)
 
         # cumulative returns of all virtual experts
-        # first sum: shape: tdx * n_virtual_expert
-        # second sum: shape: n_virtual_expert
-        virtual_cum_payoffs = np.log(
-            self.virtual_expert_decision_xarr.loc[
-                :today,self.virtual_experts,
-            self.symbols, 'portfolio_payoff'].sum(axis=2)
-        ).sum(axis=0)
-
-        # exponential predictors
-        new_weights = np.exp(self.eta * virtual_cum_payoffs)
+        # shape: n_virtual_expert
+        self.virtual_cum_payoffs += np.log(virtual_payoffs.sum(axis=1))
 
         # normalized weights of virtual experts
-        virtual_expert_weights = new_weights / new_weights.sum()
-
-        # build column stochastic matrix to get weights of today
-        S = self.column_stochastic_matrix(self.n_symbol,
-                                           virtual_expert_weights.values)
-        eigs, eigvs = np.linalg.eig(S)
-        # the largest eigvenvalue is 1
-        one_index = eigs.argmax()
-        normalized_new_weights = (eigvs[:,  one_index] /
-                                  eigvs[:, one_index].sum()).astype(np.float64)
+        virtual_expert_weights = ExpPortfolio.exp_weights(
+            self.virtual_cum_payoffs, self.eta)
+        normalized_new_weights = self.stationary_weights(
+            self.n_symbol, virtual_expert_weights)
 
         # record modified strategies of today
         self.virtual_expert_decision_xarr.loc[
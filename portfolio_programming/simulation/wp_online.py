@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+Author: Hung-Hsin Chen <chen1116@gmail.com>
+
+streaming (online) mode of the weight portfolios.
+
+The backtest classes in wp_bah, wp_eg, wp_poly and wp_ons need the whole
+risk_rois panel in advance. The classes here receive the price relatives
+of one period at a time and return the weights to hold in the next period.
+The running state is compact (O(n_symbol^2) at most), and it can be dumped
+to or loaded from a json-serializable dict.
+
+The per-step updates are the static kernels of the backtest classes, so
+both modes share the same formulas.
+
+The first call of step() corresponds to the first trading day of the
+backtest: the state is initialized with the price relatives of the day,
+and the initial weights are returned. Feeding the same price relatives
+gives the same weights as the backtest classes.
+
+Example:
+----------
+    >>> pf = OnlineEGPortfolio(n_symbol=5, eta=0.05)
+    >>> for price_relatives in stream:
+    ...     weights = pf.step(price_relatives)
+    >>> state = pf.get_state()
+    >>> pf = load_online_portfolio(state)
+"""
+
+import numpy as np
+
+from portfolio_programming.simulation.wp_base import NIRUtility
+from portfolio_programming.simulation.wp_eg import (
+    EGPortfolio, EGAdaptivePortfolio, ExpPortfolio, ExpAdaptivePortfolio)
+from portfolio_programming.simulation.wp_ons import (IncrementalONS,
+                                                     ONSPortfolio)
+from portfolio_programming.simulation.wp_poly import PolynomialPortfolio
+
+
+class OnlineWeightPortfolio(object):
+    """
+    basic streaming flow of the weight portfolio
+    """
+    # name of the strategy, it is the key of ONLINE_PORTFOLIOS
+    strategy = None
+    # names of the parameters of the strategy
+    param_names = ()
+    # names of the array attributes of the running state
+    state_names = ()
+
+    def __init__(self, n_symbol, initial_weights=None, **params):
+        """
+        Parameters:
+        -------------
+        n_symbol: positive integer
+        initial_weights: array like, shape: (n_symbol,), optional
+            uniform weights by default.
+        params: parameters of the strategy
+        """
+        if n_symbol <= 0:
+            raise ValueError("The n_symbol's value {} should be "
+                             "positive.".format(n_symbol))
+        self.n_symbol = int(n_symbol)
+
+        if initial_weights is None:
+            initial_weights = np.ones(n_symbol) / n_symbol
+        initial_weights = np.asarray(initial_weights, dtype=np.float64)
+        if len(initial_weights) != n_symbol:
+            raise ValueError("mismatch n_symbol dimension: {}, {}".format(
+                n_symbol, len(initial_weights)))
+        self.initial_weights = initial_weights
+
+        for name in self.param_names:
+            if name not in params:
+                raise ValueError("{} requires parameter: {}".format(
+                    self.strategy, name))
+            setattr(self, name, params[name])
+
+        # current weights and number of observed periods
+        self.weights = initial_weights.copy()
+        self.n_step = 0
+
+    def initialize(self, price_relatives):
+        """
+        initial running state by the price relatives of the first period
+        """
+
+    def update(self, price_relatives):
+        """
+        implemented by user
+
+        Parameters:
+        -------------
+        price_relatives: numpy.array, shape: (n_symbol,)
+            price relatives of today, the current weights are the weights
+            of yesterday.
+
+        Returns:
+        -------------
+        numpy.array, shape: (n_symbol,), weights of today
+        """
+        raise NotImplementedError('update() does not be implemented.')
+
+    def step(self, price_relatives):
+        """
+        push the price relatives of one period, and get the weights for
+        holding to the next period.
+
+        Parameters:
+        -------------
+        price_relatives: array like, shape: (n_symbol,)
+            1 + simple rois of the period
+
+        Returns:
+        -------------
+        numpy.array, shape: (n_symbol,)
+        """
+        price_relatives = np.asarray(price_relatives, dtype=np.float64)
+        if price_relatives.shape != (self.n_symbol,):
+            raise ValueError("mismatch n_symbol dimension: {}, {}".format(
+                self.n_symbol, price_relatives.shape))
+
+        if self.n_step == 0:
+            self.initialize(price_relatives)
+            self.weights = self.initial_weights.copy()
+        else:
+            self.weights = np.asarray(self.update(price_relatives),
+                                      dtype=np.float64)
+        self.n_step += 1
+        return self.weights.copy()
+
+    def get_state(self):
+        """
+        Returns:
+        -------------
+        dict, json-serializable running state
+        """
+        state = {
+            'strategy': self.strategy,
+            'n_symbol': self.n_symbol,
+            'params': {name: getattr(self, name)
+                       for name in self.param_names},
+            'initial_weights': self.initial_weights.tolist(),
+            'weights': self.weights.tolist(),
+            'n_step': self.n_step,
+        }
+        for name in self.state_names:
+            value = getattr(self, name)
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            elif value is not None:
+                value = float(value)
+            state[name] = value
+        return state
+
+    def set_state(self, state):
+        """
+        restore the running state produced by get_state()
+        """
+        if state['strategy'] != self.strategy:
+            raise ValueError("mismatch strategy: {}, {}".format(
+                self.strategy, state['strategy']))
+        self.weights = np.asarray(state['weights'], dtype=np.float64)
+        self.n_step = int(state['n_step'])
+        for name in self.state_names:
+            value = state[name]
+            if isinstance(value, list):
+                value = np.asarray(value, dtype=np.float64)
+            setattr(self, name, value)
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls(state['n_symbol'], state['initial_weights'],
+                  **state['params'])
+        obj.set_state(state)
+        return obj
+
+
+class OnlineBAHPortfolio(OnlineWeightPortfolio):
+    """
+    buy-and-hold portfolio strategy
+    """
+    strategy = 'BAH'
+
+    def update(self, price_relatives):
+        wealths = self.weights * price_relatives
+        return wealths / wealths.sum()
+
+
+class OnlineEGPortfolio(OnlineWeightPortfolio):
+    """
+    exponential gradient strategy
+    """
+    strategy = 'EG'
+    param_names = ('eta',)
+
+    def update(self, price_relatives):
+        return EGPortfolio.eg_weights(self.weights, price_relatives,
+                                      self.eta)
+
+
+class OnlineEGAdaptivePortfolio(OnlineWeightPortfolio):
+    """
+    exponential gradient strategy with adaptive learning rate
+    """
+    strategy = 'EG_Adaptive'
+    param_names = ('beta',)
+    state_names = ('roi_low', 'roi_high')
+
+    def __init__(self, n_symbol, initial_weights=None, beta=None):
+        super(OnlineEGAdaptivePortfolio, self).__init__(
+            n_symbol, initial_weights, beta=beta)
+        self.log_m = np.log(self.n_symbol)
+        self.roi_low = None
+        self.roi_high = None
+
+    def initialize(self, price_relatives):
+        self.roi_low = price_relatives.min() - 1
+        self.roi_high = price_relatives.max() - 1
+
+    def update(self, price_relatives):
+        self.roi_low = min(self.roi_low, price_relatives.min() - 1)
+        self.roi_high = max(self.roi_high, price_relatives.max() - 1)
+        eta = EGAdaptivePortfolio.adaptive_eta(
+            self.roi_low, self.roi_high, self.log_m, self.n_step, self.beta)
+        return EGPortfolio.eg_weights(self.weights, price_relatives, eta)
+
+
+class OnlineExpPortfolio(OnlineWeightPortfolio):
+    """
+    exponential forecaster
+    """
+    strategy = 'Exp'
+    param_names = ('eta',)
+    state_names = ('cum_stock_payoffs',)
+
+    def __init__(self, n_symbol, initial_weights=None, eta=None):
+        super(OnlineExpPortfolio, self).__init__(
+            n_symbol, initial_weights, eta=eta)
+        self.cum_stock_payoffs = None
+
+    def initialize(self, price_relatives):
+        # log(price relative) = simple roi
+        self.cum_stock_payoffs = price_relatives - 1
+
+    def update(self, price_relatives):
+        self.cum_stock_payoffs = self.cum_stock_payoffs + price_relatives - 1
+        return ExpPortfolio.exp_weights(self.cum_stock_payoffs, self.eta)
+
+
+class OnlineExpAdaptivePortfolio(OnlineWeightPortfolio):
+    """
+    exponential forecaster with adaptive learning rate
+    """
+    strategy = 'Exp_Adaptive'
+    param_names = ('beta',)
+    state_names = ('cum_stock_payoffs', 'roi_high')
+
+    def __init__(self, n_symbol, initial_weights=None, beta=None):
+        super(OnlineExpAdaptivePortfolio, self).__init__(
+            n_symbol, initial_weights, beta=beta)
+        self.log_m = np.log(self.n_symbol)
+        self.cum_stock_payoffs = None
+        self.roi_high = None
+
+    def initialize(self, price_relatives):
+        self.cum_stock_payoffs = price_relatives - 1
+        self.roi_high = price_relatives.max() - 1
+
+    def update(self, price_relatives):
+        self.cum_stock_payoffs = self.cum_stock_payoffs + price_relatives - 1
+        self.roi_high = max(self.roi_high, price_relatives.max() - 1)
+        eta = ExpAdaptivePortfolio.adaptive_eta(self.roi_high, self.log_m,
+                                                self.n_step, self.beta)
+        return ExpPortfolio.exp_weights(self.cum_stock_payoffs, eta)
+
+
+class OnlinePolynomialPortfolio(OnlineWeightPortfolio):
+    """
+    polynomial aggregator strategy
+    """
+    strategy = 'Poly'
+    param_names = ('poly_power',)
+    state_names = ('cum_regrets',)
+
+    def __init__(self, n_symbol, initial_weights=None, poly_power=None):
+        super(OnlinePolynomialPortfolio, self).__init__(
+            n_symbol, initial_weights, poly_power=poly_power)
+        if poly_power < 1:
+            raise ValueError(
+                'poly power must >= 1, but get {}'.format(poly_power))
+        self.cum_regrets = None
+
+    def initialize(self, price_relatives):
+        # the portfolio payoff of the first period is the initial weights
+        self.cum_regrets = (price_relatives - 1 -
+                            np.log(self.initial_weights.sum()))
+
+    def update(self, price_relatives):
+        portfolio_payoff = np.log(self.weights.dot(price_relatives))
+        self.cum_regrets = (self.cum_regrets + price_relatives - 1 -
+                            portfolio_payoff)
+        return PolynomialPortfolio.poly_weights(self.cum_regrets,
+                                                self.poly_power)
+
+
+class OnlineONSPortfolio(OnlineWeightPortfolio):
+    """
+    online Newton step strategy
+    """
+    strategy = 'ONS'
+    param_names = ('beta', 'delta')
+
+    def __init__(self, n_symbol, initial_weights=None, beta=None,
+                 delta=None):
+        super(OnlineONSPortfolio, self).__init__(
+            n_symbol, initial_weights, beta=beta, delta=delta)
+        self.ons = IncrementalONS(self.n_symbol, beta, delta)
+
+    def initialize(self, price_relatives):
+        self.ons.update(ONSPortfolio.log_gradient(self.initial_weights,
+                                                  price_relatives))
+
+    def update(self, price_relatives):
+        self.ons.update(ONSPortfolio.log_gradient(self.weights,
+                                                  price_relatives))
+        return self.ons.get_weights()
+
+    def get_state(self):
+        # the running state is kept in the ONS engine
+        state = super(OnlineONSPortfolio, self).get_state()
+        state['grad_sum'] = self.ons.grad_sum.tolist()
+        state['a_mtx'] = self.ons.a_mtx.tolist()
+        state['a_inv'] = self.ons.a_inv.tolist()
+        return state
+
+    def set_state(self, state):
+        super(OnlineONSPortfolio, self).set_state(state)
+        self.ons.grad_sum = np.asarray(state['grad_sum'], dtype=np.float64)
+        self.ons.a_mtx = np.asarray(state['a_mtx'], dtype=np.float64)
+        self.ons.a_inv = np.asarray(state['a_inv'], dtype=np.float64)
+
+
+class _OnlineNIRPortfolio(OnlineWeightPortfolio, NIRUtility):
+    """
+    no internal regret strategy, the weights of the virtual experts are
+    the modified probabilities of the current weights, hence they are not
+    stored in the running state.
+    """
+
+    def get_weights(self, virtual_expert_weights):
+        """
+        the stationary distribution of the column stochastic matrix
+        """
+        return self.stationary_weights(self.n_symbol, virtual_expert_weights)
+
+
+class OnlineNIRExpPortfolio(_OnlineNIRPortfolio):
+    """
+    no internal regret exponential forecaster
+    """
+    strategy = 'NIRExp'
+    param_names = ('eta',)
+    state_names = ('virtual_cum_payoffs',)
+
+    def __init__(self, n_symbol, initial_weights=None, eta=None):
+        super(OnlineNIRExpPortfolio, self).__init__(
+            n_symbol, initial_weights, eta=eta)
+        self.virtual_cum_payoffs = None
+
+    def initialize(self, price_relatives):
+        self.virtual_cum_payoffs = np.log(
+            self.modified_probabilities(self.initial_weights).sum(axis=1))
+
+    def update(self, price_relatives):
+        # shape: n_virtual_expert
+        virtual_payoffs = self.modified_probabilities(self.weights).dot(
+            price_relatives)
+        self.virtual_cum_payoffs = (self.virtual_cum_payoffs +
+                                    np.log(virtual_payoffs))
+        return self.get_weights(ExpPortfolio.exp_weights(
+            self.virtual_cum_payoffs, self.eta))
+
+
+class OnlineNIRPolynomialPortfolio(_OnlineNIRPortfolio):
+    """
+    no internal regret polynomial aggregator
+    """
+    strategy = 'NIRPoly'
+    param_names = ('poly_power',)
+    state_names = ('virtual_cum_regrets',)
+
+    def __init__(self, n_symbol, initial_weights=None, poly_power=None):
+        super(OnlineNIRPolynomialPortfolio, self).__init__(
+            n_symbol, initial_weights, poly_power=poly_power)
+        if poly_power < 1:
+            raise ValueError(
+                'poly power must >= 1, but get {}'.format(poly_power))
+        self.virtual_cum_regrets = None
+
+    def initialize(self, price_relatives):
+        self.virtual_cum_regrets = (
+            np.log(self.modified_probabilities(
+                self.initial_weights).sum(axis=1)) -
+            np.log(self.initial_weights.sum())
+        )
+
+    def update(self, price_relatives):
+        virtual_payoffs = self.modified_probabilities(self.weights).dot(
+            price_relatives)
+        portfolio_payoff = np.log(self.weights.dot(price_relatives))
+        self.virtual_cum_regrets = (self.virtual_cum_regrets +
+                                    np.log(virtual_payoffs) -
+                                    portfolio_payoff)
+        return self.get_weights(PolynomialPortfolio.poly_weights(
+            self.virtual_cum_regrets, self.poly_power))
+
+
+ONLINE_PORTFOLIOS = {
+    cls.strategy: cls
+    for cls in (OnlineBAHPortfolio,
+                OnlineEGPortfolio,
+                OnlineEGAdaptivePortfolio,
+                OnlineExpPortfolio,
+                OnlineExpAdaptivePortfolio,
+                OnlinePolynomialPortfolio,
+                OnlineONSPortfolio,
+                OnlineNIRExpPortfolio,
+                OnlineNIRPolynomialPortfolio)
+}
+
+
+def load_online_portfolio(state):
+    """
+    rebuild the streaming portfolio from the state of get_state()
+
+    Parameters:
+    -------------
+    state: dict
+
+    Returns:
+    -------------
+    OnlineWeightPortfolio
+    """
+    if state['strategy'] not in ONLINE_PORTFOLIOS:
+        raise ValueError('unknown strategy: {}'.format(state['strategy']))
+    return ONLINE_PORTFOLIOS[state['strategy']].from_state(state)
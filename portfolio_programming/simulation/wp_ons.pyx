@@ -1,15 +1,212 @@
 # -*- coding: utf-8 -*-
+#!python
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: infer_types=True
+#cython: nonecheck=False
 """
 Author: Hung-Hsin Chen <chen1116@gmail.com>
 """
 
-import pandas as pd
 import numpy as np
 import xarray as xr
-import scipy.optimize as spopt
 import portfolio_programming as pp
 from portfolio_programming.simulation.wp_base import WeightPortfolio
 
+cimport numpy as cnp
+
+
+def simplex_projection(cnp.ndarray[cnp.float64_t, ndim=1] weights):
+    """
+    Euclidean projection of the weights onto the probability simplex.
+
+    J. Duchi, S. Shalev-Shwartz, Y. Singer, and T. Chandra, "Efficient
+    projections onto the l1-ball for learning in high dimensions," in
+    Proceedings of the 25th international conference on Machine learning,
+    2008, pp. 272-279.
+
+    Parameters:
+    -------------
+    weights: numpy.array, shape: (n_symbol,)
+
+    Returns:
+    -------------
+    numpy.array, shape: (n_symbol,)
+    """
+    cdef:
+        Py_ssize_t n_symbol = weights.shape[0]
+        cnp.ndarray[cnp.float64_t, ndim=1] sorted_weights
+        cnp.ndarray[cnp.float64_t, ndim=1] cum_weights
+        Py_ssize_t rho
+        double theta
+
+    sorted_weights = np.sort(weights)[::-1]
+    cum_weights = np.cumsum(sorted_weights) - 1.
+    rho = np.flatnonzero(
+        sorted_weights - cum_weights / np.arange(1, n_symbol + 1) > 0)[-1]
+    theta = cum_weights[rho] / (rho + 1.)
+    return np.maximum(weights - theta, 0)
+
+
+def quadratic_simplex_projection(
+        cnp.ndarray[cnp.float64_t, ndim=1] weights,
+        cnp.ndarray[cnp.float64_t, ndim=2] quad_matrix,
+        inv_quad_matrix=None,
+        int max_iter=100,
+        double tol=1e-12):
+    """
+    project the weights onto the probability simplex under the norm
+    induced by the positive definite quad_matrix, i.e.,
+
+        min_x (weights - x)^T A (weights - x)
+        s.t.  sum(x) = 1, x >= 0.
+
+    If the inverse of A is given, the projection onto the hyperplane
+    sum(x) = 1 is computed first in O(n^2) time, and it is the answer when
+    it is nonnegative. Otherwise, the primal active-set method is applied,
+    and it terminates in finite steps.
+
+    J. Nocedal and S. J. Wright, Numerical Optimization, 2nd ed.,
+    Springer, 2006, algorithm 16.3.
+
+    Parameters:
+    -------------
+    weights: numpy.array, shape: (n_symbol,)
+    quad_matrix: numpy.array, shape: (n_symbol, n_symbol)
+    inv_quad_matrix: numpy.array, shape: (n_symbol, n_symbol), optional
+    max_iter: positive integer, maximum iterations of active-set method
+    tol: float, tolerance of the optimality conditions
+
+    Returns:
+    -------------
+    numpy.array, shape: (n_symbol,)
+    """
+    cdef:
+        Py_ssize_t n_symbol = weights.shape[0]
+        Py_ssize_t n_free, idx, block_idx
+        double step, ratio
+        cnp.ndarray[cnp.float64_t, ndim=1] proj, grad, direction
+        cnp.ndarray[cnp.float64_t, ndim=1] rhs, sol, multipliers
+        cnp.ndarray[cnp.float64_t, ndim=2] kkt
+
+    if inv_quad_matrix is not None:
+        # projection onto the hyperplane sum(x) = 1 with A-norm
+        inv_ones = inv_quad_matrix.sum(axis=1)
+        proj = weights - inv_ones * (weights.sum() - 1.) / inv_ones.sum()
+        if proj.min() >= 0:
+            return proj
+
+    # start from a feasible point, the active set contains x_i = 0
+    proj = simplex_projection(weights)
+    active = proj <= 0
+
+    for _ in range(max_iter):
+        grad = quad_matrix.dot(proj - weights)
+        free_indices = np.flatnonzero(~active)
+        n_free = len(free_indices)
+
+        # equality-constrained subproblem on the free variables
+        kkt = np.zeros((n_free + 1, n_free + 1))
+        kkt[:n_free, :n_free] = quad_matrix[np.ix_(free_indices,
+                                                   free_indices)]
+        kkt[:n_free, n_free] = 1.
+        kkt[n_free, :n_free] = 1.
+        rhs = np.zeros(n_free + 1)
+        rhs[:n_free] = -grad[free_indices]
+        sol = np.linalg.solve(kkt, rhs)
+
+        direction = np.zeros(n_symbol)
+        direction[free_indices] = sol[:n_free]
+
+        if np.abs(direction).max() <= tol:
+            # Lagrange multipliers of the active bound constraints
+            active_indices = np.flatnonzero(active)
+            if len(active_indices) == 0:
+                break
+            multipliers = grad[active_indices] + sol[n_free]
+            if multipliers.min() >= -tol:
+                break
+            # release the most violated constraint
+            active[active_indices[multipliers.argmin()]] = False
+        else:
+            # step to the nearest blocking constraint
+            step, block_idx = 1., -1
+            for idx in free_indices:
+                if direction[idx] < 0:
+                    ratio = -proj[idx] / direction[idx]
+                    if ratio < step:
+                        step, block_idx = ratio, idx
+            proj = proj + step * direction
+            if block_idx >= 0:
+                proj[block_idx] = 0
+                active[block_idx] = True
+
+    proj = np.maximum(proj, 0)
+    return proj / proj.sum()
+
+
+class IncrementalONS(object):
+    """
+    running state of the online Newton step strategy.
+
+    The sum of gradients, the matrix A = I + sum(g g^T), and its inverse are
+    updated in O(n^2) time per period, the inverse is updated by the
+    Sherman-Morrison formula. The memory is independent of the number of
+    periods.
+    """
+
+    def __init__(self, int n_symbol, double beta, double delta):
+        """
+        Parameters:
+        -------------
+        n_symbol: positive integer
+        beta: float
+            gradient parameters
+        delta: float
+            heuristic tuning parameter
+        """
+        self.n_symbol = n_symbol
+        self.beta = beta
+        self.delta = delta
+
+        # sum of the gradients of the log func.
+        self.grad_sum = np.zeros(n_symbol)
+        # A = -sum(Hessians) + I, and its inverse
+        self.a_mtx = np.identity(n_symbol)
+        self.a_inv = np.identity(n_symbol)
+
+    def update(self, cnp.ndarray[cnp.float64_t, ndim=1] grad):
+        """
+        add the gradient of the log func. of a period to the running state,
+        and the Hessian is -g g^T.
+        """
+        cdef:
+            cnp.ndarray[cnp.float64_t, ndim=1] a_inv_grad
+            double denominator
+
+        self.grad_sum += grad
+        self.a_mtx += np.outer(grad, grad)
+
+        # Sherman-Morrison rank-one update of the inverse
+        a_inv_grad = self.a_inv.dot(grad)
+        denominator = 1. + grad.dot(a_inv_grad)
+        self.a_inv -= np.outer(a_inv_grad, a_inv_grad) / denominator
+        # remove accumulated asymmetric round-off error
+        self.a_inv = (self.a_inv + self.a_inv.T) * 0.5
+
+    def get_weights(self):
+        """
+        the new weights may out of simplex domain, project it back
+
+        Returns:
+        -------------
+        numpy.array, shape: (n_symbol,)
+        """
+        b_vec = (1. + 1. / self.beta) * self.grad_sum
+        new_weights = self.delta * self.a_inv.dot(b_vec)
+        return quadratic_simplex_projection(new_weights, self.a_mtx,
+                                            self.a_inv)
+
 
 class ONSPortfolio(WeightPortfolio):
     """
@@ -37,7 +234,8 @@ class ONSPortfolio(WeightPortfolio):
                  start_date = pp.EXP_START_DATE,
                  end_date = pp.EXP_END_DATE,
                  int
-                 print_interval = 10):
+                 print_interval = 10,
+                 report_dir=pp.WEIGHT_PORTFOLIO_REPORT_DIR):
         """
         Parameters:
         -------------
@@ -53,35 +251,19 @@ class ONSPortfolio(WeightPortfolio):
             group_name, symbols, risk_rois, initial_weights,
             initial_wealth, buy_trans_fee,
             sell_trans_fee, start_date,
-            end_date, print_interval)
-
+            end_date, print_interval, report_dir)
 
         self.beta = beta
         self.delta = delta
 
-        # save gradient adn Hessian data of the log func.
+        # save gradient data of the log func., the Hessians -g g^T are
+        # accumulated in the running state only.
         self.gradients = xr.DataArray(
-             np.zeros((self.n_exp_period, self.n_stock)),
+             np.zeros((self.n_exp_period, self.n_symbol)),
             dims=('trans_date', 'symbol'),
             coords=( self.exp_trans_dates, self.symbols)
         )
-
-        self.Hessians = xr.DataArray(
-            np.zeros((self.n_exp_period, self.n_stock, self.n_stock)),
-            dims = ('trans_date', 'symbol', 'symbol'),
-            coords=( self.exp_trans_dates, self.symbols, self.symbols)
-        )
-
-
-        # get initial gradient and hessians
-        init_price_relatives = (self.exp_rois.loc[self.exp_start_date,
-                                                    self.symbols] + 1)
-        init_grad = init_price_relatives/np.dot(self.initial_weights,
-                                                init_price_relatives)
-        self.gradients.loc[self.exp_start_date] = init_grad
-
-        init_grad = init_grad.values[:, np.newaxis]
-        self.Hessians.loc[self.exp_start_date] = -np.dot(init_grad, init_grad.T)
+        self.ons = IncrementalONS(self.n_symbol, beta, delta)
 
     def get_simulation_name(self, *args, **kwargs):
          return "ONS_beta{}_delta{}_{}_{}_{}".format(
@@ -96,28 +278,42 @@ class ONSPortfolio(WeightPortfolio):
         reports['beta'] = self.beta
         reports['delta'] = self.delta
         reports['gradient'] = self.gradients
-        reports['Hessian'] = self.Hessians
+        reports['A_matrix'] = self.ons.a_mtx
         return reports
 
-    def _weight_projection(self, weights, quad_matrix):
+    @staticmethod
+    def log_gradient(weights, price_relatives):
         """
-        project weights to simplex domain
-        """
-        def objective(x):
-            return np.dot(np.dot(weights - x, quad_matrix), weights - x)
+        gradient of the log wealth, it is shared with the streaming
+        portfolios.
+
+        Parameters:
+        -------------
+        weights: numpy.array, shape: n_symbol
+        price_relatives: numpy.array, shape: n_symbol
 
-        # quadratic programing
-        projected_weights = spopt.fmin_slsqp(objective, weights,
-                           eqcons=[lambda x: x.sum()-1,],
-                           bounds = [(0,1) for _ in range(len(weights))],
-                           disp = False,
-                           )
+        Returns:
+        -------------
+        numpy.array, shape: n_symbol
+        """
+        return price_relatives / np.dot(weights, price_relatives)
 
-        return projected_weights
+    def pre_trading_operation(self, *args, **kargs):
+        """
+        get initial gradient and hessian
+        """
+        self.ons = IncrementalONS(self.n_symbol, self.beta, self.delta)
+        init_price_relatives = (self.exp_rois.loc[self.exp_start_date,
+                                                  self.symbols] + 1).values
+        init_grad = self.log_gradient(
+            np.asarray(self.initial_weights, dtype=np.float64),
+            init_price_relatives)
+        self.gradients.loc[self.exp_start_date] = init_grad
+        self.ons.update(init_grad)
 
     def get_today_weights(self, *args, **kwargs):
         """
-        remaining the same weight as the today_prev_weights
+        online Newton step with running sums of gradients and Hessians
 
         Parameters: kwargs
         -------------------------
@@ -131,22 +327,11 @@ class ONSPortfolio(WeightPortfolio):
         today = kwargs['trans_date']
 
         # update gradients and Hessians
-        yesterday_weights = self.decision_xarr[yesterday, self.symbols,
-                                               'weight']
-        price_relatives = (self.exp_rois.loc[today, self.symbols] + 1)
-        grad = (price_relatives / np.dot(yesterday_weights, price_relatives))
+        yesterday_weights = self.decision_xarr.loc[yesterday, self.symbols,
+                                                   'weight'].values
+        price_relatives = kwargs['today_price_relative'].values
+        grad = self.log_gradient(yesterday_weights, price_relatives)
         self.gradients.loc[today, self.symbols] = grad
+        self.ons.update(grad)
 
-        grad = grad.values[:, np.newaxis]
-        self.Hessians.loc[today] = -np.dot(grad, grad.T)
-
-        # compute vector b and matrix A
-        b_vec = (1. + 1/self.beta) * self.gradients.loc[:today].sum(axis=0)
-        a_mtx = (-self.Hessians.loc[:today].sum(axis=0) +
-                 np.identity(self.n_symbol))
-
-        # the new weights may out of simplex domain, project it back
-        new_weights = self.delta * np.dot(np.linalg.inv(a_mtx), b_vec)
-        new_weights = self._weight_projection(new_weights, a_mtx)
-
-        return new_weights
\ No newline at end of file
+        return self.ons.get_weights()
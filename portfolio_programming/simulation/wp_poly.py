@@ -39,6 +39,9 @@ class PolynomialPortfolio(WeightPortfolio):
 
         self.poly_power = poly_power
 
+        # cumulative regrets to the stocks, shape: n_symbol
+        self.cum_regrets = None
+
     def get_simulation_name(self, *args, **kwargs):
         return "Poly_{:.2f}_{}_{}_{}".format(
             self.poly_power,
@@ -51,6 +54,33 @@ class PolynomialPortfolio(WeightPortfolio):
         reports['poly_power'] = self.poly_power
         return reports
 
+    @staticmethod
+    def poly_weights(cum_regrets, poly_power):
+        """
+        polynomial weights of the positive cumulative regrets, it is shared
+        with the streaming portfolios.
+
+        Parameters:
+        -------------
+        cum_regrets: numpy.array, shape: n_expert
+        poly_power: float, power degree
+
+        Returns:
+        -------------
+        numpy.array, shape: n_expert
+        """
+        new_weights = np.power(np.maximum(cum_regrets, 0), poly_power - 1)
+        return new_weights / new_weights.sum()
+
+    def pre_trading_operation(self, *args, **kargs):
+        """
+        initial cumulative regrets
+        """
+        self.cum_regrets = (
+            self.exp_rois.loc[self.exp_start_date, self.symbols].values -
+            np.log(self.decision_xarr.loc[self.exp_start_date, self.symbols,
+                                          'portfolio_payoff'].values.sum())
+        )
 
     def get_today_weights(self, *args, **kwargs):
         """
@@ -67,19 +97,15 @@ class PolynomialPortfolio(WeightPortfolio):
         today = kwargs['trans_date']
         today_prev_wealth = kwargs['today_prev_wealth']
 
-        # shape: tdx
-        portfolio_payoffs = np.log(self.decision_xarr.loc[:today, self.symbols,
-                                 'portfolio_payoff'].sum(axis=1))
-        # shape: tdx * n_symbol, does not need take log operation
+        # float
+        portfolio_payoff = np.log(self.decision_xarr.loc[
+            today, self.symbols, 'portfolio_payoff'].values.sum())
+        # shape: n_symbol, does not need take log operation
         # because log(price relative) = simple roi
-        stock_payoffs = self.exp_rois.loc[:today, self.symbols]
+        stock_payoffs = self.exp_rois.loc[today, self.symbols].values
         # shape: n_symbol
-        diff = (stock_payoffs - portfolio_payoffs).sum(axis=0)
-        new_weights = np.power(np.maximum(diff, np.zeros_like(diff)),
-                               self.poly_power - 1)
-        normalized_new_weights = new_weights / new_weights.sum()
-
-        return normalized_new_weights
+        self.cum_regrets += stock_payoffs - portfolio_payoff
+        return self.poly_weights(self.cum_regrets, self.poly_power)
 
 
 class NIRPolynomialPortfolio(WeightPortfolio, NIRUtility):
@@ -135,6 +161,9 @@ class NIRPolynomialPortfolio(WeightPortfolio, NIRUtility):
             )
         )
 
+        # cumulative regrets to virtual experts, shape: n_virtual_expert
+        self.virtual_cum_regrets = None
+
     def get_simulation_name(self, *args, **kwargs):
         return "NIRPoly_{:.2f}_{}_{}_{}".format(
             self.poly_power,
@@ -162,12 +191,19 @@ class NIRPolynomialPortfolio(WeightPortfolio, NIRUtility):
         ] = self.modified_probabilities(self.initial_weights)
 
         # the portfolio payoff of first decision
+        init_payoffs = self.modified_probabilities(self.initial_weights)
         self.virtual_expert_decision_xarr.loc[
             today,
             self.virtual_experts,
             self.symbols,
             'portfolio_payoff'
-        ] = self.modified_probabilities(self.initial_weights)
+        ] = init_payoffs
+
+        self.virtual_cum_regrets = (
+            np.log(init_payoffs.sum(axis=1)) -
+            np.log(self.decision_xarr.loc[today, self.symbols,
+                                          'portfolio_payoff'].values.sum())
+        )
 
     def get_today_weights(self, *args, **kwargs):
         """
@@ -187,36 +223,26 @@ class NIRPolynomialPortfolio(WeightPortfolio, NIRUtility):
 
         # record virtual experts' payoff,
         # shape: n_virtual_expert, n_symbol
+        virtual_payoffs = (
+            self.virtual_expert_decision_xarr.loc[
+                yesterday, self.virtual_experts, self.symbols,
+                'weight'].values *
+            today_price_relative.values
+        )
         self.virtual_expert_decision_xarr.loc[
             today, self.virtual_experts, self.symbols, 'portfolio_payoff'] = (
-                self.virtual_expert_decision_xarr.loc[
-                    yesterday, self.virtual_experts, self.symbols, 'weight'] *
-                today_price_relative
-        )
+            virtual_payoffs)
 
-        # shape: tdx
-        portfolio_payoffs = np.log(self.decision_xarr.loc[:today, self.symbols,
-                                   'portfolio_payoff'].sum(axis=1))
-        # shape:  tdx * n_virtual_expert
-        virtual_payoffs = np.log(
-            self.virtual_expert_decision_xarr.loc[
-            :today, self.virtual_experts,
-            self.symbols, 'portfolio_payoff'].sum(axis=2)
-        )
+        # float
+        portfolio_payoff = np.log(self.decision_xarr.loc[
+            today, self.symbols, 'portfolio_payoff'].values.sum())
         # shape: n_virtual_expert
-        diff = (virtual_payoffs - portfolio_payoffs).sum(axis=0)
-        new_weights = np.power(np.maximum(diff, np.zeros_like(diff)),
-                               self.poly_power - 1)
-        virtual_expert_weights = new_weights / new_weights.sum()
-
-        # build column stochastic matrix to get weights of today
-        S = self.column_stochastic_matrix(self.n_symbol,
-                                          virtual_expert_weights.values)
-        eigs, eigvs = np.linalg.eig(S)
-        # the largest eigvenvalue is 1
-        one_index = eigs.argmax()
-        normalized_new_weights = (eigvs[:, one_index] /
-                                  eigvs[:, one_index].sum()).astype(np.float64)
+        self.virtual_cum_regrets += (np.log(virtual_payoffs.sum(axis=1)) -
+                                     portfolio_payoff)
+        virtual_expert_weights = PolynomialPortfolio.poly_weights(
+            self.virtual_cum_regrets, self.poly_power)
+        normalized_new_weights = self.stationary_weights(
+            self.n_symbol, virtual_expert_weights)
         # record modified strategies of today
         self.virtual_expert_decision_xarr.loc[
             today, self.virtual_experts, self.symbols, 'weight'
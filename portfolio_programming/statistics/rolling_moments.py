@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Author: Hung-Hsin Chen <chen1116@gmail.com>
+
+rolling-window estimators of the unbiased first four moments and the
+correlation matrix. Adjacent windows differ by one period, so the power sums
+and the cross-products are updated in O(n_symbol^2) per period instead of
+recomputing the statistics of the whole window.
+"""
+
+import numpy as np
+
+
+class RollingMoments(object):
+    """
+    rolling estimator of the mean, standard deviation (ddof=1), unbiased
+    skewness, unbiased excess kurtosis, and Pearson correlation matrix,
+    which are the same as the estimators of numpy.std(ddof=1),
+    scipy.stats.skew(bias=False), scipy.stats.kurtosis(bias=False), and
+    numpy.corrcoef.
+
+    The sums are taken on the data shifted by the first pushed row to reduce
+    the cancellation error, and they are recomputed from the window every
+    refresh_interval pushes to remove the accumulated round-off error.
+    """
+
+    def __init__(self, n_symbol, window_size, refresh_interval=None):
+        """
+        Parameters:
+        -------------
+        n_symbol: positive integer
+        window_size: positive integer, number of periods in the window
+        refresh_interval: positive integer, optional, default is
+            window_size.
+        """
+        self.n_symbol = n_symbol
+        self.window_size = window_size
+        self.refresh_interval = (refresh_interval if refresh_interval
+                                 else window_size)
+
+        # ring buffer of the shifted data in the window
+        self.window = np.zeros((window_size, n_symbol))
+        self.shift = None
+        self.n_data = 0
+        self.n_push = 0
+
+        # power sums, shape: (4, n_symbol), and cross-products
+        self.power_sums = np.zeros((4, n_symbol))
+        self.cross_products = np.zeros((n_symbol, n_symbol))
+
+    @property
+    def is_full(self):
+        return self.n_data == self.window_size
+
+    def push(self, values):
+        """
+        append the data of a period, and drop the oldest period when the
+        window is full.
+
+        Parameters:
+        -------------
+        values: array-like, shape: (n_symbol,)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self.shift is None:
+            self.shift = values.copy()
+        values = values - self.shift
+
+        pos = self.n_push % self.window_size
+        if self.is_full:
+            old = self.window[pos]
+            self._update(old, -1.)
+        else:
+            self.n_data += 1
+        self.window[pos] = values
+        self._update(values, 1.)
+        self.n_push += 1
+
+        if self.n_push % self.refresh_interval == 0:
+            self.refresh()
+
+    def _update(self, values, sign):
+        power = values.copy()
+        for idx in range(4):
+            self.power_sums[idx] += sign * power
+            power = power * values
+        self.cross_products += sign * np.outer(values, values)
+
+    def refresh(self):
+        """ recompute the sums from the data in the window """
+        window = self.window[:self.n_data]
+        power = window.copy()
+        for idx in range(4):
+            self.power_sums[idx] = power.sum(axis=0)
+            power = power * window
+        self.cross_products = np.dot(window.T, window)
+
+    def _central_moments(self):
+        """
+        Returns:
+        -------------
+        mean of the shifted data, and the 2~4th biased central moments,
+        each shape: (n_symbol,)
+        """
+        n = float(self.n_data)
+        s1, s2, s3, s4 = self.power_sums / n
+        mean = s1
+        mean2 = mean * mean
+        m2 = s2 - mean2
+        m3 = s3 - 3. * mean * s2 + 2. * mean2 * mean
+        m4 = s4 - 4. * mean * s3 + 6. * mean2 * s2 - 3. * mean2 * mean2
+        return mean, m2, m3, m4
+
+    def moments(self):
+        """
+        unbiased estimators of the data in the window, as scipy, the
+        skewness (kurtosis) is not finite when the window contains less
+        than 3 (4) periods.
+
+        Returns:
+        -------------
+        numpy.array, shape: (n_symbol, 4), mean, std, skew, ex-kurt
+        """
+        if self.n_data < 2:
+            raise ValueError("only {} periods in the window.".format(
+                self.n_data))
+
+        n = float(self.n_data)
+        mean, m2, m3, m4 = self._central_moments()
+        moments = np.empty((self.n_symbol, 4))
+        moments[:, 0] = mean + self.shift
+        with np.errstate(divide='ignore', invalid='ignore'):
+            moments[:, 1] = np.sqrt(m2 * n / (n - 1.))
+            moments[:, 2] = (m3 / m2 ** 1.5 * np.sqrt(n * (n - 1.)) /
+                             (n - 2.))
+            moments[:, 3] = (((n * n - 1.) * m4 / (m2 * m2) -
+                              3. * (n - 1.) ** 2) / (n - 2.) / (n - 3.))
+        return moments
+
+    def corrcoef(self):
+        """
+        Returns:
+        -------------
+        numpy.array, shape: (n_symbol, n_symbol), correlation matrix
+        """
+        mean = self.power_sums[0] / self.n_data
+        cov = self.cross_products / self.n_data - np.outer(mean, mean)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corrs = cov / np.outer(std, std)
+        np.fill_diagonal(corrs, 1.)
+        return np.clip(corrs, -1., 1.)
+
+
+def rolling_moments(data, window_size):
+    """
+    the unbiased moments and correlation matrices of all windows.
+
+    Parameters:
+    -------------
+    data: numpy.array, shape: (n_period, n_symbol)
+    window_size: positive integer
+
+    Returns:
+    -------------
+    generator of (end_idx, moments, corrs), where the window is
+    data[end_idx - window_size + 1: end_idx + 1], moments shape:
+    (n_symbol, 4), and corrs shape: (n_symbol, n_symbol).
+    """
+    data = np.asarray(data, dtype=np.float64)
+    estimator = RollingMoments(data.shape[1], window_size)
+    for tdx in range(data.shape[0]):
+        estimator.push(data[tdx])
+        if estimator.is_full:
+            yield tdx, estimator.moments(), estimator.corrcoef()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+batched superior predictive ability (SPA) and reality check tests.
+
+Peter Reinhard Hansen, "A test for superior predictive ability,"
+Journal of Business & Economic Statistics, pp. 365-380, 2005.
+Halbert White, "A reality check for data snooping," Econometrica,
+pp. 1097-1126, 2000.
+
+The stationary bootstrap indices are generated once, and converted to a
+count matrix, so the bootstrap means of all series are a single matrix
+product of the (n_series, n_period) performance matrix and the counts.
+The statistics follow arch.bootstrap.SPA (the asymptotic variances, the
+lower, consistent, and upper re-centerings), which is the reference
+implementation of the single-series tests in this project.
+
+The input is the performance differential of the models over the
+benchmark, e.g. the rois of a strategy over the zero benchmark, which is
+the loss differential (benchmark - model) of arch. A small p-value
+rejects the null hypothesis that no model outperforms the benchmark.
+"""
+
+import numpy as np
+
+from portfolio_programming.sampling.bootstrap import (
+    stationary_bootstrap_indices, bootstrap_counts)
+
+
+def kernel_variances(series, q_value):
+    """
+    the asymptotic variances of the means of the stationary bootstrap
+    (Politis and Romano, 1994), the autocovariances are computed by FFT.
+
+    Parameters:
+    ---------------
+    series : numpy.array, shape: (n_series, n_period)
+    q_value : float, 1 / block size
+
+    Returns:
+    ---------------
+    numpy.array, shape: (n_series,)
+    """
+    n_period = series.shape[1]
+    demeaned = series - series.mean(axis=1, keepdims=True)
+    n_fft = 1 << int(np.ceil(np.log2(2 * n_period - 1)))
+    spectrum = np.fft.rfft(demeaned, n_fft, axis=1)
+    # acovs[:, i] = sum_t demeaned[:, t] * demeaned[:, t + i]
+    acovs = np.fft.irfft(spectrum * np.conj(spectrum), n_fft,
+                         axis=1)[:, :n_period]
+    lags = np.arange(1, n_period)
+    kappa = ((1. - lags / n_period) * (1. - q_value) ** lags +
+             lags / n_period * (1. - q_value) ** (n_period - lags))
+    return (acovs[:, 0] + 2 * acovs[:, 1:] @ kappa) / n_period
+
+
+def _spa_centers(series, q_value):
+    """
+    Returns:
+    ---------------
+    means : numpy.array, shape: (n_series,)
+    centers : numpy.array, shape: (n_series, 3), the lower, consistent,
+        and upper re-centerings of the bootstrap means.
+    """
+    n_period = series.shape[1]
+    means = series.mean(axis=1)
+    variances = kernel_variances(series, q_value)
+    threshold = -np.sqrt(variances / n_period * 2 *
+                         np.log(np.log(n_period)))
+    consistent = np.where(means >= threshold, means, 0.)
+    lower = np.maximum(means, 0.)
+    return means, np.column_stack((lower, consistent, means))
+
+
+def _bootstrap_means(series, reps, q_value, random_state):
+    """
+    Returns:
+    ---------------
+    numpy.array, shape: (n_series, reps)
+    """
+    n_period = series.shape[1]
+    indices = stationary_bootstrap_indices(n_period, reps, q_value,
+                                           random_state)
+    return series @ bootstrap_counts(indices, n_period).T / n_period
+
+
+def _prepare(series, block_size, seed):
+    series = np.atleast_2d(np.asarray(series, dtype=np.float64))
+    if series.ndim != 2:
+        raise ValueError("the dimension of the series should be 1 or 2, "
+                         "not {}".format(series.ndim))
+    n_period = series.shape[1]
+    if n_period < 3:
+        raise ValueError("number of periods {} is too small.".format(
+            n_period))
+    if block_size is None:
+        block_size = int(np.sqrt(n_period))
+    random_state = (seed if isinstance(seed, np.random.RandomState)
+                    else np.random.RandomState(seed))
+    return series, 1. / block_size, random_state
+
+
+def batch_spa_pvalues(series, reps=1000, block_size=None, n_trial=1,
+                      seed=None):
+    """
+    the SPA test of each series against the zero benchmark individually.
+
+    Parameters:
+    ---------------
+    series : array-like, shape: (n_series, n_period) or (n_period,)
+        performance differentials, e.g. rois of the strategies
+    reps : positive integer, number of the bootstrap replications
+    block_size : positive integer, optional, mean block size of the
+        stationary bootstrap, default is int(sqrt(n_period)).
+    n_trial : positive integer, the test is repeated with n_trial
+        independent bootstrap index matrices, and the worst (largest)
+        p-values are preserved.
+    seed : integer or numpy.random.RandomState, optional
+
+    Returns:
+    ---------------
+    numpy.array, shape: (n_series, 3), the lower, consistent, and upper
+    p-values of each series.
+    """
+    series, q_value, random_state = _prepare(series, block_size, seed)
+    means, centers = _spa_centers(series, q_value)
+
+    pvalues = np.zeros((series.shape[0], 3))
+    for _ in range(n_trial):
+        boot_means = _bootstrap_means(series, reps, q_value, random_state)
+        simulated = boot_means[:, :, np.newaxis] - centers[:, np.newaxis, :]
+        trial = (simulated > means[:, np.newaxis, np.newaxis]).mean(axis=1)
+        pvalues = np.maximum(pvalues, trial)
+    return pvalues
+
+
+def spa_pvalues(series, reps=1000, block_size=None, n_trial=1, seed=None):
+    """
+    the SPA test of all the series jointly, the null hypothesis is that no
+    series outperforms the zero benchmark.
+
+    Parameters:
+    ---------------
+    see batch_spa_pvalues
+
+    Returns:
+    ---------------
+    numpy.array, shape: (3,), the lower, consistent, and upper p-values
+    """
+    series, q_value, random_state = _prepare(series, block_size, seed)
+    means, centers = _spa_centers(series, q_value)
+
+    pvalues = np.zeros(3)
+    for _ in range(n_trial):
+        boot_means = _bootstrap_means(series, reps, q_value, random_state)
+        simulated = (boot_means[:, :, np.newaxis] -
+                     centers[:, np.newaxis, :]).max(axis=0)
+        pvalues = np.maximum(pvalues, (simulated > means.max()).mean(axis=0))
+    return pvalues
+
+
+def reality_check_pvalue(series, reps=1000, block_size=None, n_trial=1,
+                         seed=None):
+    """
+    White's reality check of all the series jointly, which is the upper
+    p-value of the (non-studentized) SPA test.
+
+    Parameters:
+    ---------------
+    see batch_spa_pvalues
+
+    Returns:
+    ---------------
+    float
+    """
+    return float(spa_pvalues(series, reps, block_size, n_trial, seed)[2])
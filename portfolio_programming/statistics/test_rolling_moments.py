@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Author: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import numpy as np
+import scipy.stats as spstats
+from portfolio_programming.statistics.rolling_moments import (
+    RollingMoments, rolling_moments)
+
+
+def test_rolling_moments(n_period=300, n_symbol=5, window_size=50):
+    data = 0.01 + np.random.randn(n_period, n_symbol) * 0.02
+
+    n_window = 0
+    for tdx, moments, corrs in rolling_moments(data, window_size):
+        hist_data = data[tdx - window_size + 1: tdx + 1]
+        np.testing.assert_allclose(moments[:, 0], hist_data.mean(axis=0))
+        np.testing.assert_allclose(moments[:, 1],
+                                   hist_data.std(axis=0, ddof=1))
+        np.testing.assert_allclose(
+            moments[:, 2], spstats.skew(hist_data, axis=0, bias=False),
+            atol=1e-8)
+        np.testing.assert_allclose(
+            moments[:, 3], spstats.kurtosis(hist_data, axis=0, bias=False),
+            atol=1e-8)
+        np.testing.assert_allclose(corrs, np.corrcoef(hist_data.T),
+                                   atol=1e-10)
+        n_window += 1
+    assert n_window == n_period - window_size + 1
+
+
+def test_rolling_refresh(n_period=1000, n_symbol=3, window_size=20):
+    data = np.random.randn(n_period, n_symbol)
+    estimator = RollingMoments(n_symbol, window_size, refresh_interval=10 ** 6)
+    for tdx in range(n_period):
+        estimator.push(data[tdx])
+    moments = estimator.moments()
+    estimator.refresh()
+    np.testing.assert_allclose(moments, estimator.moments(), atol=1e-8)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Authors: Hung-Hsin Chen <chen1116@gmail.com>
+
+"""
+
+import numpy as np
+
+from portfolio_programming.sampling.bootstrap import (
+    stationary_bootstrap_indices, bootstrap_counts)
+from portfolio_programming.statistics.spa import (
+    kernel_variances, batch_spa_pvalues, spa_pvalues, reality_check_pvalue)
+
+
+def test_stationary_bootstrap_indices():
+    rs = np.random.RandomState(0)
+    indices = stationary_bootstrap_indices(100, 2000, 0.1, rs)
+    assert indices.shape == (2000, 100)
+    assert indices.min() >= 0 and indices.max() < 100
+
+    # the mean block length is 1 / q_value
+    steps = np.diff(indices, axis=1)
+    n_restart = ((steps != 1) & (steps != -99)).sum()
+    np.testing.assert_allclose(n_restart / steps.size, 0.1, atol=0.01)
+
+    counts = bootstrap_counts(indices, 100)
+    assert (counts.sum(axis=1) == 100).all()
+    data = rs.randn(3, 100)
+    np.testing.assert_allclose(data @ counts.T / 100,
+                               data[:, indices].mean(axis=2))
+
+
+def test_batch_spa_pvalues():
+    import arch.bootstrap.multiple_comparison as arch_comp
+
+    rs = np.random.RandomState(0)
+    n_period = 400
+    series = (rs.randn(4, n_period) * 0.01 +
+              np.array([0., 2e-3, -1e-3, 5e-4])[:, np.newaxis])
+
+    # the variances of arch
+    spa = arch_comp.SPA(series.T, np.zeros_like(series.T), reps=10, seed=0)
+    spa.compute()
+    np.testing.assert_allclose(
+        spa._loss_diff_var, kernel_variances(series, 1. / 20))
+
+    pvalues = batch_spa_pvalues(series, reps=2000, seed=0)
+    assert pvalues.shape == (4, 3)
+    for idx in range(4):
+        spa = arch_comp.SPA(series[idx], np.zeros(n_period), reps=2000,
+                            seed=idx)
+        spa.compute()
+        np.testing.assert_allclose(pvalues[idx], np.asarray(spa.pvalues),
+                                   atol=0.05)
+    np.testing.assert_array_equal(
+        pvalues, batch_spa_pvalues(series, reps=2000, seed=0))
+
+    # the worst p-values of the trials
+    assert (batch_spa_pvalues(series, reps=2000, n_trial=3, seed=0) >=
+            pvalues).all()
+
+    spa = arch_comp.SPA(series.T, np.zeros_like(series.T), reps=2000,
+                        seed=0)
+    spa.compute()
+    joint = spa_pvalues(series, reps=2000, seed=1)
+    np.testing.assert_allclose(joint, np.asarray(spa.pvalues), atol=0.05)
+    assert reality_check_pvalue(series, reps=2000, seed=1) == joint[2]